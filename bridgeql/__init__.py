@@ -20,3 +20,12 @@ __copyright__ = 'Copyright © 2023 VMware, Inc.  All rights reserved.'
 
 # VERSION available outside module
 VERSION = __version__
+
+try:
+    import django
+    if django.VERSION < (3, 2):
+        # newer versions find the app config in bridgeql.apps
+        default_app_config = 'bridgeql.apps.BridgeqlConfig'
+except ImportError:
+    # the client does not depend on Django
+    pass
@@ -0,0 +1,21 @@
+# -*- coding: utf-8 -*-
+# Copyright © 2023 VMware, Inc.  All rights reserved.
+# SPDX-License-Identifier: BSD-2-Clause
+
+from django.apps import AppConfig
+
+
+class BridgeqlConfig(AppConfig):
+    name = 'bridgeql'
+    verbose_name = 'BridgeQL'
+
+    def ready(self):
+        # the views, loaded on their first request, import the rest
+        from bridgeql.django.auth import load_auth_decorators
+        from bridgeql.django.settings import bridgeql_settings
+
+        bridgeql_settings.ensure_valid()
+        load_auth_decorators()
+        if bridgeql_settings.BRIDGEQL_CHANGE_FEED_MODELS:
+            # connects the signals of the writes made outside of bridgeql
+            import bridgeql.django.changelog  # noqa: F401
@@ -0,0 +1,22 @@
+# -*- coding: utf-8 -*-
+# Copyright © 2023 VMware, Inc.  All rights reserved.
+# SPDX-License-Identifier: BSD-2-Clause
+
+"""
+Python client of the bridgeql API, it does not depend on Django.
+"""
+
+import sys
+
+from bridgeql.client.cache import DiskCache, MemoryCache
+from bridgeql.client.client import Client
+from bridgeql.client.exceptions import (
+    ClientError,
+    ConnectionFailed,
+    RequestFailed
+)
+from bridgeql.client.query import Query
+from bridgeql.utils import msgpack_ext_hook
+
+if sys.version_info >= (3, 6):
+    from bridgeql.client.aio import AsyncClient
@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+# Copyright © 2023 VMware, Inc.  All rights reserved.
+# SPDX-License-Identifier: BSD-2-Clause
+
+import asyncio
+import functools
+
+from bridgeql.client.client import Client
+from bridgeql.client.query import Query
+
+# ends the iteration of a stream run in the executor
+_DONE = object()
+
+
+class AsyncClient(object):
+    """
+    asyncio client of a bridgeql server. The requests share the pool of
+    keep-alive connections of a Client, they run in a thread per pooled
+    connection so that they do not block the event loop.
+
+        async with AsyncClient('https://example.com/api/bridgeql') as client:
+            rows = await client.model('default', 'machine', 'Machine') \\
+                .filter(powered_on=True).all()
+    """
+
+    def __init__(self, base_url, **kwargs):
+        from concurrent.futures import ThreadPoolExecutor
+
+        self.client = Client(base_url, **kwargs)
+        self._executor = ThreadPoolExecutor(self.client.pool.maxsize)
+
+    async def _run(self, func, *args, **kwargs):
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(
+            self._executor, functools.partial(func, *args, **kwargs))
+
+    async def _iterate(self, iterator):
+        while True:
+            item = await self._run(next, iterator, _DONE)
+            if item is _DONE:
+                return
+            yield item
+
+    async def _close(self, iterator):
+        try:
+            await self._run(iterator.close)
+        except ValueError:
+            # cancelled while a thread still reads the iterator, which
+            # stops with its next item
+            pass
+
+    def model(self, db_name, app_label, model_name):
+        return Query(self, db_name, app_label, model_name)
+
+    async def request(self, method, path, params=None, payload=None):
+        return await self._run(self.client.request, method, path, params,
+                               payload)
+
+    async def read(self, query):
+        return await self._run(self.client.read, query)
+
+    async def read_pk(self, query, pk):
+        return await self._run(self.client.read_pk, query, pk)
+
+    async def explain(self, query, analyze=False):
+        return await self._run(self.client.explain, query, analyze)
+
+    async def iterate(self, query, page_size=1000):
+        pages = self.client.pages(query, page_size)
+        try:
+            page = next(pages)
+            while True:
+                rows = await self.read(page)
+                for row in rows:
+                    yield row
+                page = pages.send(rows)
+        except StopIteration:
+            return
+
+    async def partitions(self, query, partitions=4, split=None):
+        return await self._run(self.client.partitions, query, partitions,
+                               split)
+
+    async def export_partition(self, query, partition, after=None):
+        rows = self.client.export_partition(query, partition, after)
+        try:
+            async for row in self._iterate(rows):
+                yield row
+        finally:
+            await self._close(rows)
+
+    async def export(self, query, partitions=4, workers=None, split=None):
+        rows = self.client.export(query, partitions, workers, split)
+        try:
+            async for row in self._iterate(rows):
+                yield row
+        finally:
+            await self._close(rows)
+
+    async def create(self, db_name, app_label, model_name, values):
+        return await self._run(self.client.create, db_name, app_label,
+                               model_name, values)
+
+    async def update(self, db_name, app_label, model_name, pk, values):
+        return await self._run(self.client.update, db_name, app_label,
+                               model_name, pk, values)
+
+    async def delete(self, db_name, app_label, model_name, pk):
+        return await self._run(self.client.delete, db_name, app_label,
+                               model_name, pk)
+
+    async def named_query(self, name, **params):
+        return await self._run(self.client.named_query, name, **params)
+
+    async def changes(self, db_name, app_label, model_name, since=None,
+                      limit=None, fields=None):
+        return await self._run(self.client.changes, db_name, app_label,
+                               model_name, since, limit, fields)
+
+    async def subscribe(self, db_name, app_label, model_name, filter=None,
+                        fields=None):
+        events = self.client.subscribe(db_name, app_label, model_name,
+                                       filter, fields)
+        try:
+            async for event in self._iterate(events):
+                yield event
+        finally:
+            await self._close(events)
+
+    async def close(self):
+        self.client.close()
+        self._executor.shutdown(wait=False)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+# Copyright © 2023 VMware, Inc.  All rights reserved.
+# SPDX-License-Identifier: BSD-2-Clause
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+
+def cache_key(path, params=None, payload=None, headers=None):
+    """
+    Return the key of a read, the json payloads are compared by value so
+    that the order of their keys does not matter.
+    """
+    params = dict(params or {})
+    if 'payload' in params:
+        params['payload'] = json.loads(params['payload'])
+    headers = headers or {}
+    parts = [path, params, payload, headers.get('Accept'),
+             headers.get('Authorization')]
+    return hashlib.sha256(json.dumps(parts, sort_keys=True).encode(
+        'utf-8')).hexdigest()
+
+
+class CachedResponse(object):
+    """
+    Response of a read served from the cache after a 304 Not Modified.
+    """
+    status_code = 200
+
+    def __init__(self, etag, content, content_type):
+        self.etag = etag
+        self.content = content
+        self.headers = {'etag': etag, 'content-type': content_type}
+
+    def json(self):
+        return json.loads(self.content.decode('utf-8'))
+
+    def close(self):
+        pass
+
+
+class MemoryCache(object):
+    """
+    Least recently used responses kept in memory up to max_bytes of
+    content.
+    """
+
+    def __init__(self, max_bytes=16 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self._entries[key] = entry
+            return entry
+
+    def set(self, key, response):
+        if len(response.content) > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.size -= len(previous.content)
+            self._entries[key] = response
+            self.size += len(response.content)
+            while self.size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.size -= len(evicted.content)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class DiskCache(object):
+    """
+    Responses kept in a file per key under directory, the least recently
+    used files are removed beyond max_bytes. Several processes can share
+    the directory.
+    """
+
+    def __init__(self, directory, max_bytes=256 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    def _path(self, key):
+        return os.path.join(self.directory, key)
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                header = json.loads(f.readline().decode('utf-8'))
+                content = f.read()
+            # the access time orders the eviction
+            os.utime(path, None)
+        except (IOError, OSError, ValueError):
+            return None
+        return CachedResponse(header['etag'], content,
+                              header['content_type'])
+
+    def set(self, key, response):
+        if len(response.content) > self.max_bytes:
+            return
+        header = json.dumps({'etag': response.etag,
+                             'content_type': response.headers.get(
+                                 'content-type')})
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(header.encode('utf-8') + b'\n')
+                f.write(response.content)
+            # readers see the previous or the new file, never a partial one
+            os.rename(tmp, self._path(key))
+        except (IOError, OSError):
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+        self._evict()
+
+    def _evict(self):
+        files = []
+        size = 0
+        for name in os.listdir(self.directory):
+            if name.endswith('.tmp'):
+                continue
+            path = self._path(name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, path))
+            size += stat.st_size
+        files.sort()
+        while size > self.max_bytes and files:
+            _, file_size, path = files.pop(0)
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            size -= file_size
+
+    def __len__(self):
+        return len([name for name in os.listdir(self.directory)
+                    if not name.endswith('.tmp')])
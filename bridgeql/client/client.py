@@ -0,0 +1,446 @@
+# -*- coding: utf-8 -*-
+# Copyright © 2023 VMware, Inc.  All rights reserved.
+# SPDX-License-Identifier: BSD-2-Clause
+
+import json
+import random
+import threading
+import time
+from collections import deque
+
+try:
+    import queue
+    from urllib.parse import urlencode
+except ImportError:
+    import Queue as queue
+    from urllib import urlencode
+
+from bridgeql.client.cache import CachedResponse, cache_key
+from bridgeql.client.exceptions import ConnectionFailed, RequestFailed
+from bridgeql.client.query import Query
+from bridgeql.client.transport import IDEMPOTENT_METHODS, ConnectionPool
+from bridgeql.utils import b64encode
+
+# responses bridgeql sends before running the request
+RETRY_STATUSES = (429, 503)
+# rows an export worker hands over at once
+EXPORT_BATCH_SIZE = 1000
+# ends the rows of an export worker
+_DONE = object()
+
+
+def model_path(action, db_name, app_label, model_name, pk=None):
+    path = '/%s/%s/%s/%s/' % (action, db_name, app_label, model_name)
+    if pk is not None:
+        path += '%s/' % pk
+    return path
+
+
+def parse_events(lines):
+    """
+    Parse the server-sent events of lines, yield (event, data).
+    """
+    event, data = None, []
+    for line in lines:
+        line = line.decode('utf-8')
+        if not line:
+            if data:
+                yield event or 'message', json.loads('\n'.join(data))
+            event, data = None, []
+        elif line.startswith(':'):
+            # comments keep the connection alive
+            continue
+        else:
+            name, _, value = line.partition(':')
+            value = value[1:] if value.startswith(' ') else value
+            if name == 'event':
+                event = value
+            elif name == 'data':
+                data.append(value)
+
+
+class Client(object):
+    """
+    Client of a bridgeql server over a pool of keep-alive connections,
+    retrying the requests rejected by the admission control.
+
+        client = Client('https://example.com/api/bridgeql', token=token)
+        client.model('default', 'machine', 'Machine').filter(
+            powered_on=True).fields('ip').all()
+    """
+
+    def __init__(self, base_url, token=None, auth=None, headers=None,
+                 timeout=30, pool_size=10, max_retries=3, backoff=0.5,
+                 max_backoff=30, compress=True, max_url_length=2000,
+                 cache=None):
+        self.pool = ConnectionPool(base_url, maxsize=pool_size,
+                                   timeout=timeout)
+        self.headers = {'Accept': 'application/json'}
+        if compress:
+            self.headers['Accept-Encoding'] = 'gzip'
+        if token is not None:
+            self.headers['Authorization'] = 'Bearer %s' % token
+        elif auth is not None:
+            self.headers['Authorization'] = 'Basic %s' % b64encode(
+                '%s:%s' % auth).decode('ascii')
+        self.headers.update(headers or {})
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.max_url_length = max_url_length
+        self.cache = cache
+
+    def _delay(self, attempt, response=None):
+        """
+        Return the seconds to wait before the next attempt, None when the
+        server asks to wait longer than max_backoff.
+        """
+        retry_after = response and response.headers.get('retry-after')
+        if retry_after:
+            try:
+                delay = float(retry_after)
+            except ValueError:
+                delay = self.max_backoff
+            return delay if delay <= self.max_backoff else None
+        # exponential backoff with jitter
+        return random.uniform(0, min(self.max_backoff,
+                                     self.backoff * 2 ** attempt))
+
+    def send(self, method, path, params=None, payload=None, headers=None):
+        """
+        Send a request, retried on connection failures of the idempotent
+        methods and on the 429 and 503 responses.
+        """
+        if params:
+            path += '?' + urlencode(params, doseq=True)
+        request_headers = dict(self.headers, **(headers or {}))
+        body = None
+        if payload is not None:
+            body = json.dumps({'payload': payload}).encode('utf-8')
+            request_headers['Content-Type'] = 'application/json'
+        attempt = 0
+        while True:
+            try:
+                response = self.pool.request(method, path, body,
+                                             request_headers)
+            except ConnectionFailed:
+                if method not in IDEMPOTENT_METHODS or \
+                        attempt >= self.max_retries:
+                    raise
+                delay = self._delay(attempt)
+            else:
+                if response.status_code not in RETRY_STATUSES or \
+                        attempt >= self.max_retries:
+                    return response
+                delay = self._delay(attempt, response)
+                if delay is None:
+                    return response
+                response.close()
+            time.sleep(delay)
+            attempt += 1
+
+    def _cacheable(self, method, path):
+        return self.cache is not None and (
+            method == 'GET' or path.startswith('/read/'))
+
+    def request(self, method, path, params=None, payload=None):
+        """
+        Send a request and return the data of its response. With a cache,
+        the reads are revalidated with the etag of the cached response.
+        """
+        if not self._cacheable(method, path):
+            return self.result(self.send(method, path, params, payload))
+        key = cache_key(path, params, payload, self.headers)
+        cached = self.cache.get(key)
+        headers = {'If-None-Match': cached.etag} if cached else None
+        response = self.send(method, path, params, payload, headers)
+        if response.status_code == 304 and cached is not None:
+            response.close()
+            self.cache.hits += 1
+            return self.result(cached)
+        etag = response.headers.get('etag')
+        if response.status_code == 200 and etag:
+            self.cache.set(key, CachedResponse(
+                etag, response.content, response.headers.get('content-type')))
+        return self.result(response)
+
+    def result(self, response):
+        try:
+            res = response.json()
+        except ValueError:
+            raise RequestFailed(response.status_code,
+                                response.content[:200])
+        if response.status_code >= 400 or not res.get('success', True):
+            raise RequestFailed(response.status_code, res.get('message'),
+                                response.headers.get('retry-after'))
+        return res
+
+    def model(self, db_name, app_label, model_name):
+        return Query(self, db_name, app_label, model_name)
+
+    def read(self, query):
+        path = model_path('read', query.db_name, query.app_label,
+                          query.model_name)
+        params = {'payload': json.dumps(query.payload)}
+        if len(path) + len(urlencode(params)) > self.max_url_length:
+            # too long for a query string
+            return self.request('POST', path, payload=query.payload)['data']
+        return self.request('GET', path, params)['data']
+
+    def read_pk(self, query, pk):
+        data = self.request('GET', model_path(
+            'read', query.db_name, query.app_label, query.model_name, pk))
+        return data['data'][0] if data['data'] else None
+
+    def explain(self, query, analyze=False):
+        path = model_path('explain', query.db_name, query.app_label,
+                          query.model_name)
+        params = {'analyze': 'true'} if analyze else {}
+        payload = json.dumps(query.payload)
+        if len(path) + len(urlencode(dict(params, payload=payload))) > \
+                self.max_url_length:
+            # too long for a query string
+            return self.request('POST', path, params,
+                                query.payload)['data']
+        params['payload'] = payload
+        return self.request('GET', path, params)['data']
+
+    def pages(self, query, page_size):
+        """
+        Yield the queries of the pages of query, the rows of the last
+        page are sent back to compute the next one.
+
+        Queries ordered by pk only are paginated on the pk, the others
+        by offset, which skips or repeats the rows written meanwhile.
+        """
+        payload = query.payload
+        if payload.get('count') or payload.get('aggregate'):
+            raise ValueError('count and aggregate queries return one row')
+        remaining = payload.get('limit')
+        fields = payload.get('fields') or []
+        keyset = bool(fields) and \
+            payload.get('order_by', ['pk']) == ['pk'] and \
+            not payload.get('offset') and not payload.get('distinct')
+        if keyset:
+            selector = payload.get('filter', {})
+            query = query.order_by('pk')
+            if 'pk' not in fields:
+                query = query.fields(*(['pk'] + fields))
+        last_pk, offset = None, payload.get('offset', 0)
+        while remaining is None or remaining > 0:
+            size = page_size if remaining is None \
+                else min(page_size, remaining)
+            if not keyset:
+                page = query.offset(offset).limit(size)
+            elif last_pk is None:
+                page = query.limit(size)
+            else:
+                # and-ed with the filter, which may have its own pk__gt
+                page = query._clone(filter={'pk__gt': last_pk,
+                                            '__or': [selector]},
+                                    limit=size)
+            rows = yield page
+            if not rows:
+                return
+            if keyset:
+                last_pk = rows[-1]['pk']
+                if 'pk' not in fields:
+                    for row in rows:
+                        del row['pk']
+            offset += len(rows)
+            if remaining is not None:
+                remaining -= len(rows)
+            if len(rows) < size:
+                return
+
+    def iterate(self, query, page_size=1000):
+        pages = self.pages(query, page_size)
+        try:
+            page = next(pages)
+            while True:
+                rows = self.read(page)
+                for row in rows:
+                    yield row
+                page = pages.send(rows)
+        except StopIteration:
+            return
+
+    def _send_payload(self, path, payload, params=None):
+        """
+        Send a read payload in the query string, or posted when it is too
+        long for a URL.
+        """
+        query = dict(params or {}, payload=json.dumps(payload))
+        if len(path) + len(urlencode(query)) > self.max_url_length:
+            return self.send('POST', path, params, payload)
+        return self.send('GET', path, query)
+
+    def partitions(self, query, partitions=4, split=None):
+        """
+        Return the pk ranges splitting the rows of query, each with the
+        payload exporting its rows.
+        """
+        params = {'partitions': partitions}
+        if split:
+            params['split'] = split
+        return self.result(self._send_payload(model_path(
+            'partitions', query.db_name, query.app_label, query.model_name),
+            query.payload, params))['data']
+
+    def export_partition(self, query, partition, after=None):
+        """
+        Yield the rows of a partition in pk order, the stream is resumed
+        after the last row received when it fails.
+        """
+        path = model_path('export', query.db_name, query.app_label,
+                          query.model_name)
+        attempt = 0
+        while True:
+            params = {} if after is None else {'after': after}
+            response = self._send_payload(path, partition['payload'], params)
+            if response.status_code != 200:
+                self.result(response)
+            try:
+                for line in response.iter_lines():
+                    if line:
+                        row = json.loads(line.decode('utf-8'))
+                        after = row['pk']
+                        yield row
+                return
+            except ConnectionFailed:
+                if attempt >= self.max_retries:
+                    raise
+            finally:
+                response.close()
+            time.sleep(self._delay(attempt))
+            attempt += 1
+
+    def export(self, query, partitions=4, workers=None, split=None):
+        """
+        Yield the rows of query exported by partitions streamed
+        concurrently, the rows of a partition come in pk order.
+        """
+        pending = deque(self.partitions(query, partitions, split))
+        workers = min(workers or self.pool.maxsize, len(pending))
+        results = queue.Queue(maxsize=2 * workers)
+        stop = threading.Event()
+
+        def put(item):
+            while not stop.is_set():
+                try:
+                    results.put(item, timeout=0.1)
+                    return
+                except queue.Full:
+                    continue
+
+        def work():
+            try:
+                while not stop.is_set():
+                    try:
+                        partition = pending.popleft()
+                    except IndexError:
+                        return
+                    rows = self.export_partition(query, partition)
+                    try:
+                        batch = []
+                        for row in rows:
+                            batch.append(row)
+                            if len(batch) >= EXPORT_BATCH_SIZE:
+                                put(batch)
+                                batch = []
+                            if stop.is_set():
+                                return
+                        put(batch)
+                    finally:
+                        rows.close()
+            except Exception as e:
+                put(e)
+            finally:
+                put(_DONE)
+
+        threads = [threading.Thread(target=work) for _ in range(workers)]
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+        try:
+            running = len(threads)
+            while running:
+                item = results.get()
+                if item is _DONE:
+                    running -= 1
+                elif isinstance(item, Exception):
+                    raise item
+                else:
+                    for row in item:
+                        yield row
+        finally:
+            stop.set()
+            for thread in threads:
+                thread.join()
+
+    def create(self, db_name, app_label, model_name, values):
+        """
+        Create an object and return its pk.
+        """
+        return self.request('POST', model_path(
+            'create', db_name, app_label, model_name), payload=values)['data']
+
+    def update(self, db_name, app_label, model_name, pk, values):
+        return self.request('PATCH', model_path(
+            'update', db_name, app_label, model_name, pk),
+            payload=values)['data']
+
+    def delete(self, db_name, app_label, model_name, pk):
+        return self.request('DELETE', model_path(
+            'delete', db_name, app_label, model_name, pk))['data']
+
+    def named_query(self, name, **params):
+        return self.request('GET', '/query/%s/' % name, params)['data']
+
+    def changes(self, db_name, app_label, model_name, since=None, limit=None,
+                fields=None):
+        """
+        Return the changes of a model since a change feed token.
+        """
+        params = {'since': since or ''}
+        if limit:
+            params['limit'] = limit
+        if fields:
+            params['fields'] = fields
+        return self.request('GET', model_path(
+            'changes', db_name, app_label, model_name), params)['data']
+
+    def subscribe(self, db_name, app_label, model_name, filter=None,
+                  fields=None):
+        """
+        Yield the events of the writes matching filter as they happen.
+        """
+        path = model_path('subscribe', db_name, app_label, model_name)
+        params = {'payload': json.dumps({'filter': filter or {},
+                                         'fields': fields or []})}
+        response = self.send('GET', path, params,
+                             headers={'Accept': 'text/event-stream'})
+        if response.status_code != 200 or not response.headers.get(
+                'content-type', '').startswith('text/event-stream'):
+            # servers without event streams answer with a long-poll
+            res = self.result(response)
+            while True:
+                for event in res['data']:
+                    yield event
+                res = self.request('GET', path,
+                                   {'subscription': res['subscription']})
+        try:
+            for event, data in parse_events(response.iter_lines()):
+                if event != 'subscribed':
+                    yield data
+        finally:
+            response.close()
+
+    def close(self):
+        self.pool.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+# Copyright © 2023 VMware, Inc.  All rights reserved.
+# SPDX-License-Identifier: BSD-2-Clause
+
+
+class ClientError(Exception):
+    """
+    Error of the bridgeql client.
+    """
+
+
+class ConnectionFailed(ClientError):
+    pass
+
+
+class RequestFailed(ClientError):
+    """
+    Error response of a bridgeql server, with its status and message.
+    """
+
+    def __init__(self, status_code, detail, retry_after=None):
+        super(RequestFailed, self).__init__('%s: %s' % (status_code, detail))
+        self.status_code = status_code
+        self.detail = detail
+        self.retry_after = retry_after
@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+# Copyright © 2023 VMware, Inc.  All rights reserved.
+# SPDX-License-Identifier: BSD-2-Clause
+
+import copy
+
+
+class Query(object):
+    """
+    Read payload of a model built with the methods named after its keys,
+    every method returns a new query.
+
+        client.model('default', 'machine', 'Machine') \\
+            .filter(os__name='ubuntu').fields('ip', 'name') \\
+            .order_by('ip').limit(10).all()
+    """
+
+    def __init__(self, client, db_name, app_label, model_name, payload=None):
+        self.client = client
+        self.db_name = db_name
+        self.app_label = app_label
+        self.model_name = model_name
+        self._payload = payload or {}
+
+    def _clone(self, **changes):
+        payload = copy.deepcopy(self._payload)
+        payload.update(changes)
+        return Query(self.client, self.db_name, self.app_label,
+                     self.model_name, payload)
+
+    @property
+    def payload(self):
+        return copy.deepcopy(self._payload)
+
+    def filter(self, *any_of, **lookups):
+        """
+        Add lookups to the filter, the filters of any_of are or-ed.
+        """
+        selector = dict(self._payload.get('filter', {}), **lookups)
+        if any_of:
+            selector['__or'] = selector.get('__or', []) + list(any_of)
+        return self._clone(filter=selector)
+
+    def exclude(self, **lookups):
+        return self._clone(exclude=dict(self._payload.get('exclude', {}),
+                                        **lookups))
+
+    def fields(self, *fields):
+        return self._clone(fields=list(fields))
+
+    def order_by(self, *fields):
+        return self._clone(order_by=list(fields))
+
+    def distinct(self, distinct=True):
+        return self._clone(distinct=distinct)
+
+    def limit(self, limit):
+        return self._clone(limit=limit)
+
+    def offset(self, offset):
+        return self._clone(offset=offset)
+
+    def all(self):
+        return self.client.read(self)
+
+    def count(self, estimate=False):
+        return self._clone(count='estimate' if estimate else True).all()
+
+    def aggregate(self, **aggregates):
+        """
+        Run aggregates by function name, e.g. aggregate(Max='memory').
+        """
+        return self._clone(aggregate=aggregates).all()
+
+    def get(self, pk):
+        return self.client.read_pk(self, pk)
+
+    def explain(self, analyze=False):
+        return self.client.explain(self, analyze)
+
+    def iterate(self, page_size=1000):
+        """
+        Iterate over the rows read page by page.
+        """
+        return self.client.iterate(self, page_size)
+
+    def partitions(self, partitions=4, split=None):
+        return self.client.partitions(self, partitions, split)
+
+    def export(self, partitions=4, workers=None):
+        """
+        Iterate over the rows read by partitions streamed concurrently.
+        """
+        return self.client.export(self, partitions, workers)
+
+    def __iter__(self):
+        return iter(self.iterate())
+
+    def __aiter__(self):
+        return self.iterate().__aiter__()
+
+    def __repr__(self):
+        return '<Query %s.%s on %s: %s>' % (self.app_label, self.model_name,
+                                            self.db_name, self._payload)
@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+# Copyright © 2023 VMware, Inc.  All rights reserved.
+# SPDX-License-Identifier: BSD-2-Clause
+
+import json
+import socket
+import threading
+import zlib
+from collections import deque
+
+try:
+    import http.client as httplib
+    from urllib.parse import urlsplit
+except ImportError:
+    import httplib
+    from urlparse import urlsplit
+
+from bridgeql.client.exceptions import ConnectionFailed
+
+CHUNK_SIZE = 64 * 1024
+# methods safe to send again after a connection failure
+IDEMPOTENT_METHODS = ('GET', 'HEAD')
+
+
+class Response(object):
+    """
+    Response of a pooled connection, the connection goes back to the
+    pool once the body is read.
+    """
+
+    def __init__(self, pool, connection, raw):
+        self._pool = pool
+        self._connection = connection
+        self._raw = raw
+        self.status_code = raw.status
+        self.headers = dict((name.lower(), value)
+                            for name, value in raw.getheaders())
+        self._content = None
+        self._decompressor = None
+        if self.headers.get('content-encoding') == 'gzip':
+            self._decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+
+    def _decode(self, data):
+        if self._decompressor is None:
+            return data
+        return self._decompressor.decompress(data)
+
+    @property
+    def content(self):
+        if self._content is None:
+            try:
+                self._content = self._decode(self._raw.read())
+            finally:
+                self.close()
+        return self._content
+
+    def json(self):
+        return json.loads(self.content.decode('utf-8'))
+
+    def iter_chunks(self):
+        # read1 returns what is received without waiting for a full chunk
+        read = getattr(self._raw, 'read1', self._raw.read)
+        try:
+            while True:
+                try:
+                    data = read(CHUNK_SIZE)
+                except (httplib.HTTPException, socket.error) as e:
+                    raise ConnectionFailed('Reading the response failed: %s'
+                                           % e)
+                if not data:
+                    break
+                data = self._decode(data)
+                if data:
+                    yield data
+        finally:
+            self.close()
+
+    def iter_lines(self):
+        pending = b''
+        for chunk in self.iter_chunks():
+            lines = (pending + chunk).split(b'\n')
+            pending = lines.pop()
+            for line in lines:
+                yield line.rstrip(b'\r')
+        if pending:
+            yield pending
+
+    def close(self):
+        if self._connection is None:
+            return
+        connection, self._connection = self._connection, None
+        if self._raw.isclosed() and not self._raw.will_close:
+            self._pool.release(connection)
+        else:
+            # the body was not read entirely, or the server closes
+            self._raw.close()
+            connection.close()
+
+
+class ConnectionPool(object):
+    """
+    Keep-alive connections to a bridgeql server, reused by the requests
+    of every thread. Connections beyond maxsize are closed once used.
+    """
+
+    def __init__(self, base_url, maxsize=10, timeout=30):
+        url = urlsplit(base_url)
+        if url.scheme not in ('http', 'https'):
+            raise ValueError('Invalid bridgeql url %s' % base_url)
+        self.scheme = url.scheme
+        self.host = url.hostname
+        self.port = url.port
+        self.prefix = url.path.rstrip('/')
+        self.maxsize = maxsize
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._idle = deque()
+        self.connections = 0
+
+    def _connect(self):
+        if self.scheme == 'https':
+            connection_class = httplib.HTTPSConnection
+        else:
+            connection_class = httplib.HTTPConnection
+        self.connections += 1
+        return connection_class(self.host, self.port, timeout=self.timeout)
+
+    def acquire(self):
+        with self._lock:
+            if self._idle:
+                return self._idle.pop(), True
+        return self._connect(), False
+
+    def release(self, connection):
+        with self._lock:
+            if len(self._idle) < self.maxsize:
+                self._idle.append(connection)
+                return
+        connection.close()
+
+    def request(self, method, path, body=None, headers=None):
+        connection, reused = self.acquire()
+        try:
+            connection.request(method, self.prefix + path, body,
+                               headers or {})
+            raw = connection.getresponse()
+        except (httplib.HTTPException, socket.error) as e:
+            connection.close()
+            if reused and method in IDEMPOTENT_METHODS and \
+                    not isinstance(e, socket.timeout):
+                # the server closed the idle connection meanwhile, the
+                # other methods may have reached it and are not resent
+                return self.request(method, path, body, headers)
+            raise ConnectionFailed('%s %s failed: %s' % (method, path, e))
+        return Response(self, connection, raw)
+
+    def close(self):
+        with self._lock:
+            while self._idle:
+                self._idle.pop().close()
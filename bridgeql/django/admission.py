@@ -0,0 +1,208 @@
+# -*- coding: utf-8 -*-
+# Copyright © 2023 VMware, Inc.  All rights reserved.
+# SPDX-License-Identifier: BSD-2-Clause
+
+import hashlib
+import math
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from django.apps import apps
+from django.core.cache import caches
+
+from bridgeql.django.exceptions import ServiceUnavailable, TooManyRequests
+from bridgeql.django.settings import bridgeql_settings
+from bridgeql.utils import get_client_ip
+
+# number of client buckets kept in process, the least recently used
+# buckets are dropped first, they are refilled by then most of the time
+MAX_BUCKETS = 10000
+
+
+def get_identity(request):
+    """
+    Identity the rate limit applies to: the token subject, the
+    authenticated user or the client ip.
+    """
+    token = getattr(request, 'bridgeql_token', None)
+    if token is not None:
+        return 'token:%s' % token['sub']
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        return 'user:%s' % user.pk
+    return 'ip:%s' % get_client_ip(request)
+
+
+def take_token(state, now, rate, burst):
+    """
+    Take a token from the bucket state (tokens, updated at), return
+    the new state and the seconds to wait for a token, 0 when taken.
+    """
+    tokens, updated = state if state is not None else (burst, now)
+    tokens = min(burst, tokens + (now - updated) * rate)
+    if tokens >= 1:
+        return (tokens - 1, now), 0
+    return (tokens, now), (1 - tokens) / rate
+
+
+class RateLimiter(object):
+    """
+    Token bucket per client identity, kept in process or in the cache
+    BRIDGEQL_RATE_LIMIT_CACHE when the buckets are shared by processes.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets = OrderedDict()
+
+    def _take_local(self, key, now, rate, burst):
+        with self._lock:
+            state, wait = take_token(self._buckets.pop(key, None),
+                                     now, rate, burst)
+            self._buckets[key] = state
+            while len(self._buckets) > MAX_BUCKETS:
+                self._buckets.popitem(last=False)
+        return wait
+
+    def _take_cache(self, cache, key, now, rate, burst):
+        # read and write are not atomic, concurrent requests of the
+        # same client may be admitted over the rate by a few requests
+        key = 'bridgeql:ratelimit:%s' % hashlib.sha1(
+            key.encode('utf-8')).hexdigest()
+        state, wait = take_token(cache.get(key), now, rate, burst)
+        # a full bucket does not need to be kept
+        cache.set(key, state, int(math.ceil(burst / rate)) + 1)
+        return wait
+
+    def acquire(self, request):
+        config = bridgeql_settings.BRIDGEQL_RATE_LIMIT
+        if not config:
+            return
+        rate = float(config['rate'])
+        burst = float(config.get('burst', rate))
+        key = get_identity(request)
+        now = time.time()
+        cache_alias = bridgeql_settings.BRIDGEQL_RATE_LIMIT_CACHE
+        if cache_alias:
+            wait = self._take_cache(caches[cache_alias], key, now, rate, burst)
+        else:
+            wait = self._take_local(key, now, rate, burst)
+        if wait:
+            raise TooManyRequests(
+                'Rate limit of %s requests per second exceeded' % config['rate'],
+                retry_after=int(math.ceil(wait)))
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+def _get_limit(limits, key):
+    if isinstance(limits, dict):
+        return limits.get(key, limits.get('*'))
+    return limits
+
+
+def _model_label(app_label, model_name):
+    try:
+        return apps.get_model(app_label, model_name)._meta.label
+    except LookupError:
+        # unknown models are reported by the model builder
+        return None
+
+
+class ConcurrencyLimiter(object):
+    """
+    Number of requests in flight per database alias and per model in the
+    process, requests over the limits wait in a bounded queue.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._in_flight = {}
+        self._waiting = 0
+
+    def _limits(self, db_aliases, app_label, model_name):
+        limits = []
+        db_limits = bridgeql_settings.BRIDGEQL_DB_CONCURRENCY
+        model_limits = bridgeql_settings.BRIDGEQL_MODEL_CONCURRENCY
+        for alias in db_aliases if db_limits else []:
+            limit = _get_limit(db_limits, alias)
+            if limit:
+                limits.append((('db', alias), limit))
+        model_label = model_limits and _model_label(app_label, model_name)
+        if model_label:
+            limit = _get_limit(model_limits, model_label)
+            if limit:
+                limits.append((('model', model_label), limit))
+        return limits
+
+    def _available(self, limits):
+        return all(self._in_flight.get(key, 0) < limit
+                   for key, limit in limits)
+
+    def acquire(self, db_aliases, app_label, model_name):
+        limits = self._limits(db_aliases, app_label, model_name)
+        if not limits:
+            return []
+        timeout = bridgeql_settings.BRIDGEQL_ADMISSION_TIMEOUT
+        with self._cond:
+            if not self._available(limits):
+                if self._waiting >= bridgeql_settings.BRIDGEQL_ADMISSION_QUEUE_SIZE:
+                    raise ServiceUnavailable(
+                        'Too many requests in flight', retry_after=1)
+                deadline = time.time() + timeout
+                self._waiting += 1
+                try:
+                    while not self._available(limits):
+                        remaining = deadline - time.time()
+                        if remaining <= 0:
+                            raise ServiceUnavailable(
+                                'Timed out waiting for a query slot',
+                                retry_after=int(math.ceil(timeout)) or 1)
+                        self._cond.wait(remaining)
+                finally:
+                    self._waiting -= 1
+            for key, _ in limits:
+                self._in_flight[key] = self._in_flight.get(key, 0) + 1
+        return limits
+
+    def release(self, limits):
+        if not limits:
+            return
+        with self._cond:
+            for key, _ in limits:
+                self._in_flight[key] -= 1
+            self._cond.notify_all()
+
+    def in_flight(self, kind, name):
+        return self._in_flight.get((kind, name), 0)
+
+
+rate_limiter = RateLimiter()
+concurrency_limiter = ConcurrencyLimiter()
+
+
+@contextmanager
+def hold_slots(db_aliases, app_label, model_name):
+    """
+    Hold a slot of the databases and the model until the context exits.
+    """
+    limits = concurrency_limiter.acquire(db_aliases, app_label, model_name)
+    try:
+        yield
+    finally:
+        concurrency_limiter.release(limits)
+
+
+@contextmanager
+def admit(request, db_aliases, app_label, model_name):
+    """
+    Admit the request within the rate limit of the client and hold a
+    slot of the databases and the model until the context exits.
+    """
+    rate_limiter.acquire(request)
+    with hold_slots(db_aliases, app_label, model_name):
+        yield
@@ -0,0 +1,17 @@
+# -*- coding: utf-8 -*-
+# Copyright © 2023 VMware, Inc.  All rights reserved.
+# SPDX-License-Identifier: BSD-2-Clause
+
+import django
+
+
+def get_asgi_application():
+    """
+    Return the ASGI application of the project, serving the event
+    streams of the subscriptions, in place of
+    django.core.asgi.get_asgi_application.
+    """
+    django.setup(set_prefix=False)
+    # the handler imports the models
+    from bridgeql.django.handlers import BridgeqlASGIHandler
+    return BridgeqlASGIHandler()
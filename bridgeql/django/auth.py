@@ -2,41 +2,313 @@
 # Copyright © 2023 VMware, Inc.  All rights reserved.
 # SPDX-License-Identifier: BSD-2-Clause
 
+import base64
+import binascii
+import copy
+import functools
+import json
+import threading
+import time
+from collections import OrderedDict
+
+import django
+from django.conf import settings
 from django.http import HttpResponse
+from django.utils.crypto import constant_time_compare, salted_hmac
+from django.utils.encoding import force_bytes
 from django.contrib.auth import authenticate
+from django.db.models.signals import post_delete, post_save
 
+from bridgeql.django.exceptions import ObjectNotFound
 from bridgeql.django.settings import bridgeql_settings
 from bridgeql.utils import b64decode, load_function
 
 
+class CredentialCache(object):
+    """
+    Bounded LRU cache of the users verified by basic_auth, so that repeated
+    requests with the same Authorization header skip the password hasher.
+    Entries are keyed by an HMAC of the header, the credentials themselves
+    are never kept.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def key(self, header):
+        return salted_hmac('bridgeql.credential_cache', header).hexdigest()
+
+    def get(self, header):
+        if not bridgeql_settings.BRIDGEQL_AUTH_CACHE_TTL:
+            return None
+        key = self.key(header)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            user, expires = entry
+            # reinserted as the most recently used entry
+            del self._entries[key]
+            if expires <= time.time():
+                return None
+            self._entries[key] = entry
+        # every request gets its own instance of the user
+        return copy.copy(user)
+
+    def set(self, header, user):
+        ttl = bridgeql_settings.BRIDGEQL_AUTH_CACHE_TTL
+        size = bridgeql_settings.BRIDGEQL_AUTH_CACHE_SIZE
+        if not ttl or not size:
+            return
+        key = self.key(header)
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (copy.copy(user), time.time() + ttl)
+            while len(self._entries) > size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_pk):
+        with self._lock:
+            for key in [key for key, (user, _) in self._entries.items()
+                        if user.pk == user_pk]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+credential_cache = CredentialCache()
+
+
+def _invalidate_user(sender, instance, **kwargs):
+    # password change, deactivation or deletion of the user
+    credential_cache.invalidate(instance.pk)
+
+
+post_save.connect(_invalidate_user, sender=settings.AUTH_USER_MODEL,
+                  dispatch_uid='bridgeql_credential_cache_save')
+post_delete.connect(_invalidate_user, sender=settings.AUTH_USER_MODEL,
+                    dispatch_uid='bridgeql_credential_cache_delete')
+
+
+def _basic_auth_user(header):
+    parts = header.split()
+    if len(parts) != 2 or parts[0].lower() != 'basic':
+        return None
+    user = credential_cache.get(header)
+    if user is not None:
+        return user
+    try:
+        uname, passwd = b64decode(parts[1]).split(':', 1)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        return None
+    user = authenticate(username=uname, password=passwd)
+    if user is None or not user.is_active:
+        return None
+    credential_cache.set(header, user)
+    return user
+
+
 def basic_auth(api):
     def wrap(request, *args, **kwargs):
-        auth = request.META.get('HTTP_AUTHORIZATION', '')
-        if auth and len(auth.split()) == 2:
-            if auth[0].lower() == "basic":
-                uname, passwd = b64decode(auth[1]).split(':', 1)
-                user = authenticate(username=uname, password=passwd)
-                if user is not None and user.is_active:
-                    request.user = user
-                    return api(request, *args, **kwargs)
+        user = _basic_auth_user(request.META.get('HTTP_AUTHORIZATION', ''))
+        if user is not None:
+            request.user = user
+            return api(request, *args, **kwargs)
         response = HttpResponse(status=401)
         response['WWW-Authenticate'] = 'Basic base64(user:password)'
         return response
     return wrap
 
 
-reader_auth = bridgeql_settings.BRIDGEQL_AUTHENTICATION_DECORATOR.get(
-    'reader', None
-)
-writer_auth = bridgeql_settings.BRIDGEQL_AUTHENTICATION_DECORATOR.get(
-    'writer', None
-)
-if reader_auth:
-    read_auth_decorator = load_function(reader_auth)
-else:
-    def read_auth_decorator(func): return func
-
-if writer_auth:
-    write_auth_decorator = load_function(writer_auth)
-else:
-    def write_auth_decorator(func): return func
+class InvalidToken(Exception):
+    pass
+
+
+def _urlsafe_b64encode(data):
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode('ascii')
+
+
+def _urlsafe_b64decode(data):
+    data = force_bytes(data)
+    return base64.urlsafe_b64decode(data + b'=' * (-len(data) % 4))
+
+
+def get_token_secrets():
+    """
+    Secrets used to verify the tokens, the first one signs new tokens.
+    """
+    secrets = bridgeql_settings.BRIDGEQL_TOKEN_SECRET or settings.SECRET_KEY
+    if not isinstance(secrets, (list, tuple)):
+        secrets = [secrets]
+    return [force_bytes(secret) for secret in secrets]
+
+
+def _sign(payload, secret):
+    # the secret is salted, tokens never share a key with the sessions
+    if django.VERSION >= (3, 1):
+        return salted_hmac('bridgeql.token', payload, secret,
+                           algorithm='sha256').digest()
+    return salted_hmac('bridgeql.token', payload, secret).digest()
+
+
+def make_token(subject, scopes, expires_in=3600):
+    """
+    Return a signed token for subject valid for expires_in seconds.
+    scopes are strings such as 'read:machine.*' or 'write:machine.Machine'.
+    """
+    payload = _urlsafe_b64encode(force_bytes(json.dumps({
+        'sub': subject,
+        'exp': int(time.time() + expires_in),
+        'scopes': list(scopes),
+    }, separators=(',', ':'))))
+    return '%s.%s' % (payload, _urlsafe_b64encode(
+        _sign(payload, get_token_secrets()[0])))
+
+
+def verify_token(token):
+    """
+    Return the payload of a signed and unexpired token, no database access.
+    """
+    try:
+        payload, signature = token.split('.')
+        signature = _urlsafe_b64decode(signature)
+    except (ValueError, TypeError, binascii.Error):
+        raise InvalidToken('Malformed token')
+    if not any(constant_time_compare(_sign(payload, secret), signature)
+               for secret in get_token_secrets()):
+        raise InvalidToken('Invalid token signature')
+    try:
+        claims = json.loads(_urlsafe_b64decode(payload).decode('utf-8'))
+        expires = float(claims['exp'])
+        scopes = claims['scopes']
+    except (ValueError, TypeError, KeyError, binascii.Error):
+        raise InvalidToken('Malformed token payload')
+    if expires <= time.time():
+        raise InvalidToken('Token expired')
+    if not isinstance(scopes, list):
+        raise InvalidToken('Malformed token scopes')
+    return claims
+
+
+def token_allows(claims, access, app_label=None, model_name=None):
+    """
+    Check the scopes of the token for an access (read or write) on a model,
+    any scope of the access is enough for the endpoints without model.
+    """
+    for scope in claims['scopes']:
+        scope_access, _, models = str(scope).partition(':')
+        if scope_access != access:
+            continue
+        if app_label is None or models == '*':
+            return True
+        scope_app, _, scope_model = models.partition('.')
+        # model names are case insensitive as for apps.get_model
+        if scope_app == app_label and (
+                scope_model == '*' or
+                scope_model.lower() == str(model_name).lower()):
+            return True
+    return False
+
+
+def _token_auth(access):
+    def decorator(api):
+        def wrap(request, *args, **kwargs):
+            header = request.META.get('HTTP_AUTHORIZATION', '').split()
+            if len(header) != 2 or header[0].lower() != 'bearer':
+                response = HttpResponse(status=401)
+                response['WWW-Authenticate'] = 'Bearer'
+                return response
+            try:
+                claims = verify_token(header[1])
+            except InvalidToken:
+                response = HttpResponse(status=401)
+                response['WWW-Authenticate'] = 'Bearer error="invalid_token"'
+                return response
+            app_label = kwargs.get('app_label')
+            model_name = kwargs.get('model_name')
+            if 'query_name' in kwargs:
+                from bridgeql.django.named import named_queries
+                try:
+                    named_query = named_queries.get(kwargs['query_name'])
+                    app_label = named_query.app_label
+                    model_name = named_query.model_name
+                except ObjectNotFound:
+                    # reported by the view
+                    pass
+            if not token_allows(claims, access, app_label, model_name):
+                response = HttpResponse(status=403)
+                response['WWW-Authenticate'] = \
+                    'Bearer error="insufficient_scope"'
+                return response
+            request.bridgeql_token = claims
+            return api(request, *args, **kwargs)
+        return wrap
+    return decorator
+
+
+read_token_auth = _token_auth('read')
+write_token_auth = _token_auth('write')
+
+
+def _no_auth(func):
+    return func
+
+
+def _load_auth_decorator(role):
+    decorators = bridgeql_settings.auth_decorators
+    if role == 'explain':
+        # query plans reveal the schema and data distribution,
+        # only writers or staff members are allowed to look at them
+        if decorators.get('writer'):
+            return _load_auth_decorator('writer')
+        from django.contrib.admin.views.decorators import \
+            staff_member_required
+        return staff_member_required
+    if decorators.get(role):
+        return load_function(decorators[role])
+    return _no_auth
+
+
+def get_auth_decorator(role):
+    """
+    Return the decorator of settings.BRIDGEQL_AUTHENTICATION_DECORATOR
+    for role, reader, writer or explain, loaded once per settings.
+    """
+    return bridgeql_settings.cached('auth_decorator.%s' % role,
+                                    lambda: _load_auth_decorator(role))
+
+
+def load_auth_decorators():
+    for role in ('reader', 'writer', 'explain'):
+        get_auth_decorator(role)
+
+
+def _lazy_auth(role):
+    """
+    Decorate the views with the decorator of role once it is loaded, so
+    that importing the views does not load the decorators.
+    """
+    def decorator(api):
+        state = {}
+
+        @functools.wraps(api)
+        def wrap(request, *args, **kwargs):
+            auth = get_auth_decorator(role)
+            decorated = state.get('view')
+            if decorated is None or decorated[0] is not auth:
+                # decorated again when the settings change
+                decorated = state['view'] = (auth, auth(api))
+            return decorated[1](request, *args, **kwargs)
+        return wrap
+    return decorator
+
+
+read_auth_decorator = _lazy_auth('reader')
+write_auth_decorator = _lazy_auth('writer')
+explain_auth_decorator = _lazy_auth('explain')
@@ -2,92 +2,403 @@
 # Copyright © 2023 VMware, Inc.  All rights reserved.
 # SPDX-License-Identifier: BSD-2-Clause
 
+import copy
 import json
 
+from django.http import HttpResponse
 from django.views.decorators.http import require_http_methods
 from django.views.decorators.csrf import csrf_exempt
 
-from bridgeql.django.auth import read_auth_decorator, write_auth_decorator
-from bridgeql.django.exceptions import BridgeqlException
-from bridgeql.django.helpers import JSONResponse, get_json_request_body
-from bridgeql.django.models import ModelBuilder, ModelObject
+from bridgeql.django.admission import admit, hold_slots, rate_limiter
+from bridgeql.django.auth import (
+    explain_auth_decorator,
+    read_auth_decorator,
+    write_auth_decorator
+)
+from bridgeql.django.changes import ChangeFeed, batch_size, parse_since
+from bridgeql.django.exceptions import (
+    BridgeqlException,
+    InvalidRequest,
+    ObjectNotFound
+)
+from bridgeql.django.explain import explain
+from bridgeql.django.export import (
+    RANGE,
+    Export,
+    partition_count,
+    stream_rows
+)
+from bridgeql.django.fanout import FanoutBuilder, resolve_db_names
+from bridgeql.django.events import event_bus
+from bridgeql.django.helpers import (
+    conditional_response,
+    decode_request_body,
+    get_json_request_body,
+    negotiate,
+    render_response
+)
+from bridgeql.django.models import (
+    ModelBuilder,
+    ModelConfig,
+    ModelObject,
+    Parameters
+)
+from bridgeql.django.named import named_queries
+from bridgeql.django.routing import read_router
+from bridgeql.django.settings import bridgeql_settings
+from bridgeql.django.singleflight import flight_key, single_flight
+from bridgeql.django.subscriptions import (
+    EventStreamResponse,
+    Subscription,
+    accepts_stream,
+    wait_timeout
+)
+from bridgeql.django.timing import timed
+
+
+def error_response(request, e):
+    e.log()
+    request.bridgeql_timer.exception = e
+    res = {'data': [], 'message': str(e.detail), 'success': False}
+    response = render_response(request, res, status=e.status_code)
+    if getattr(e, 'retry_after', None):
+        response['Retry-After'] = str(e.retry_after)
+    return response
 
 
 @csrf_exempt
+@timed('create')
 @require_http_methods(['POST'])
 @write_auth_decorator
 def create_django_model(request, db_name, app_label, model_name):
+    timer = request.bridgeql_timer
     try:
-        params = get_json_request_body(request.body)
-        mo = ModelObject(app_label, model_name, db_name)
-        obj = mo.create(params)
+        with timer.phase('parse'):
+            params = get_json_request_body(request.body,
+                                           request.content_type)
+        db_alias = read_router.primary(db_name)
+        with admit(request, [db_alias], app_label, model_name), \
+                timer.phase('write'), timer.database(db_alias):
+            mo = ModelObject(app_label, model_name, db_alias)
+            obj = mo.create(params)
         msg = 'Added new object of %s with pk=%s' % (
             model_name,
             obj.pk
         )
         res = {'data': obj.id, 'message': msg, 'success': True}
-        return JSONResponse(res, status=201)
+        with timer.phase('serialize'):
+            response = render_response(request, res, status=201)
+        return read_router.stick(response, db_name)
     except BridgeqlException as e:
-        e.log()
-        res = {'data': [], 'message': str(e.detail), 'success': False}
-        return JSONResponse(res, status=e.status_code)
+        return error_response(request, e)
 
 
-@require_http_methods(['GET'])
+# reads do not change any state, POST only carries large payloads
+@csrf_exempt
+@timed('read')
+@require_http_methods(['GET', 'POST'])
 @read_auth_decorator
 def read_django_model(request, db_name, app_label, model_name, pk=None):
+    timer = request.bridgeql_timer
     try:
-        if pk:
-            params = {
-                'filter': {
-                    'pk': pk
+        with timer.phase('parse'):
+            if pk:
+                params = {
+                    'filter': {
+                        'pk': pk
+                    }
                 }
-            }
+            elif request.method == 'POST':
+                params = get_json_request_body(request.body,
+                                               request.content_type)
+            else:
+                params = request.GET.get('payload', None)
+                params = json.loads(params)
+        db_names = resolve_db_names(db_name)
+        if db_names:
+            db_aliases = [read_router.route(request, name)
+                          for name in db_names]
+            with admit(request, db_aliases, app_label, model_name):
+                with timer.phase('validate'):
+                    mb = FanoutBuilder(db_aliases, app_label, model_name,
+                                       params, timer=timer)
+                with timer.phase('execute'):
+                    qset = mb.queryset()
+            timer.rows = len(qset) if isinstance(qset, list) else 1
+            timer.params, timer.query = params, mb.qset
+            with timer.phase('serialize'):
+                return conditional_response(request, render_response(
+                    request, _read_result(qset, mb, params)))
+        db_alias = read_router.route(request, db_name)
+        rate_limiter.acquire(request)
+        if not bridgeql_settings.BRIDGEQL_SINGLEFLIGHT:
+            return conditional_response(request, _read_model(
+                request, db_alias, app_label, model_name, params)[0])
+        # requests negotiating another encoding can not share the content
+        key = flight_key(db_alias, app_label, model_name,
+                         [negotiate(request), params])
+        (response, rows), shared = single_flight.do(
+            key, lambda: _read_model(request, db_alias, app_label,
+                                     model_name, params))
+        if shared:
+            # identical read run for another request, share its content
+            timer.rows = rows
+            response = HttpResponse(response.content,
+                                    content_type=response['Content-Type'],
+                                    status=response.status_code)
+            response['Vary'] = 'Accept'
+        return conditional_response(request, response)
+    except BridgeqlException as e:
+        return error_response(request, e)
+
+
+def _read_result(qset, mb, params):
+    res = {'data': qset, 'message': '', 'success': True}
+    if params.get('count') == Parameters.COUNT_ESTIMATE:
+        res['approximate'] = mb.approximate
+    return res
+
+
+def _read_model(request, db_alias, app_label, model_name, params):
+    timer = request.bridgeql_timer
+    with hold_slots([db_alias], app_label, model_name), \
+            read_router.using(db_alias), timer.database(db_alias):
+        with timer.phase('validate'):
+            # the builder pops the __or filters, the timer keeps the
+            # payload whole for the slow query fingerprints
+            mb = ModelBuilder(db_alias, app_label, model_name,
+                              copy.deepcopy(params))
+        with timer.phase('compile'):
+            mb.compile()
+        with timer.phase('execute'):
+            qset = mb.run()  # get the result based on the given parameters
+    timer.rows = len(qset) if isinstance(qset, list) else 1
+    timer.params, timer.query = params, mb.qset
+    with timer.phase('serialize'):
+        return render_response(request, _read_result(qset, mb, params)), \
+            timer.rows
+
+
+@timed('query')
+@require_http_methods(['GET'])
+@read_auth_decorator
+def run_named_query(request, query_name):
+    timer = request.bridgeql_timer
+    try:
+        named_query = named_queries.get(query_name)
+        timer.app_label = named_query.app_label
+        timer.model_name = named_query.model_name
+        db_alias = read_router.route(request, named_query.db_name)
+        with admit(request, [db_alias], named_query.app_label,
+                   named_query.model_name), \
+                read_router.using(db_alias), timer.database(db_alias):
+            with timer.phase('parse'):
+                mb = named_query.builder(db_alias, request.GET)
+            with timer.phase('compile'):
+                mb.compile()
+            with timer.phase('execute'):
+                qset = mb.run()
+        timer.rows = len(qset) if isinstance(qset, list) else 1
+        timer.params, timer.query = mb.params.params, mb.qset
+        with timer.phase('serialize'):
+            return conditional_response(request, render_response(
+                request, _read_result(qset, mb, mb.params.params)))
+    except BridgeqlException as e:
+        return error_response(request, e)
+
+
+@timed('changes')
+@require_http_methods(['GET'])
+@read_auth_decorator
+def read_django_model_changes(request, db_name, app_label, model_name):
+    timer = request.bridgeql_timer
+    try:
+        with timer.phase('parse'):
+            since = parse_since(request.GET.get('since'))
+            limit = batch_size(request.GET.get('limit'))
+            fields = request.GET.getlist('fields')
+        db_alias = read_router.route(request, db_name)
+        with admit(request, [db_alias], app_label, model_name), \
+                read_router.using(db_alias), timer.database(db_alias):
+            with timer.phase('validate'):
+                feed = ChangeFeed(db_alias, app_label, model_name)
+            with timer.phase('execute'):
+                changes = feed.read(since, limit, fields)
+        timer.rows = len(changes['created']) + len(changes['updated']) + \
+            len(changes['deleted'])
+        with timer.phase('serialize'):
+            return render_response(
+                request, {'data': changes, 'message': '', 'success': True})
+    except BridgeqlException as e:
+        return error_response(request, e)
+
+
+def _read_params(request):
+    if request.method == 'POST':
+        return get_json_request_body(request.body, request.content_type)
+    return decode_request_body(request.GET.get('payload') or '{}')
+
+
+@csrf_exempt
+@timed('partitions')
+@require_http_methods(['GET', 'POST'])
+@read_auth_decorator
+def partition_django_model(request, db_name, app_label, model_name):
+    timer = request.bridgeql_timer
+    try:
+        with timer.phase('parse'):
+            params = _read_params(request)
+            count = partition_count(request.GET.get('partitions'))
+            split = request.GET.get('split', RANGE)
+        db_alias = read_router.route(request, db_name)
+        with admit(request, [db_alias], app_label, model_name), \
+                read_router.using(db_alias), timer.database(db_alias):
+            with timer.phase('validate'):
+                export = Export(db_alias, app_label, model_name, params)
+            with timer.phase('execute'):
+                partitions = export.partitions(count, split)
+        timer.rows = len(partitions)
+        with timer.phase('serialize'):
+            return render_response(
+                request, {'data': partitions, 'message': '', 'success': True})
+    except BridgeqlException as e:
+        return error_response(request, e)
+
+
+# the batches of the stream each hold an admission slot
+@csrf_exempt
+@timed('export')
+@require_http_methods(['GET', 'POST'])
+@read_auth_decorator
+def export_django_model(request, db_name, app_label, model_name):
+    timer = request.bridgeql_timer
+    try:
+        rate_limiter.acquire(request)
+        with timer.phase('parse'):
+            params = _read_params(request)
+        db_alias = read_router.route(request, db_name)
+        with timer.phase('validate'):
+            export = Export(db_alias, app_label, model_name, params)
+            after = export.parse_pk(request.GET.get('after'))
+        return stream_rows(export, after)
+    except BridgeqlException as e:
+        return error_response(request, e)
+
+
+# long-polls and streams hold no admission slot while they wait
+@timed('subscribe')
+@require_http_methods(['GET'])
+@read_auth_decorator
+def subscribe_django_model(request, db_name, app_label, model_name):
+    timer = request.bridgeql_timer
+    try:
+        rate_limiter.acquire(request)
+        with timer.phase('parse'):
+            timeout = wait_timeout(request.GET.get('timeout'))
+            stream = accepts_stream(request)
+        subscription_id = request.GET.get('subscription')
+        if subscription_id:
+            # next poll of a long-poll subscription
+            subscription = event_bus.get(subscription_id)
+            if subscription.model is not \
+                    ModelConfig(app_label, model_name).model:
+                raise ObjectNotFound('Unknown subscription %s to %s.%s'
+                                     % (subscription_id, app_label,
+                                        model_name))
+        else:
+            with timer.phase('parse'):
+                params = decode_request_body(
+                    request.GET.get('payload') or '{}')
+            with timer.phase('validate'):
+                subscription = Subscription(read_router.primary(db_name),
+                                            app_label, model_name, params)
+            event_bus.subscribe(subscription)
+        if stream:
+            return EventStreamResponse(subscription)
+        events = subscription.wait(timeout)
+        timer.rows = len(events)
+        res = {'data': events, 'subscription': subscription.id,
+               'message': '', 'success': True}
+        with timer.phase('serialize'):
+            return render_response(request, res)
+    except BridgeqlException as e:
+        return error_response(request, e)
+
+
+# explains do not change any state, POST only carries large payloads
+@csrf_exempt
+@timed('explain')
+@require_http_methods(['GET', 'POST'])
+@explain_auth_decorator
+def explain_django_model(request, db_name, app_label, model_name):
+    try:
+        if request.method == 'POST':
+            params = get_json_request_body(request.body,
+                                           request.content_type)
         else:
-            params = request.GET.get('payload', None)
-            params = json.loads(params)
-        mb = ModelBuilder(db_name, app_label, model_name, params)
-        qset = mb.queryset()  # get the result based on the given parameters
-        res = {'data': qset, 'message': '', 'success': True}
-        return JSONResponse(res)
+            payload = request.GET.get('payload')
+            if payload is None:
+                raise InvalidRequest('payload is not present in request')
+            params = decode_request_body(payload)
+        if not isinstance(params, dict):
+            raise InvalidRequest(
+                'Incorrect payload type, Expected dict, got %s'
+                % type(params))
+        analyze = request.GET.get('analyze', '').lower() in ('1', 'true')
+        db_alias = read_router.route(request, db_name)
+        with admit(request, [db_alias], app_label, model_name):
+            plan = explain(db_alias, app_label, model_name, params,
+                           analyze=analyze)
+        res = {'data': plan, 'message': '', 'success': True}
+        return render_response(request, res)
     except BridgeqlException as e:
-        e.log()
-        res = {'data': [], 'message': str(e.detail), 'success': False}
-        return JSONResponse(res, status=e.status_code)
+        return error_response(request, e)
 
 
 # no session to ride, hence no need for csrf protection
 @csrf_exempt
+@timed('update')
 @require_http_methods(['PATCH'])
 @write_auth_decorator
 def update_django_model(request, db_name, app_label, model_name, pk):
+    timer = request.bridgeql_timer
     try:
-        params = get_json_request_body(request.body)
-        mo = ModelObject(app_label, model_name, db_name, pk=pk)
-        obj = mo.update(params)
+        with timer.phase('parse'):
+            params = get_json_request_body(request.body,
+                                           request.content_type)
+        db_alias = read_router.primary(db_name)
+        with admit(request, [db_alias], app_label, model_name), \
+                timer.phase('write'), timer.database(db_alias):
+            mo = ModelObject(app_label, model_name, db_alias, pk=pk)
+            obj = mo.update(params)
         msg = 'Updated %s with pk=%s, fields=%s' % (
             model_name,
             obj.pk,
             ", ".join(params.keys()))
         res = {'data': obj.id, 'message': msg, 'success': True}
-        return JSONResponse(res)
+        with timer.phase('serialize'):
+            response = render_response(request, res)
+        return read_router.stick(response, db_name)
     except BridgeqlException as e:
-        e.log()
-        res = {'data': [], 'message': str(e.detail), 'success': False}
-        return JSONResponse(res, status=e.status_code)
+        return error_response(request, e)
 
 
 @csrf_exempt
+@timed('delete')
 @require_http_methods(['DELETE'])
 @write_auth_decorator
 def delete_django_model(request, db_name, app_label, model_name, pk):
+    timer = request.bridgeql_timer
     try:
-        mo = ModelObject(app_label, model_name, db_name, pk=pk)
-        obj = mo.delete()
+        db_alias = read_router.primary(db_name)
+        with admit(request, [db_alias], app_label, model_name), \
+                timer.phase('write'), timer.database(db_alias):
+            mo = ModelObject(app_label, model_name, db_alias, pk=pk)
+            obj = mo.delete()
         msg = 'Deleted %s with pk=%s' % (model_name, pk)
         res = {'data': obj, 'message': msg, 'success': True}
-        return JSONResponse(res)
+        with timer.phase('serialize'):
+            response = render_response(request, res)
+        return read_router.stick(response, db_name)
     except BridgeqlException as e:
-        e.log()
-        res = {'data': [], 'message': str(e.detail), 'success': False}
-        return JSONResponse(res, status=e.status_code)
+        return error_response(request, e)
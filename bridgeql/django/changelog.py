@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+# Copyright © 2023 VMware, Inc.  All rights reserved.
+# SPDX-License-Identifier: BSD-2-Clause
+
+from contextlib import contextmanager
+
+from django.db import transaction
+from django.db.models.signals import (
+    post_delete,
+    post_save,
+    pre_delete,
+    pre_save
+)
+
+from bridgeql.django.events import event_bus
+from bridgeql.django.settings import bridgeql_settings
+from bridgeql.models import ChangeLog
+
+# attribute of the instances holding the rows matched before a write
+MATCHED_ATTR = '_bridgeql_matched'
+
+
+def _tracked_labels():
+    return frozenset(label.lower() for label in
+                     bridgeql_settings.BRIDGEQL_CHANGE_FEED_MODELS)
+
+
+def is_tracked(model):
+    """
+    Return True when the writes to model are logged for its change feed.
+    """
+    return model._meta.label_lower in bridgeql_settings.cached(
+        'tracked_models', _tracked_labels)
+
+
+def record_change(model, pk, action, using=None):
+    ChangeLog.objects.using(using).create(
+        app_label=model._meta.app_label,
+        model_name=model._meta.model_name,
+        object_pk=str(pk),
+        action=action)
+
+
+def track(model, pk, action, using=None, matched=None):
+    """
+    Log a write and publish its event to the subscriptions.
+    """
+    record_change(model, pk, action, using)
+    event_bus.publish(model, pk, action, using, matched)
+
+
+@contextmanager
+def tracked_write(instance, action, using=None):
+    """
+    Track the write of instance done in the block, in its transaction.
+    The writes are tracked by the model signals instead when
+    settings.BRIDGEQL_CHANGE_FEED_SIGNALS is set.
+    """
+    model = type(instance)
+    if not is_tracked(model) or \
+            bridgeql_settings.BRIDGEQL_CHANGE_FEED_SIGNALS:
+        yield
+        return
+    # the instance loses its pk once deleted
+    pk = instance.pk
+    with transaction.atomic(using=using):
+        matched = None
+        if action != ChangeLog.CREATED:
+            matched = event_bus.match(model, pk, using)
+        yield
+        if action == ChangeLog.CREATED:
+            pk = instance.pk
+        track(model, pk, action, using, matched)
+
+
+def _tracks_signals(sender):
+    return bridgeql_settings.BRIDGEQL_CHANGE_FEED_SIGNALS and \
+        sender is not ChangeLog and is_tracked(sender)
+
+
+def _match_save(sender, instance, raw=False, using=None, **kwargs):
+    if raw or instance._state.adding or not _tracks_signals(sender):
+        return
+    setattr(instance, MATCHED_ATTR, event_bus.match(sender, instance.pk,
+                                                    using))
+
+
+def _log_save(sender, instance, created=False, raw=False, using=None,
+              **kwargs):
+    # raw saves are fixtures being loaded
+    if raw or not _tracks_signals(sender):
+        return
+    track(sender, instance.pk,
+          ChangeLog.CREATED if created else ChangeLog.UPDATED, using,
+          instance.__dict__.pop(MATCHED_ATTR, None))
+
+
+def _match_delete(sender, instance, using=None, **kwargs):
+    if _tracks_signals(sender):
+        setattr(instance, MATCHED_ATTR, event_bus.match(sender, instance.pk,
+                                                        using))
+
+
+def _log_delete(sender, instance, using=None, **kwargs):
+    if _tracks_signals(sender):
+        track(sender, instance.pk, ChangeLog.DELETED, using,
+              instance.__dict__.pop(MATCHED_ATTR, None))
+
+
+pre_save.connect(_match_save, dispatch_uid='bridgeql_change_feed_pre_save')
+post_save.connect(_log_save, dispatch_uid='bridgeql_change_feed_save')
+pre_delete.connect(_match_delete,
+                   dispatch_uid='bridgeql_change_feed_pre_delete')
+post_delete.connect(_log_delete, dispatch_uid='bridgeql_change_feed_delete')
@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+# Copyright © 2023 VMware, Inc.  All rights reserved.
+# SPDX-License-Identifier: BSD-2-Clause
+
+from collections import OrderedDict
+from datetime import timedelta
+
+from django.db import connections, router, transaction
+from django.db.models import Max, Min
+from django.utils import timezone
+
+from bridgeql.django.changelog import is_tracked
+from bridgeql.django.exceptions import (
+    InvalidRequest,
+    ObjectNotFound,
+    ResyncRequired
+)
+from bridgeql.django.models import ModelBuilder, ModelConfig
+from bridgeql.django.settings import bridgeql_settings
+from bridgeql.models import ChangeLog
+
+LATEST = 'latest'
+
+
+def parse_since(value):
+    """
+    Return the log id of a since token, None for the latest one.
+    """
+    if not value:
+        return 0
+    if value == LATEST:
+        return None
+    try:
+        since = int(value)
+    except ValueError:
+        since = -1
+    if since < 0:
+        raise InvalidRequest('Invalid since token %s' % value)
+    return since
+
+
+def batch_size(limit=None):
+    """
+    Return the number of log entries to read at most for a batch.
+    """
+    max_size = bridgeql_settings.BRIDGEQL_CHANGE_FEED_BATCH_SIZE
+    if bridgeql_settings.BRIDGEQL_MAX_LIMIT:
+        # the rows of a batch are read at once
+        max_size = min(max_size, bridgeql_settings.BRIDGEQL_MAX_LIMIT)
+    if limit is None:
+        return max_size
+    try:
+        limit = int(limit)
+    except ValueError:
+        limit = 0
+    if not 0 < limit <= max_size:
+        raise InvalidRequest('Invalid limit %s, expected 1 to %s'
+                             % (limit, max_size))
+    return limit
+
+
+def prune_changes(using=None, retention=None, batch_size=10000):
+    """
+    Delete the change log entries older than retention seconds, by
+    batches of ids, and return their number. The pruned ids are the
+    lowest ones, the newest pruned entry is kept to tell the tokens
+    older than the retained entries.
+    """
+    if retention is None:
+        retention = bridgeql_settings.BRIDGEQL_CHANGE_FEED_RETENTION
+        if retention is None:
+            # the entries are kept for good
+            return 0
+    using = using or router.db_for_write(ChangeLog)
+    entries = ChangeLog.objects.using(using)
+    cutoff = timezone.now() - timedelta(seconds=retention)
+    bounds = entries.filter(changed_at__lt=cutoff).aggregate(
+        lower=Min('id'), upper=Max('id'))
+    lower, upper = bounds['lower'], bounds['upper']
+    if lower is None or lower == upper:
+        return 0
+    connection = connections[using]
+    column = connection.ops.quote_name(ChangeLog._meta.pk.column)
+    sql = 'DELETE FROM %s WHERE %s >= %%s AND %s < %%s' % (
+        connection.ops.quote_name(ChangeLog._meta.db_table), column, column)
+    deleted = 0
+    for start in range(lower, upper, batch_size):
+        # a transaction per batch keeps the locks short
+        with transaction.atomic(using=using), connection.cursor() as cursor:
+            cursor.execute(sql, [start, min(start + batch_size, upper)])
+            deleted += cursor.rowcount
+    return deleted
+
+
+class ChangeFeed(object):
+    """
+    Changes of a model after a since token, the tokens are the ids
+    of the change log hence increase with every write.
+    """
+
+    def __init__(self, db_alias, app_label, model_name):
+        self.db_alias = db_alias
+        self.model_config = ModelConfig(app_label, model_name)
+        self.model = self.model_config.model
+        if not is_tracked(self.model):
+            raise ObjectNotFound('No change feed for model %s'
+                                 % self.model_config.full_model_name)
+
+    def _entries(self):
+        entries = ChangeLog.objects.using(self.db_alias).filter(
+            app_label=self.model._meta.app_label,
+            model_name=self.model._meta.model_name)
+        delay = bridgeql_settings.BRIDGEQL_CHANGE_FEED_DELAY
+        if delay:
+            # leave the transactions still running time to commit
+            # the entries of lower ids
+            entries = entries.filter(
+                changed_at__lte=timezone.now() - timedelta(seconds=delay))
+        return entries
+
+    def check_retained(self, since):
+        """
+        Raise ResyncRequired when entries after since were pruned.
+        """
+        oldest = ChangeLog.objects.using(self.db_alias).order_by('id').only(
+            'id', 'changed_at').first()
+        if oldest is None or since >= oldest.id - 1:
+            return
+        retention = bridgeql_settings.BRIDGEQL_CHANGE_FEED_RETENTION
+        # the ids below the first entries may only be rolled back writes
+        if retention is not None and oldest.changed_at < \
+                timezone.now() - timedelta(seconds=retention):
+            raise ResyncRequired('The changes since %s were pruned, read '
+                                 'the whole table again' % since)
+
+    def latest(self):
+        return self._entries().aggregate(latest=Max('id'))['latest'] or 0
+
+    def read(self, since, limit, fields=None):
+        """
+        Return the pks created, updated and deleted after since in a
+        batch of limit log entries at most, and the token of the next
+        batch. The current rows of the created and updated pks are
+        read when fields are given.
+        """
+        if since is None:
+            since = self.latest()
+            entries = []
+        else:
+            self.check_retained(since)
+            entries = list(self._entries().filter(id__gt=since).order_by(
+                'id').values_list('id', 'object_pk', 'action')[:limit + 1])
+        more = len(entries) > limit
+        entries = entries[:limit]
+        # first and last action of every pk in the batch
+        actions = OrderedDict()
+        for _, pk, action in entries:
+            actions.setdefault(pk, [action, action])[1] = action
+        changes = {
+            ChangeLog.CREATED: [],
+            ChangeLog.UPDATED: [],
+            ChangeLog.DELETED: [],
+        }
+        to_python = self.model._meta.pk.to_python
+        for pk, (first, last) in actions.items():
+            if last == ChangeLog.DELETED:
+                changes[ChangeLog.DELETED].append(to_python(pk))
+            elif first == ChangeLog.CREATED:
+                changes[ChangeLog.CREATED].append(to_python(pk))
+            else:
+                changes[ChangeLog.UPDATED].append(to_python(pk))
+        changes.update({
+            'since': str(since),
+            'next': str(entries[-1][0] if entries else since),
+            'more': more,
+        })
+        if fields:
+            changes['rows'] = self.rows(
+                changes[ChangeLog.CREATED] + changes[ChangeLog.UPDATED],
+                fields)
+        return changes
+
+    def rows(self, pks, fields):
+        if 'pk' not in fields:
+            fields = ['pk'] + list(fields)
+        mb = ModelBuilder(self.db_alias, self.model_config.app_name,
+                          self.model_config.model_name,
+                          {'filter': {'pk__in': pks}, 'fields': fields,
+                           'limit': max(len(pks), 1)})
+        if not pks:
+            # still validates the fields
+            return []
+        return mb.queryset()
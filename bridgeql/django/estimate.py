@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+# Copyright © 2023 VMware, Inc.  All rights reserved.
+# SPDX-License-Identifier: BSD-2-Clause
+
+import json
+
+from django.db import connections
+from django.db.models.sql.datastructures import BaseTable
+
+from bridgeql.django.settings import bridgeql_settings
+
+
+class SampledTable(BaseTable):
+    """
+    Base table of a query read through TABLESAMPLE, the joined tables and
+    the subqueries are read whole.
+    """
+
+    def __init__(self, table_name, alias, percent):
+        super(SampledTable, self).__init__(table_name, alias)
+        self.percent = percent
+
+    def as_sql(self, compiler, connection):
+        sql, params = super(SampledTable, self).as_sql(compiler, connection)
+        return '%s TABLESAMPLE SYSTEM (%%s)' % sql, list(params) + [
+            self.percent]
+
+    def relabeled_clone(self, change_map):
+        return self.__class__(
+            self.table_name,
+            change_map.get(self.table_alias, self.table_alias),
+            self.percent)
+
+
+class CountEstimator(object):
+    """
+    Count the rows of a queryset using planner statistics where possible.
+
+    Only PostgreSQL provides the statistics we rely upon, every other
+    backend (and every query estimated below the configured threshold)
+    falls back to an exact ``COUNT(*)``.
+    """
+
+    def __init__(self, qset, filtered):
+        self.qset = qset
+        self.filtered = filtered
+        self.connection = connections[qset.db]
+        self.approximate = False
+
+    def count(self):
+        if self.connection.vendor != 'postgresql':
+            return self.qset.count()
+        estimate = self._planner_estimate()
+        threshold = bridgeql_settings.BRIDGEQL_COUNT_ESTIMATE_THRESHOLD
+        if estimate is None or estimate < threshold:
+            return self.qset.count()
+        if self.filtered:
+            # the plan rows stand when the sample missed every row
+            sampled = self._sampled_count()
+            if sampled is not None:
+                estimate = sampled
+        self.approximate = True
+        return int(estimate)
+
+    def _planner_estimate(self):
+        with self.connection.cursor() as cursor:
+            if not self.filtered:
+                # reltuples is maintained by VACUUM/ANALYZE
+                table = self.connection.ops.quote_name(
+                    self.qset.model._meta.db_table)
+                cursor.execute('SELECT reltuples::bigint FROM pg_class '
+                               'WHERE oid = %s::regclass', [table])
+                row = cursor.fetchone()
+                # reltuples is -1 (or 0) for tables never analyzed
+                if row is None or row[0] is None or row[0] <= 0:
+                    return None
+                return row[0]
+            sql, params = self.qset.order_by().query.sql_with_params()
+            cursor.execute('EXPLAIN (FORMAT JSON) ' + sql, params)
+            plan = cursor.fetchone()[0]
+        if not isinstance(plan, list):
+            plan = json.loads(plan)
+        return plan[0]['Plan']['Plan Rows']
+
+    def sample_sql(self, percent):
+        """
+        Return the SQL and the parameters of the pks of the queryset
+        sampled from percent of the pages of its base table.
+        """
+        query = self.qset.order_by().values('pk').query
+        # the clone of the values queryset owns its alias map
+        alias = query.get_initial_alias()
+        query.alias_map[alias] = SampledTable(
+            query.alias_map[alias].table_name, alias, percent)
+        return query.sql_with_params()
+
+    def _sampled_count(self):
+        percent = float(bridgeql_settings.BRIDGEQL_COUNT_SAMPLE_PERCENT)
+        sql, params = self.sample_sql(percent)
+        with self.connection.cursor() as cursor:
+            cursor.execute('SELECT COUNT(*) FROM (%s) sampled' % sql, params)
+            sampled = cursor.fetchone()[0]
+        if not sampled:
+            return None
+        return sampled * 100.0 / percent
@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+# Copyright © 2023 VMware, Inc.  All rights reserved.
+# SPDX-License-Identifier: BSD-2-Clause
+
+import threading
+import time
+from collections import OrderedDict
+
+from django.db import transaction
+
+from bridgeql.django import logger
+from bridgeql.django.exceptions import ObjectNotFound, ServiceUnavailable
+from bridgeql.django.settings import bridgeql_settings
+from bridgeql.models import ChangeLog
+
+
+class EventBus(object):
+    """
+    In process bus of the writes to the models of the subscriptions,
+    each write is matched against the distinct filters of the
+    subscriptions to its model at once.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscriptions = OrderedDict()
+
+    def _expire(self, now):
+        # subscriptions are kept between the polls, the streams update
+        # last_seen every timeout at least
+        idle = bridgeql_settings.BRIDGEQL_SUBSCRIPTION_TTL + \
+            bridgeql_settings.BRIDGEQL_SUBSCRIPTION_TIMEOUT
+        for subscription in list(self._subscriptions.values()):
+            if now - subscription.last_seen > idle:
+                del self._subscriptions[subscription.id]
+
+    def subscribe(self, subscription):
+        with self._lock:
+            self._expire(time.time())
+            if len(self._subscriptions) >= \
+                    bridgeql_settings.BRIDGEQL_MAX_SUBSCRIPTIONS:
+                raise ServiceUnavailable(
+                    'Too many subscriptions',
+                    retry_after=bridgeql_settings.BRIDGEQL_SUBSCRIPTION_TTL)
+            self._subscriptions[subscription.id] = subscription
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscriptions.pop(subscription.id, None)
+
+    def get(self, subscription_id):
+        with self._lock:
+            self._expire(time.time())
+            subscription = self._subscriptions.get(subscription_id)
+        if subscription is None:
+            raise ObjectNotFound('Unknown or expired subscription %s'
+                                 % subscription_id)
+        return subscription
+
+    def subscriptions(self, model, using):
+        with self._lock:
+            return [subscription
+                    for subscription in self._subscriptions.values()
+                    if subscription.model is model and
+                    subscription.db_alias == using]
+
+    def match(self, model, pk, using):
+        """
+        Return the rows of pk matching the filters of the subscriptions
+        to model, by subscription key.
+        """
+        # imported once a subscription exists, subscriptions import the bus
+        from bridgeql.django.subscriptions import match_rows
+
+        groups = OrderedDict()
+        for subscription in self.subscriptions(model, using):
+            groups.setdefault(subscription.key, subscription)
+        if not groups:
+            return {}
+        return match_rows(list(groups.values()), pk, using)
+
+    def publish(self, model, pk, action, using, matched=None):
+        """
+        Queue the event of a write for the subscriptions its row matched
+        before (matched) or after the write, once the write committed.
+        Deleted rows were matched before their deletion.
+        """
+        if not self.subscriptions(model, using):
+            return
+        before = matched or {}
+
+        def deliver():
+            try:
+                after = {} if action == ChangeLog.DELETED else \
+                    self.match(model, pk, using)
+            except Exception:
+                # the write committed already, only its event is lost
+                logger.exception('Unable to match %s pk=%s to the '
+                                 'subscriptions', model._meta.label, pk)
+                return
+            for subscription in self.subscriptions(model, using):
+                if subscription.key in after:
+                    row = after[subscription.key]
+                elif subscription.key in before:
+                    # deleted, or updated out of the filter
+                    row = before[subscription.key] \
+                        if action == ChangeLog.DELETED else None
+                else:
+                    continue
+                subscription.put({'action': action, 'pk': pk, 'row': row})
+
+        transaction.on_commit(deliver, using=using)
+
+    def __len__(self):
+        return len(self._subscriptions)
+
+
+event_bus = EventBus()
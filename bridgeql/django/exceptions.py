@@ -51,10 +51,52 @@ class InvalidPKException(InvalidRequest):
     pass
 
 
+class UnsupportedMediaType(BridgeqlException):
+    status_code = 415
+    default_detail = 'Unsupported media type'
+
+
+class QueryTooExpensive(InvalidRequest):
+    default_detail = 'Query cost exceeds the maximum query cost'
+
+
+class QueryTimeout(BridgeqlException):
+    status_code = 504
+    default_detail = 'Query exceeded the statement timeout'
+
+
+class TooManyRequests(BridgeqlException):
+    status_code = 429
+    default_detail = 'Too many requests'
+
+    def __init__(self, detail=None, retry_after=None):
+        super(TooManyRequests, self).__init__(detail)
+        self.retry_after = retry_after
+
+
+class ServiceUnavailable(BridgeqlException):
+    status_code = 503
+    default_detail = 'Service unavailable'
+
+    def __init__(self, detail=None, retry_after=None):
+        super(ServiceUnavailable, self).__init__(detail)
+        self.retry_after = retry_after
+
+    def log(self):
+        # overload is expected, no traceback to log
+        logger.warning(self)
+
+
 class InvalidBridgeQLSettings(BridgeqlException):
     pass
 
 
+class ResyncRequired(BridgeqlException):
+    status_code = 410
+    default_detail = 'The changes since the token were pruned, read the ' \
+                     'whole table again'
+
+
 class ObjectNotFound(BridgeqlException):
     status_code = 404
     default_detail = 'Object not found'
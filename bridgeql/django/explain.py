@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+# Copyright © 2023 VMware, Inc.  All rights reserved.
+# SPDX-License-Identifier: BSD-2-Clause
+
+import re
+from timeit import default_timer as timer
+
+from bridgeql.django.exceptions import InvalidRequest
+from bridgeql.django.models import ModelBuilder
+
+# index names as printed by the PostgreSQL and SQLite query plans
+INDEX_PATTERN = re.compile(
+    r'(?:Bitmap Index|Index Only|Index) Scan (?:Backward )?(?:using|on) "?([\w.$]+)"?'
+    r'|USING (?:COVERING )?INDEX "?([\w.$]+)"?'
+    r'|USING (INTEGER PRIMARY KEY)')
+# rows of the top node of the PostgreSQL and MySQL analyzed plans
+ACTUAL_ROWS_PATTERN = re.compile(r'actual time=[\d.]+\.\.[\d.]+ rows=(\d+)')
+
+
+def used_indexes(plan):
+    indexes = []
+    for match in INDEX_PATTERN.finditer(plan):
+        index = next(group for group in match.groups() if group)
+        if index not in indexes:
+            indexes.append(index)
+    return indexes
+
+
+def _elapsed(start):
+    return round((timer() - start) * 1000, 3)
+
+
+def actual_rows(plan):
+    match = ACTUAL_ROWS_PATTERN.search(plan)
+    return int(match.group(1)) if match else None
+
+
+def explain(db_name, app_label, model_name, params, analyze=False):
+    """
+    Return the SQL, the query plan and the timings of a read payload.
+
+    For count and aggregate queries the plan of the underlying rows
+    query is returned, Django does not explain them. An analyzed query
+    is executed by its explain only, its rows are read from the plan.
+    """
+    timings = {}
+    start = timer()
+    mb = ModelBuilder(db_name, app_label, model_name, params)
+    timings['validate'] = _elapsed(start)
+
+    start = timer()
+    qset = mb.compile()
+    sql, sql_params = qset.query.sql_with_params()
+    timings['compile'] = _elapsed(start)
+
+    start = timer()
+    try:
+        plan = mb.explain(analyze=analyze)
+    except ValueError as e:
+        # analyze is not supported by every database
+        raise InvalidRequest(str(e))
+    timings['explain'] = _elapsed(start)
+
+    if mb.aggregate is not None or mb.params.count:
+        rows = 1
+    elif analyze:
+        rows = actual_rows(plan)
+    else:
+        start = timer()
+        rows = len(mb.run())
+        timings['execute'] = _elapsed(start)
+
+    return {
+        'sql': sql,
+        'params': [param if isinstance(param, (int, float)) else str(param)
+                   for param in sql_params],
+        'explain': plan,
+        'indexes': used_indexes(plan),
+        'rows': rows,
+        'timings': timings,
+    }
@@ -0,0 +1,220 @@
+# -*- coding: utf-8 -*-
+# Copyright © 2023 VMware, Inc.  All rights reserved.
+# SPDX-License-Identifier: BSD-2-Clause
+
+import copy
+import json
+import numbers
+
+from django.core.exceptions import FieldError, ValidationError
+from django.db import connections
+from django.db.models import F, Max, Min
+from django.http import StreamingHttpResponse
+try:
+    from django.db.models import Window
+    from django.db.models.functions import Ntile
+except ImportError:
+    # window functions are added in django 2.0
+    Window = Ntile = None
+
+from bridgeql.django.admission import hold_slots
+from bridgeql.django.exceptions import InvalidRequest
+from bridgeql.django.guards import get_statement_timeout, statement_timeout
+from bridgeql.django.helpers import JSONEncoder
+from bridgeql.django.models import ModelBuilder
+from bridgeql.django.query import Query
+from bridgeql.django.routing import read_router
+from bridgeql.django.settings import bridgeql_settings
+
+NDJSON = 'application/x-ndjson'
+# boundaries evenly spaced between the lowest and the highest pk
+RANGE = 'range'
+# boundaries at the pks of evenly spaced ranks, for sparse or non integer
+# pks, read in one query over the ntiles of the pks
+SAMPLE = 'sample'
+
+
+def partition_count(value=None):
+    """
+    Return the number of partitions to split an export in.
+    """
+    max_count = bridgeql_settings.BRIDGEQL_EXPORT_MAX_PARTITIONS
+    if value is None:
+        return 1
+    try:
+        count = int(value)
+    except ValueError:
+        count = 0
+    if not 0 < count <= max_count:
+        raise InvalidRequest('Invalid partitions %s, expected 1 to %s'
+                             % (value, max_count))
+    return count
+
+
+def batch_size():
+    size = bridgeql_settings.BRIDGEQL_EXPORT_BATCH_SIZE
+    if bridgeql_settings.BRIDGEQL_MAX_LIMIT:
+        # a batch is a read
+        size = min(size, bridgeql_settings.BRIDGEQL_MAX_LIMIT)
+    return size
+
+
+class Export(object):
+    """
+    Rows of a model matching a filter ordered by pk, split in pk ranges
+    that can be streamed concurrently, and resumed after the last pk
+    received.
+    """
+
+    def __init__(self, db_alias, app_label, model_name, params):
+        if not isinstance(params, dict) or \
+                set(params) - set(['filter', 'exclude', 'fields']):
+            raise InvalidRequest('Exports only take filter, exclude and '
+                                 'fields')
+        self.db_alias = db_alias
+        self.app_label = app_label
+        self.model_name = model_name
+        self.params = params
+        self.filter = params.get('filter') or {}
+        self.exclude = params.get('exclude') or {}
+        self.fields = list(params.get('fields') or [])
+        # validates the filter and the fields once
+        mb = ModelBuilder(db_alias, app_label, model_name, {
+            'filter': copy.deepcopy(self.filter),
+            'exclude': copy.deepcopy(self.exclude),
+            'fields': self.fields,
+            'limit': 1,
+        })
+        try:
+            mb.compile()
+        except (FieldError, ValueError, TypeError) as e:
+            raise InvalidRequest(str(e))
+        self.model_config = mb.model_config
+        self.model = self.model_config.model
+        if not self.fields:
+            self.fields = sorted(self.model_config.fields -
+                                 self.model_config.restricted_fields)
+        if 'pk' not in self.fields:
+            # resumes the stream after the last row received
+            self.fields.insert(0, 'pk')
+
+    def parse_pk(self, value):
+        if value is None:
+            return None
+        try:
+            return self.model._meta.pk.to_python(value)
+        except ValidationError:
+            raise InvalidRequest('Invalid pk %s' % value)
+
+    def _filtered(self):
+        # Query consumes the filter it is given
+        qset = self.model.objects.using(self.db_alias).filter(
+            Query(copy.deepcopy(self.filter)).Q)
+        if self.exclude:
+            qset = qset.exclude(**self.exclude)
+        return qset
+
+    def partitions(self, count, split=RANGE):
+        """
+        Return the read payloads of count pk ranges of the rows at most,
+        the rows written after the highest pk are left out so that the
+        partitions stay the same.
+        """
+        if split not in (RANGE, SAMPLE):
+            raise InvalidRequest('Invalid split %s, expected %s or %s'
+                                 % (split, RANGE, SAMPLE))
+        qset = self._filtered()
+        timeout = get_statement_timeout(self.model_config.full_model_name)
+        with statement_timeout(self.db_alias, timeout):
+            bounds = qset.aggregate(lower=Min('pk'), upper=Max('pk'))
+            lower, upper = bounds['lower'], bounds['upper']
+            if lower is None:
+                return []
+            integer = isinstance(lower, numbers.Integral)
+            if (split == SAMPLE or not integer) and self._supports_ntile():
+                boundaries = self._ntile_boundaries(qset, count)
+            elif integer:
+                span = upper - lower + 1
+                boundaries = [lower + span * i // count
+                              for i in range(count)]
+            else:
+                # no range of the pks to split
+                boundaries = [lower]
+        # fewer rows than partitions
+        boundaries = sorted(set(boundaries))
+        partitions = []
+        for i, start in enumerate(boundaries):
+            selector = {'pk__gte': start}
+            if i + 1 < len(boundaries):
+                selector['pk__lt'] = boundaries[i + 1]
+            else:
+                selector['pk__lte'] = upper
+            if self.filter:
+                selector['__or'] = [copy.deepcopy(self.filter)]
+            payload = dict(copy.deepcopy(self.params), filter=selector)
+            partitions.append({'partition': i, 'payload': payload})
+        return partitions
+
+    def _supports_ntile(self):
+        return Window is not None and \
+            connections[self.db_alias].features.supports_over_clause
+
+    def _ntile_boundaries(self, qset, count):
+        # the lowest pk of each of the count ntiles of the pks
+        ntiles = qset.order_by().annotate(
+            bridgeql_ntile=Window(Ntile(count), order_by=F('pk').asc())
+        ).values('pk', 'bridgeql_ntile')
+        sql, params = ntiles.query.sql_with_params()
+        connection = connections[self.db_alias]
+        column = connection.ops.quote_name(self.model._meta.pk.column)
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT MIN(%s) FROM (%s) ntiles '
+                           'GROUP BY bridgeql_ntile' % (column, sql), params)
+            return [self.model._meta.pk.to_python(row[0])
+                    for row in cursor.fetchall()]
+
+    def batches(self, after=None):
+        """
+        Yield the rows after the pk after by batches read in pk order.
+        """
+        size = batch_size()
+        while True:
+            selector = {}
+            if self.filter:
+                # and-ed with the filter, which may have its own pk__gt
+                selector['__or'] = [copy.deepcopy(self.filter)]
+            if after is not None:
+                selector['pk__gt'] = after
+            mb = ModelBuilder(self.db_alias, self.model_config.app_name,
+                              self.model_config.model_name, {
+                                  'filter': selector,
+                                  'exclude': copy.deepcopy(self.exclude),
+                                  'fields': self.fields,
+                                  'order_by': ['pk'],
+                                  'limit': size,
+                              }, model_config=self.model_config)
+            with hold_slots([self.db_alias], self.app_label,
+                            self.model_name), \
+                    read_router.using(self.db_alias):
+                rows = mb.queryset()
+            if rows:
+                yield rows
+            if len(rows) < size:
+                return
+            after = rows[-1]['pk']
+
+
+def stream_rows(export, after=None):
+    """
+    Return a response streaming the rows of the export as
+    newline-delimited JSON, a batch at a time.
+    """
+    def stream():
+        for rows in export.batches(after):
+            yield ''.join(json.dumps(row, cls=JSONEncoder) + '\n'
+                          for row in rows)
+
+    response = StreamingHttpResponse(stream(), content_type=NDJSON)
+    # disable the buffering of nginx
+    response['X-Accel-Buffering'] = 'no'
+    return response
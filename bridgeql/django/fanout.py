@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+# Copyright © 2023 VMware, Inc.  All rights reserved.
+# SPDX-License-Identifier: BSD-2-Clause
+
+import copy
+import heapq
+import threading
+
+from django.db import connections
+
+from bridgeql.django.exceptions import InvalidQueryException, InvalidRequest
+from bridgeql.django.guards import row_limit
+from bridgeql.django.models import ModelBuilder
+from bridgeql.django.settings import bridgeql_settings
+
+# aggregate function -> how to combine the per shard results
+COMBINABLE_AGGREGATES = {
+    'Count': sum,
+    'Sum': sum,
+    'Max': max,
+    'Min': min,
+}
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+    # futures is a backport on python 2, only fan-out reads need it
+    from concurrent.futures import ThreadPoolExecutor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=bridgeql_settings.BRIDGEQL_FANOUT_WORKERS)
+    return _executor
+
+
+def resolve_db_names(db_name):
+    """
+    Return the list of database aliases a fan-out read on db_name spans,
+    or None if db_name is a single database.
+    """
+    shard_groups = bridgeql_settings.BRIDGEQL_SHARD_GROUPS
+    if db_name in shard_groups:
+        return list(shard_groups[db_name])
+    if ',' in db_name:
+        return [name for name in db_name.split(',') if name]
+    return None
+
+
+class _Descending(object):
+    __slots__ = ('value',)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __lt__(self, other):
+        return other.value < self.value
+
+    def __eq__(self, other):
+        return self.value == other.value
+
+
+class FanoutBuilder(object):
+    """
+    Run the same ModelBuilder plan on several databases concurrently and
+    merge the per database results.
+    """
+
+    def __init__(self, db_names, app_name, model_name, params, timer=None):
+        if not isinstance(params, dict):
+            raise InvalidRequest(
+                'Incorrect payload type, Expected dict, got %s' % type(params))
+        self.db_names = db_names
+        self.params = params
+        self.timer = timer
+        self._validate()
+        self.offset = params.get('offset') or 0
+        self.limit = row_limit(params.get('limit'), params.get('count'),
+                               params.get('aggregate'))
+        shard_params = dict(params)
+        shard_params['offset'] = 0
+        if self.limit:
+            # every shard may hold all the rows of the global page
+            shard_params['limit'] = self.offset + self.limit
+        else:
+            shard_params.pop('limit', None)
+        self.builders = [
+            # the limit of a shard is past the guard of the global one,
+            # the shards order their NULLs as the merge does
+            ModelBuilder(db_name, app_name, model_name,
+                         copy.deepcopy(shard_params), limit_checked=True,
+                         nulls_last=True)
+            for db_name in db_names
+        ]
+        self.model_config = self.builders[0].model_config
+
+    @property
+    def qset(self):
+        return self.builders[0].qset
+
+    @property
+    def approximate(self):
+        return any(builder.approximate for builder in self.builders)
+
+    def _validate(self):
+        if not self.db_names:
+            raise InvalidRequest('No database to read from')
+        for db_name in self.db_names:
+            if db_name not in connections.databases:
+                raise InvalidRequest(
+                    "The connection '%s' doesn't exist." % db_name)
+        for opt in ('offset', 'limit'):
+            if not isinstance(self.params.get(opt) or 0, int):
+                raise InvalidQueryException(
+                    'Invalid type %s for %s expected %s'
+                    % (type(self.params[opt]), opt, int))
+        aggregate = self.params.get('aggregate', None)
+        if isinstance(aggregate, dict):
+            for aggr_func in aggregate:
+                if aggr_func not in COMBINABLE_AGGREGATES:
+                    raise InvalidQueryException(
+                        'Aggregate function %s can not be combined across '
+                        'databases' % aggr_func)
+        elif self.params.get('count') and self.params.get('distinct'):
+            raise InvalidQueryException(
+                'Distinct count can not be combined across databases')
+
+    def _execute(self, builder):
+        try:
+            if self.timer is None:
+                return builder.queryset()
+            with self.timer.database(builder.params.db_name):
+                return builder.queryset()
+        finally:
+            connections[builder.params.db_name].close_if_unusable_or_obsolete()
+
+    def queryset(self):
+        executor = get_executor()
+        futures = [executor.submit(self._execute, builder)
+                   for builder in self.builders]
+        results = [future.result() for future in futures]
+        if isinstance(results[0], dict):
+            return self._merge_aggregates(results)
+        if not isinstance(results[0], list):
+            return sum(results)
+        rows = self._merge_rows(results)
+        if self.limit:
+            return rows[self.offset:self.offset + self.limit]
+        return rows[self.offset:]
+
+    def _merge_aggregates(self, results):
+        merged = {}
+        for aggr_func, aggr_field in self.params['aggregate'].items():
+            key = '%s__%s' % (aggr_field, aggr_func.lower())
+            values = [res[key] for res in results if res[key] is not None]
+            merged[key] = COMBINABLE_AGGREGATES[aggr_func](values) \
+                if values else None
+        return merged
+
+    def _sort_key(self, order_by):
+        pk_name = self.model_config.model._meta.pk.name
+        keys = []
+        for field in order_by:
+            descending = field.startswith('-')
+            name = field.lstrip('-')
+            keys.append((name, descending))
+
+        def sort_key(row):
+            key = []
+            for name, descending in keys:
+                if name not in row and name == 'pk':
+                    name = pk_name
+                if name not in row:
+                    raise InvalidQueryException(
+                        'order_by field %s must be present in fields to merge '
+                        'results across databases' % name)
+                # NULL is the largest value, sorted last ascending and
+                # first descending, as the shard queries order it
+                value = (row[name] is None, row[name])
+                key.append(_Descending(value) if descending else value)
+            return key
+        return sort_key
+
+    def _merge_rows(self, results):
+        order_by = self.params.get('order_by', [])
+        if order_by:
+            rows = heapq.merge(*results, key=self._sort_key(order_by))
+        else:
+            rows = (row for result in results for row in result)
+        if not self.params.get('distinct'):
+            return list(rows)
+        seen = set()
+        distinct_rows = []
+        for row in rows:
+            key = tuple(sorted(row.items()))
+            if key not in seen:
+                seen.add(key)
+                distinct_rows.append(row)
+        return distinct_rows
@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+# Copyright © 2023 VMware, Inc.  All rights reserved.
+# SPDX-License-Identifier: BSD-2-Clause
+
+import json
+import math
+import time
+from contextlib import contextmanager
+
+from django.db import connections, transaction
+from django.db.utils import OperationalError
+
+from bridgeql.django.exceptions import (
+    InvalidQueryException,
+    QueryTimeout,
+    QueryTooExpensive
+)
+from bridgeql.django.settings import bridgeql_settings
+
+# number of sqlite virtual machine instructions between deadline checks
+SQLITE_PROGRESS_STEPS = 100
+
+
+def row_limit(limit, count=False, aggregate=None):
+    """
+    Return the limit to apply to a query according to
+    settings.BRIDGEQL_DEFAULT_LIMIT and settings.BRIDGEQL_MAX_LIMIT.
+    """
+    if count or aggregate or not isinstance(limit, (int, type(None))):
+        # counts and aggregates return a single row,
+        # wrong types are reported while building the query
+        return limit
+    max_limit = bridgeql_settings.BRIDGEQL_MAX_LIMIT
+    if not limit:
+        return bridgeql_settings.BRIDGEQL_DEFAULT_LIMIT or max_limit
+    if max_limit and limit > max_limit:
+        raise InvalidQueryException(
+            'limit %s exceeds the maximum limit %s' % (limit, max_limit))
+    return limit
+
+
+def get_statement_timeout(full_model_name):
+    timeout = bridgeql_settings.BRIDGEQL_STATEMENT_TIMEOUT
+    if isinstance(timeout, dict):
+        return timeout.get(full_model_name, timeout.get('*'))
+    return timeout
+
+
+def _is_timeout(vendor, error):
+    cause = getattr(error, '__cause__', None)
+    if vendor == 'postgresql':
+        return getattr(cause, 'pgcode', None) == '57014'
+    if vendor == 'mysql':
+        return bool(error.args) and error.args[0] == 3024
+    return 'interrupted' in str(error)
+
+
+def _milliseconds(timeout):
+    # 0 disables the timeouts, a fraction of a millisecond is rounded up
+    return max(1, int(math.ceil(timeout)))
+
+
+@contextmanager
+def statement_timeout(db_name, timeout):
+    """
+    Cancel the queries run within the context once they run for more
+    than timeout milliseconds.
+    """
+    connection = connections[db_name]
+    vendor = connection.vendor
+    if not timeout or vendor not in ('postgresql', 'mysql', 'sqlite'):
+        yield
+        return
+    try:
+        if vendor == 'postgresql':
+            with transaction.atomic(using=db_name):
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        "SELECT set_config('statement_timeout', %s, true)",
+                        [str(_milliseconds(timeout))])
+                yield
+        elif vendor == 'mysql':
+            # only applies to read-only SELECT statements
+            with connection.cursor() as cursor:
+                cursor.execute('SET SESSION max_execution_time = %s',
+                               [_milliseconds(timeout)])
+            try:
+                yield
+            finally:
+                with connection.cursor() as cursor:
+                    cursor.execute('SET SESSION max_execution_time = 0')
+        else:
+            deadline = time.time() + timeout / 1000.0
+            connection.ensure_connection()
+            connection.connection.set_progress_handler(
+                lambda: time.time() > deadline, SQLITE_PROGRESS_STEPS)
+            try:
+                yield
+            finally:
+                connection.connection.set_progress_handler(None, 0)
+    except OperationalError as e:
+        if _is_timeout(vendor, e):
+            raise QueryTimeout('Query exceeded the statement timeout of %sms'
+                               % timeout)
+        raise
+
+
+def query_cost(qset):
+    """
+    Return the cost of the queryset estimated by the database planner,
+    None if the database does not provide it.
+    """
+    connection = connections[qset.db]
+    sql, params = qset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute('EXPLAIN (FORMAT JSON) ' + sql, params)
+            plan = cursor.fetchone()[0]
+            if not isinstance(plan, list):
+                plan = json.loads(plan)
+            return plan[0]['Plan']['Total Cost']
+        if connection.vendor == 'mysql':
+            cursor.execute('EXPLAIN FORMAT=JSON ' + sql, params)
+            plan = json.loads(cursor.fetchone()[0])
+            return float(plan['query_block']['cost_info']['query_cost'])
+    return None
+
+
+def check_query_cost(qset):
+    max_cost = bridgeql_settings.BRIDGEQL_MAX_QUERY_COST
+    if not max_cost:
+        return
+    cost = query_cost(qset)
+    if cost is not None and cost > max_cost:
+        raise QueryTooExpensive(
+            'Query cost %s exceeds the maximum query cost %s, '
+            'narrow down the filter or add a limit' % (cost, max_cost))
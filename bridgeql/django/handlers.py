@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+# Copyright © 2023 VMware, Inc.  All rights reserved.
+# SPDX-License-Identifier: BSD-2-Clause
+
+"""
+ASGI handler of bridgeql, the coroutines of this module are a syntax
+error on python 2.
+"""
+
+import asyncio
+import contextvars
+import functools
+
+from django.core.handlers.asgi import ASGIHandler
+
+from bridgeql.django.events import event_bus
+from bridgeql.django.settings import bridgeql_settings
+from bridgeql.django.subscriptions import (
+    KEEPALIVE,
+    EventStreamResponse,
+    format_event
+)
+
+# receive channel of the request handled by the current task
+_receive = contextvars.ContextVar('bridgeql_receive')
+
+
+async def wait_events(subscription, timeout):
+    """
+    Return the queued events of the subscription, waiting up to timeout
+    for one without blocking the event loop.
+    """
+    loop = asyncio.get_event_loop()
+    ready = asyncio.Event()
+    wake = functools.partial(loop.call_soon_threadsafe, ready.set)
+    subscription.add_waiter(wake)
+    try:
+        events = subscription.wait(0)
+        if events:
+            return events
+        try:
+            await asyncio.wait_for(ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        return subscription.wait(0)
+    finally:
+        subscription.remove_waiter(wake)
+
+
+async def _wait_disconnect(receive):
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            return
+
+
+class BridgeqlASGIHandler(ASGIHandler):
+    """
+    ASGI handler streaming the events of the subscriptions from its
+    event loop, the streams hold no thread while they wait.
+    """
+
+    async def __call__(self, scope, receive, send):
+        # each request is handled in its own task
+        _receive.set(receive)
+        await super().__call__(scope, receive, send)
+
+    def create_request(self, scope, body_file):
+        request, error_response = super().create_request(scope, body_file)
+        if request is not None:
+            request.bridgeql_event_streams = True
+        return request, error_response
+
+    async def send_response(self, response, send):
+        if not isinstance(response, EventStreamResponse):
+            return await super().send_response(response, send)
+        receive = _receive.get()
+
+        async def send_events(message):
+            if message['type'] == 'http.response.body' and \
+                    not message.get('more_body'):
+                # the events come before the closing message
+                await self.stream_events(response.subscription, send,
+                                         receive)
+            await send(message)
+
+        await super().send_response(response, send_events)
+
+    async def stream_events(self, subscription, send, receive):
+        keepalive = bridgeql_settings.BRIDGEQL_SUBSCRIPTION_TIMEOUT
+        disconnect = asyncio.ensure_future(_wait_disconnect(receive))
+        try:
+            while True:
+                waiting = asyncio.ensure_future(
+                    wait_events(subscription, keepalive))
+                await asyncio.wait([waiting, disconnect],
+                                   return_when=asyncio.FIRST_COMPLETED)
+                if disconnect.done():
+                    waiting.cancel()
+                    return
+                events = waiting.result()
+                body = ''.join(format_event(event) for event in events)
+                await send({
+                    'type': 'http.response.body',
+                    'body': (body or KEEPALIVE).encode('utf-8'),
+                    'more_body': True,
+                })
+        finally:
+            disconnect.cancel()
+            event_bus.unsubscribe(subscription)
@@ -2,16 +2,32 @@
 # Copyright © 2023 VMware, Inc.  All rights reserved.
 # SPDX-License-Identifier: BSD-2-Clause
 import os
-from datetime import datetime
+import uuid
+from datetime import date, datetime, time
+from decimal import Decimal
 import json
 
 from django.apps import apps
 from django.conf import settings
 from django.db.models.query import QuerySet
-from django.http import HttpResponse
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils import timezone
+from django.utils.cache import set_response_etag
+from django.utils.http import parse_etags
 
-from bridgeql.django.exceptions import InvalidRequest
+from bridgeql.django.exceptions import InvalidRequest, UnsupportedMediaType
 from bridgeql.django.settings import bridgeql_settings
+from bridgeql.utils import MSGPACK_EXT_UUID, msgpack_ext_hook
+
+# binary encodings are optional
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+try:
+    import cbor2
+except ImportError:
+    cbor2 = None
 
 
 class JSONEncoder(json.JSONEncoder):
@@ -43,6 +59,129 @@ class JSONResponse(HttpResponse):
         HttpResponse.__init__(self, data, content_type, status)
 
 
+MSGPACK_CONTENT_TYPE = 'application/msgpack'
+MSGPACK_MEDIA_TYPES = ('application/msgpack', 'application/x-msgpack')
+
+
+def msgpack_default(obj):
+    """
+    Encode the values msgpack has no type for: datetimes as msgpack
+    timestamps, naive ones in the TIME_ZONE setting, UUIDs as the
+    MSGPACK_EXT_UUID extension type, dates, times and decimals as
+    strings.
+    """
+    if isinstance(obj, datetime):
+        if timezone.is_naive(obj):
+            obj = timezone.make_aware(obj, timezone.get_default_timezone())
+        return msgpack.Timestamp.from_datetime(obj)
+    if isinstance(obj, (date, time)):
+        return obj.isoformat()
+    if isinstance(obj, uuid.UUID):
+        return msgpack.ExtType(MSGPACK_EXT_UUID, obj.bytes)
+    if isinstance(obj, Decimal):
+        return str(obj)
+    if isinstance(obj, QuerySet):
+        return list(obj)
+    if hasattr(obj, '__json__'):
+        return obj.__json__()
+    raise TypeError('Object of type %s is not msgpack serializable'
+                    % type(obj).__name__)
+
+
+class MsgpackResponse(HttpResponse):
+    """
+    Create a response that contains a MessagePack document.
+    """
+
+    def __init__(self, content, content_type=MSGPACK_CONTENT_TYPE,
+                 status=200):
+        data = msgpack.packb(content, default=msgpack_default,
+                             use_bin_type=True)
+        HttpResponse.__init__(self, data, content_type, status)
+
+
+def _accept_quality(accept, media_type):
+    best = 0
+    for part in accept.split(','):
+        values = part.strip().split(';')
+        accepted = values[0].strip().lower()
+        if accepted not in (media_type, media_type.split('/')[0] + '/*', '*/*'):
+            continue
+        quality = 1.0
+        for param in values[1:]:
+            key, _, value = param.strip().partition('=')
+            if key == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0
+        # the exact media type wins over the wildcards
+        best = max(best, quality + (0.001 if accepted == media_type else 0))
+    return best
+
+
+def negotiate(request):
+    """
+    Return the media type of the response to the request according
+    to its Accept header, JSON unless MessagePack is preferred.
+    """
+    accept = request.META.get('HTTP_ACCEPT', '')
+    if msgpack is None or 'msgpack' not in accept:
+        return 'application/json'
+    msgpack_quality = max(_accept_quality(accept, media_type)
+                          for media_type in MSGPACK_MEDIA_TYPES)
+    if msgpack_quality > _accept_quality(accept, 'application/json'):
+        return MSGPACK_CONTENT_TYPE
+    return 'application/json'
+
+
+def render_response(request, content, status=200):
+    """
+    Encode content in the media type negotiated with the request.
+    """
+    if negotiate(request) == MSGPACK_CONTENT_TYPE:
+        response = MsgpackResponse(content, status=status)
+    else:
+        response = JSONResponse(content, status=status)
+    response['Vary'] = 'Accept'
+    return response
+
+
+def _strip_weak(etag):
+    # compressing middlewares weaken the etags they were given
+    return etag[2:] if etag.startswith('W/') else etag
+
+
+def not_modified(request, etag, vary='Accept'):
+    """
+    Return a 304 Not Modified response when the If-None-Match header of
+    the request has etag, None otherwise.
+    """
+    etags = [_strip_weak(tag) for tag in
+             parse_etags(request.META.get('HTTP_IF_NONE_MATCH', ''))]
+    if etag not in etags and '*' not in etags:
+        return None
+    response = HttpResponseNotModified()
+    response['ETag'] = etag
+    response['Vary'] = vary
+    return response
+
+
+def conditional_response(request, response):
+    """
+    Tag a successful read response with the hash of its content, answer
+    304 Not Modified when the If-None-Match header of the request has it.
+    """
+    if response.status_code != 200 or not bridgeql_settings.BRIDGEQL_ETAGS:
+        return response
+    set_response_etag(response)
+    etag = response.get('ETag')
+    if etag is None:
+        return response
+    return not_modified(request, etag, response.get('Vary', 'Accept')) or \
+        response
+
+
 def get_local_apps():
     _local_apps = []
     if hasattr(settings, 'BASE_DIR'):
@@ -59,18 +198,57 @@ def get_local_apps():
 
 
 def get_allowed_apps():
-    return bridgeql_settings.BRIDGEQL_ALLOWED_APPS or get_local_apps()
+    return list(bridgeql_settings.cached('allowed_apps', lambda: tuple(
+        bridgeql_settings.BRIDGEQL_ALLOWED_APPS or get_local_apps())))
+
+
+def _msgpack_loads(body):
+    if msgpack is None:
+        raise UnsupportedMediaType('msgpack is not installed')
+    # timestamps are decoded as aware datetimes in UTC
+    return msgpack.unpackb(body, raw=False, timestamp=3,
+                           ext_hook=msgpack_ext_hook)
+
+
+def _cbor_loads(body):
+    if cbor2 is None:
+        raise UnsupportedMediaType('cbor2 is not installed')
+    return cbor2.loads(body)
+
 
+BODY_DECODERS = {
+    'application/msgpack': _msgpack_loads,
+    'application/x-msgpack': _msgpack_loads,
+    'application/cbor': _cbor_loads,
+}
 
-def get_json_request_body(body):
+
+def decode_request_body(body, content_type=None):
+    """
+    Decode a request body according to its media type, any other media
+    type than the binary ones is decoded as JSON.
+    """
+    media_type = (content_type or '').split(';')[0].strip().lower()
+    decoder = BODY_DECODERS.get(media_type, json.loads)
     try:
-        params = json.loads(body)
-        payload = params.get('payload', None)
-        if payload is None:
-            raise InvalidRequest('payload is not present in request body')
-        if not isinstance(payload, dict):
-            raise InvalidRequest(
-                'Incorrect payload type, Expected dict, got %s' % type(payload))
-        return payload
-    except ValueError as e:
-        raise InvalidRequest(str(e))
+        return decoder(body)
+    except UnsupportedMediaType:
+        raise
+    except Exception as e:
+        # each decoder raises its own error types
+        raise InvalidRequest('Invalid %s body: %s'
+                             % (media_type or 'application/json', e))
+
+
+def get_json_request_body(body, content_type=None):
+    params = decode_request_body(body, content_type)
+    if not isinstance(params, dict):
+        raise InvalidRequest(
+            'Incorrect body type, Expected dict, got %s' % type(params))
+    payload = params.get('payload', None)
+    if payload is None:
+        raise InvalidRequest('payload is not present in request body')
+    if not isinstance(payload, dict):
+        raise InvalidRequest(
+            'Incorrect payload type, Expected dict, got %s' % type(payload))
+    return payload
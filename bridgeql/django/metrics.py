@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+# Copyright © 2023 VMware, Inc.  All rights reserved.
+# SPDX-License-Identifier: BSD-2-Clause
+
+import threading
+from bisect import bisect_left
+
+
+def _escape(value):
+    return str(value).replace('\\', r'\\').replace(
+        '"', r'\"').replace('\n', r'\n')
+
+
+def _format_labels(labelnames, labels, extra=None):
+    pairs = list(zip(labelnames, labels))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    return '{%s}' % ','.join('%s="%s"' % (name, _escape(value))
+                             for name, value in pairs)
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+class Metric(object):
+    type = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def render(self):
+        lines = ['# HELP %s %s' % (self.name, self.documentation),
+                 '# TYPE %s %s' % (self.name, self.type)]
+        with self._lock:
+            values = sorted(self._values.items())
+        for labels, value in values:
+            lines.extend(self._render_sample(labels, value))
+        return lines
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def inc(self, labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, labels):
+        return self._values.get(labels, 0)
+
+    def _render_sample(self, labels, value):
+        return ['%s%s %s' % (self.name,
+                             _format_labels(self.labelnames, labels),
+                             _format_value(value))]
+
+
+class Histogram(Metric):
+    type = 'histogram'
+    DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                       0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+    def __init__(self, name, documentation, labelnames=(),
+                 buckets=DEFAULT_BUCKETS):
+        super(Histogram, self).__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets) + (float('inf'),)
+
+    def observe(self, labels, value):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            sample = self._values.get(labels)
+            if sample is None:
+                # per bucket counts and sum of the observed values
+                sample = self._values[labels] = [[0] * len(self.buckets), 0]
+            sample[0][index] += 1
+            sample[1] += value
+
+    def _render_sample(self, labels, value):
+        counts, total = value
+        lines = []
+        cumulative = 0
+        for bucket, count in zip(self.buckets, counts):
+            cumulative += count
+            lines.append('%s_bucket%s %s' % (
+                self.name,
+                _format_labels(self.labelnames, labels,
+                               ('le', _format_value(float(bucket)))),
+                cumulative))
+        labels = _format_labels(self.labelnames, labels)
+        lines.append('%s_sum%s %s' % (self.name, labels, repr(total)))
+        lines.append('%s_count%s %s' % (self.name, labels, cumulative))
+        return lines
+
+
+class Registry(object):
+
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+    def clear(self):
+        for metric in self.metrics:
+            metric.clear()
+
+
+registry = Registry()
+
+REQUESTS = registry.register(Counter(
+    'bridgeql_requests_total',
+    'Number of bridgeql requests.',
+    ('endpoint', 'model', 'status')))
+EXCEPTIONS = registry.register(Counter(
+    'bridgeql_exceptions_total',
+    'Number of bridgeql requests failed with an exception.',
+    ('endpoint', 'model', 'exception')))
+ROWS = registry.register(Counter(
+    'bridgeql_rows_returned_total',
+    'Number of rows returned by bridgeql reads.',
+    ('endpoint', 'model')))
+BYTES = registry.register(Counter(
+    'bridgeql_response_bytes_total',
+    'Number of bytes returned by bridgeql.',
+    ('endpoint', 'model')))
+LATENCY = registry.register(Histogram(
+    'bridgeql_request_duration_seconds',
+    'Duration of bridgeql requests.',
+    ('endpoint', 'model')))
+PHASE_LATENCY = registry.register(Histogram(
+    'bridgeql_phase_duration_seconds',
+    'Duration of the phases of bridgeql requests.',
+    ('endpoint', 'phase')))
+
+
+def observe(timer, response):
+    model = timer.model_label
+    REQUESTS.inc((timer.endpoint, model, str(response.status_code)))
+    if timer.exception is not None:
+        EXCEPTIONS.inc((timer.endpoint, model,
+                        timer.exception.__class__.__name__))
+    if timer.rows is not None:
+        ROWS.inc((timer.endpoint, model), timer.rows)
+    if not getattr(response, 'streaming', False):
+        BYTES.inc((timer.endpoint, model), len(response.content))
+    LATENCY.observe((timer.endpoint, model), timer.elapsed)
+    for phase, duration in timer.phases.items():
+        PHASE_LATENCY.observe((timer.endpoint, phase), duration)
@@ -9,7 +9,7 @@ from django.core.exceptions import (
     ValidationError,
     ObjectDoesNotExist
 )
-from django.db.models import QuerySet, aggregates
+from django.db.models import F, aggregates
 from django.db.models.base import ModelBase
 from django.db.utils import IntegrityError
 try:
@@ -18,6 +18,7 @@ except ImportError:
     from django.db.utils import ConnectionDoesNotExist
 
 from bridgeql.django import logger
+from bridgeql.django.changelog import tracked_write
 from bridgeql.django.exceptions import (
     ForbiddenModelOrField,
     InvalidRequest,
@@ -27,13 +28,31 @@ from bridgeql.django.exceptions import (
     InvalidPKException,
     ObjectNotFound
 )
+from bridgeql.django.estimate import CountEstimator
 from bridgeql.django.fields import Field, FieldAttributes
+from bridgeql.django.guards import (
+    check_query_cost,
+    get_statement_timeout,
+    row_limit,
+    statement_timeout
+)
 from bridgeql.django.query import Query
 from bridgeql.django.settings import bridgeql_settings
+from bridgeql.models import ChangeLog
 from bridgeql.types import DBRows
 
 
+def _nulls_last(field):
+    if field == '?':
+        return field
+    if field.startswith('-'):
+        return F(field[1:]).desc(nulls_first=True)
+    return F(field).asc(nulls_last=True)
+
+
 class Parameters(object):
+    COUNT_ESTIMATE = 'estimate'
+
     def __init__(self, **kwargs):
         self.params = kwargs.get('params')
         self.db_name = kwargs.get('db_name')  # db to connect
@@ -97,18 +116,13 @@ class ModelConfig(object):
         return self.fields_attrs
 
     def _get_restricted_fields(self):
-        # get from settings
-        restricted_fields = bridgeql_settings.BRIDGEQL_RESTRICTED_MODELS.get(
-            self.full_model_name, [])
-        if isinstance(restricted_fields, list):
-            restricted_fields = set(restricted_fields)
-        return restricted_fields
+        # frozenset of the fields, True for a restricted model
+        return bridgeql_settings.restricted_fields(self.full_model_name)
 
     def _get_model(self):
-        if self.full_model_name in bridgeql_settings.BRIDGEQL_RESTRICTED_MODELS:
-            if self.restricted_fields is True:
-                raise ForbiddenModelOrField(
-                    'Unable to access restricted model %s.' % self.full_model_name)
+        if self.restricted_fields is True:
+            raise ForbiddenModelOrField(
+                'Unable to access restricted model %s.' % self.full_model_name)
         try:
             model = apps.get_model(self.app_name,
                                    self.model_name)
@@ -179,7 +193,9 @@ class ModelObject(object):
                                             key))
             # Perform validation
             self.instance.validate_unique()
-            self.instance.save()
+            with tracked_write(self.instance, ChangeLog.UPDATED,
+                               self.db_name):
+                self.instance.save()
         except (AttributeError, IntegrityError,
                 ValidationError, ValueError) as e:
             raise InvalidRequest(str(e))
@@ -193,13 +209,16 @@ class ModelObject(object):
         # Perform validation
         try:
             self.instance.validate_unique()
-            self.instance.save(**save_kwargs)
+            with tracked_write(self.instance, ChangeLog.CREATED,
+                               self.db_name):
+                self.instance.save(**save_kwargs)
         except (IntegrityError, ValidationError, ValueError) as e:
             raise InvalidRequest(str(e))
         return self.instance
 
     def delete(self):
-        return self.instance.delete()
+        with tracked_write(self.instance, ChangeLog.DELETED, self.db_name):
+            return self.instance.delete()
 
 
 class ModelBuilder(object):
@@ -214,7 +233,16 @@ class ModelBuilder(object):
         ('count', 'count', bool),
     ]
 
-    def __init__(self, db_name, app_name, model_name, params):
+    def __init__(self, db_name, app_name, model_name, params,
+                 model_config=None, limit_checked=False, nulls_last=False):
+        """
+        model_config is given by the callers that validated the fields
+        of params on it beforehand, such as the named queries.
+        limit_checked by the callers that applied row_limit to the limit
+        of the request already, such as the fan-out reads.
+        nulls_last sorts NULL as the largest value whatever the database,
+        for the callers merging ordered rows, such as the fan-out reads.
+        """
         kwargs = {
             'db_name': db_name,
             'app_name': app_name,
@@ -222,8 +250,18 @@ class ModelBuilder(object):
             'params': params
         }
         self.params = Parameters(**kwargs)
+        if not limit_checked:
+            self.params.limit = row_limit(
+                self.params.limit, self.params.count,
+                getattr(self.params, 'aggregate', None))
+        self.nulls_last = nulls_last
         self.qset = None
+        self.aggregate = None
+        self.approximate = False
 
+        if model_config is not None:
+            self.model_config = model_config
+            return
         self.model_config = ModelConfig(
             self.params.app_name, self.params.model_name)
         requested_fields = list()
@@ -244,21 +282,21 @@ class ModelBuilder(object):
             # Parameters class such as [], {}, False
             if not value and qset_opt != 'values':
                 continue
+            if opt == 'count' and value == Parameters.COUNT_ESTIMATE:
+                continue
             if not isinstance(value, opt_type):
                 raise InvalidQueryException('Invalid type %s for %s'
                                             ' expected %s'
                                             % (type(value), opt, opt_type))
             if isinstance(value, dict):
                 if qset_opt == 'aggregate':
-                    aggr_arg = []
+                    self.aggregate = []
                     for aggr_opt, aggr_field in value.items():
                         aggr_func = getattr(aggregates, aggr_opt, None)
                         if aggr_func is None:
                             raise InvalidRequest('Invalid aggregate function %s' %
                                                  aggr_opt)
-                        aggr_func_f = aggr_func(aggr_field)
-                        aggr_arg.append(aggr_func_f)
-                        self.qset = func(*aggr_arg)
+                        self.aggregate.append(aggr_func(aggr_field))
                     # stop all operations after aggregate
                     break
                 else:
@@ -267,11 +305,14 @@ class ModelBuilder(object):
                 self.qset = self.qset[self.params.offset:]
             elif qset_opt == 'limit':
                 self.qset = self.qset[:self.params.limit]
+            elif qset_opt == 'order_by' and self.nulls_last:
+                self.qset = func(*[_nulls_last(field) for field in value])
             elif isinstance(value, list):
                 # handle values case where property is passed in fields
                 if qset_opt == 'values' and self.query_has_properties():
-                    # returns DBRows instance
-                    self.qset = self._add_fields()
+                    # rows are built from model instances in execute()
+                    self.qset = self.qset.select_related(
+                        *self.params.fk_refs_in_fields)
                 else:
                     # in case if fields is not present in the query
                     # return all fields but restricted
@@ -282,8 +323,19 @@ class ModelBuilder(object):
                         self.qset = func(*value)
                     except FieldError as e:
                         raise InvalidModelFieldName(str(e))
-            elif isinstance(value, bool) and value:
+            elif qset_opt == 'distinct':
                 self.qset = func()
+            # count is applied by execute()
+
+    def _estimate_count(self):
+        if self.params.distinct or self.params.limit or self.params.offset:
+            # sampling cannot preserve distinct rows or slices
+            return self.qset.count()
+        filtered = bool(self.qset.query.where)
+        estimator = CountEstimator(self.qset, filtered)
+        count = estimator.count()
+        self.approximate = estimator.approximate
+        return count
 
     def query_has_properties(self):
         # TODO show error if distinct is True and properties are present in fields
@@ -294,9 +346,6 @@ class ModelBuilder(object):
 
     def _add_fields(self):
         qset_values = DBRows()
-        self.qset = self.qset.select_related(*self.params.fk_refs_in_fields)
-        logger.debug('Request parameters: %s \nQuery: %s\n',
-                     self.params.params, self.qset.query)
         for row in self.qset:
             model_fields = {}
             for field in self.params.fields:
@@ -313,7 +362,11 @@ class ModelBuilder(object):
             qset_values.append(model_fields)
         return qset_values
 
-    def queryset(self):
+    def compile(self):
+        """
+        Construct the queryset for the parameters without evaluating it,
+        aggregate and count are applied by execute().
+        """
         # construct Q object from dictionary
         query = Query(self.params.filter)
         if self.params.db_name:
@@ -321,9 +374,51 @@ class ModelBuilder(object):
                 self.params.db_name).filter(query.Q)
         else:
             self.qset = self.model_config.model.objects.filter(query.Q)
+        self.aggregate = None
         self._apply_opts()
-        if isinstance(self.qset, QuerySet):
-            logger.debug('Request parameters: %s \nQuery: %s\n',
-                         self.params.params, self.qset.query)
-            return list(self.qset)
         return self.qset
+
+    def execute(self):
+        """
+        Evaluate the compiled queryset.
+        """
+        logger.debug('Request parameters: %s \nQuery: %s\n',
+                     self.params.params, self.qset.query)
+        if self.aggregate is not None:
+            return self.qset.aggregate(*self.aggregate)
+        if self.params.count == Parameters.COUNT_ESTIMATE:
+            return self._estimate_count()
+        if self.params.count:
+            return self.qset.count()
+        if self.query_has_properties():
+            # returns DBRows instance
+            return self._add_fields()
+        return list(self.qset)
+
+    def _guarded(self, run):
+        check_query_cost(self.qset)
+        timeout = get_statement_timeout(self.model_config.full_model_name)
+        with statement_timeout(self.qset.db, timeout):
+            return run()
+
+    def run(self):
+        """
+        Execute the compiled queryset within the configured guards.
+        """
+        return self._guarded(self.execute)
+
+    def explain(self, analyze=False):
+        """
+        Return the plan of the compiled queryset within the configured
+        guards, analyze executes the query to time it.
+        """
+        explain = getattr(self.qset, 'explain', None)
+        if explain is None:
+            raise InvalidRequest('Explain requires Django 2.1 or later')
+        if analyze:
+            return self._guarded(lambda: explain(analyze=True))
+        return self._guarded(explain)
+
+    def queryset(self):
+        self.compile()
+        return self.run()
@@ -0,0 +1,265 @@
+# -*- coding: utf-8 -*-
+# Copyright © 2023 VMware, Inc.  All rights reserved.
+# SPDX-License-Identifier: BSD-2-Clause
+
+import threading
+from datetime import date, datetime
+
+from django.core.exceptions import FieldError
+from django.utils.dateparse import parse_date, parse_datetime
+
+from bridgeql.django.exceptions import (
+    BridgeqlException,
+    InvalidBridgeQLSettings,
+    InvalidRequest,
+    ObjectNotFound
+)
+from bridgeql.django.models import ModelBuilder
+from bridgeql.django.settings import bridgeql_settings
+from bridgeql.utils import string_types
+
+PLACEHOLDER = '$'
+# parameters naming fields, validated again when bound from a request
+FIELD_PARAMS = ('fields', 'order_by', 'aggregate')
+
+
+def _to_bool(value):
+    if value.lower() in ('1', 'true', 'yes'):
+        return True
+    if value.lower() in ('0', 'false', 'no'):
+        return False
+    raise ValueError('invalid boolean %s' % value)
+
+
+def _to_date(value):
+    parsed = parse_date(value)
+    if parsed is None:
+        raise ValueError('invalid date %s' % value)
+    return parsed
+
+
+def _to_datetime(value):
+    parsed = parse_datetime(value)
+    if parsed is None:
+        raise ValueError('invalid datetime %s' % value)
+    return parsed
+
+
+# type: (converter of the query string value, value used to validate)
+PARAM_TYPES = {
+    'str': (str, 'x'),
+    'int': (int, 1),
+    'float': (float, 1.0),
+    'bool': (_to_bool, True),
+    'date': (_to_date, date(2000, 1, 1)),
+    'datetime': (_to_datetime, datetime(2000, 1, 1)),
+    'list': (None, ['x']),
+}
+
+
+class QueryParam(object):
+    """
+    Typed parameter of a named query, bound from the query string.
+    """
+
+    def __init__(self, name, spec):
+        if not isinstance(spec, dict):
+            spec = {'type': spec}
+        self.name = name
+        self.type = spec.get('type', 'str')
+        if self.type not in PARAM_TYPES:
+            raise InvalidBridgeQLSettings(
+                'Invalid type %s for parameter %s, expected one of %s'
+                % (self.type, name, ', '.join(sorted(PARAM_TYPES))))
+        self.required = 'default' not in spec
+        self.default = spec.get('default')
+
+    def bind(self, query_dict):
+        if self.name not in query_dict:
+            if self.required:
+                raise InvalidRequest('Missing parameter %s' % self.name)
+            return self.default
+        if self.type == 'list':
+            return query_dict.getlist(self.name)
+        try:
+            return PARAM_TYPES[self.type][0](query_dict[self.name])
+        except ValueError:
+            raise InvalidRequest('Invalid value %s for %s parameter %s'
+                                 % (query_dict[self.name], self.type,
+                                    self.name))
+
+    @property
+    def sample(self):
+        if self.default is not None:
+            return self.default
+        return PARAM_TYPES[self.type][1]
+
+
+def _bind(node, values):
+    """
+    Copy node with its $name placeholders replaced by values.
+    """
+    if isinstance(node, dict):
+        return dict((key, _bind(value, values)) for key, value in node.items())
+    if isinstance(node, list):
+        return [_bind(value, values) for value in node]
+    if isinstance(node, string_types) and node.startswith(PLACEHOLDER):
+        return values[node[len(PLACEHOLDER):]]
+    return node
+
+
+def _placeholders(node):
+    if isinstance(node, dict):
+        return set().union(*[_placeholders(value) for value in node.values()])
+    if isinstance(node, list):
+        return set().union(*[_placeholders(value) for value in node])
+    if isinstance(node, string_types) and node.startswith(PLACEHOLDER):
+        return set([node[len(PLACEHOLDER):]])
+    return set()
+
+
+def _field_names(params):
+    """
+    Return the field names of the fields, order_by and aggregate of
+    params, the values of unexpected types are left to ModelBuilder.
+    """
+    names = []
+    for param in FIELD_PARAMS:
+        value = params.get(param)
+        if isinstance(value, dict):
+            value = list(value.values())
+        if not isinstance(value, list):
+            continue
+        names.extend(name.lstrip('-') for name in value
+                     if isinstance(name, string_types) and name != '?')
+    return set(names)
+
+
+class NamedQuery(object):
+    """
+    Read payload validated once against its model, requests only bind
+    the typed parameters and execute it.
+    """
+
+    def __init__(self, name, app_label, model_name, query, params=None,
+                 db_name='default'):
+        self.name = name
+        self.app_label = app_label
+        self.model_name = model_name
+        self.db_name = db_name
+        self.query = query
+        self.params = [QueryParam(param, spec)
+                       for param, spec in (params or {}).items()]
+        undeclared = _placeholders(query) - set(p.name for p in self.params)
+        if undeclared:
+            raise InvalidBridgeQLSettings(
+                'Undeclared parameters %s in named query %s'
+                % (', '.join(sorted(undeclared)), name))
+        # the sample values do not stand for the fields a request names
+        self.bound_fields = any(_placeholders(query.get(param))
+                                for param in FIELD_PARAMS)
+        try:
+            self.model_config = self._validate()
+        except BridgeqlException as e:
+            raise InvalidBridgeQLSettings(
+                'Invalid named query %s: %s' % (name, e))
+
+    def _validate(self):
+        # fields, restricted fields and lookups are checked
+        # once on a payload bound with sample values
+        params = _bind(self.query, dict((param.name, param.sample)
+                                        for param in self.params))
+        mb = ModelBuilder(self.db_name, self.app_label, self.model_name,
+                          params)
+        try:
+            mb.compile()
+        except (FieldError, ValueError, TypeError) as e:
+            raise InvalidRequest(str(e))
+        return mb.model_config
+
+    def bind(self, query_dict):
+        unknown = set(query_dict) - set(param.name for param in self.params)
+        if unknown:
+            raise InvalidRequest('Unknown parameters %s for query %s'
+                                 % (', '.join(sorted(unknown)), self.name))
+        return _bind(self.query, dict((param.name, param.bind(query_dict))
+                                      for param in self.params))
+
+    def builder(self, db_alias, query_dict):
+        """
+        Return the ModelBuilder of the query for the request parameters.
+        """
+        params = self.bind(query_dict)
+        if self.bound_fields:
+            self.model_config.validate_fields(_field_names(params))
+        return ModelBuilder(db_alias, self.app_label, self.model_name,
+                            params, model_config=self.model_config)
+
+
+class NamedQueryRegistry(object):
+    """
+    Named queries of settings.BRIDGEQL_NAMED_QUERIES and of register().
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._registered = {}
+        self._configured = {}
+        self._loaded_from = None
+
+    def _load(self, config):
+        if not isinstance(config, dict):
+            raise InvalidBridgeQLSettings(
+                'BRIDGEQL_NAMED_QUERIES requires dict value')
+        queries = {}
+        for name, definition in config.items():
+            try:
+                queries[name] = NamedQuery(
+                    name, definition['app_label'], definition['model_name'],
+                    definition['query'], definition.get('params'),
+                    definition.get('db_name', 'default'))
+            except (KeyError, TypeError, AttributeError) as e:
+                raise InvalidBridgeQLSettings(
+                    'Invalid named query %s in settings.BRIDGEQL_NAMED_QUERIES, '
+                    '%s' % (name, e))
+        return queries
+
+    def _configured_queries(self):
+        config = bridgeql_settings.BRIDGEQL_NAMED_QUERIES
+        if config is not self._loaded_from:
+            # validated once per settings value
+            with self._lock:
+                if config is not self._loaded_from:
+                    self._configured = self._load(config)
+                    self._loaded_from = config
+        return self._configured
+
+    def register(self, name, app_label, model_name, query, params=None,
+                 db_name='default', replace=False):
+        named_query = NamedQuery(name, app_label, model_name, query, params,
+                                 db_name)
+        with self._lock:
+            if name in self._registered and not replace:
+                raise InvalidBridgeQLSettings(
+                    'Named query %s is already registered' % name)
+            self._registered[name] = named_query
+        return named_query
+
+    def unregister(self, name):
+        with self._lock:
+            self._registered.pop(name, None)
+
+    def get(self, name):
+        named_query = self._registered.get(name) or \
+            self._configured_queries().get(name)
+        if named_query is None:
+            raise ObjectNotFound('Unknown named query %s' % name)
+        return named_query
+
+    def validate(self):
+        self._configured_queries()
+        return True
+
+
+named_queries = NamedQueryRegistry()
+register = named_queries.register
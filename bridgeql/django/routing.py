@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+# Copyright © 2023 VMware, Inc.  All rights reserved.
+# SPDX-License-Identifier: BSD-2-Clause
+
+import random
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+from django.db import connections
+from django.db.utils import DatabaseError
+
+from bridgeql.django import logger
+from bridgeql.django.settings import bridgeql_settings
+from bridgeql.utils import load_function
+
+STICKY_COOKIE = 'bridgeql_last_write_%s'
+STICKY_HEADER = 'X-BridgeQL-Last-Write'
+
+WEIGHTED = 'weighted'
+LEAST_LOADED = 'least_loaded'
+
+
+def postgresql_replication_lag(alias):
+    with connections[alias].cursor() as cursor:
+        cursor.execute(
+            'SELECT CASE WHEN pg_is_in_recovery() THEN '
+            'COALESCE(EXTRACT(EPOCH FROM now() - '
+            'pg_last_xact_replay_timestamp()), 0) ELSE 0 END')
+        return float(cursor.fetchone()[0])
+
+
+def mysql_replication_lag(alias):
+    with connections[alias].cursor() as cursor:
+        cursor.execute('SHOW SLAVE STATUS')
+        row = cursor.fetchone()
+        if row is None:
+            return 0
+        columns = [col[0] for col in cursor.description]
+        return dict(zip(columns, row)).get('Seconds_Behind_Master')
+
+
+REPLICATION_LAG_FUNCTIONS = {
+    'postgresql': postgresql_replication_lag,
+    'mysql': mysql_replication_lag,
+}
+
+
+class ReadRoute(object):
+    def __init__(self, db_name, config):
+        self.db_name = db_name
+        self.primary = config.get('primary', db_name)
+        self.replicas = config.get('replicas', {})
+        if isinstance(self.replicas, (list, tuple)):
+            self.replicas = dict((alias, 1) for alias in self.replicas)
+        self.strategy = config.get('strategy', WEIGHTED)
+        self.max_lag = config.get('max_lag', None)
+        self.lag_check_interval = config.get('lag_check_interval', 1)
+        self.sticky_seconds = config.get('sticky_seconds', 0)
+        self.lag_function = config.get('lag_function', None)
+        if self.lag_function:
+            self.lag_function = load_function(self.lag_function)
+
+
+def _read_routes():
+    return dict((db_name, ReadRoute(db_name, config)) for db_name, config
+                in bridgeql_settings.BRIDGEQL_READ_ROUTING.items())
+
+
+class ReadRouter(object):
+    """
+    Map the db_name of a request to one of the aliases configured in
+    settings.BRIDGEQL_READ_ROUTING.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._in_flight = defaultdict(int)
+        self._lag = {}  # alias -> (checked_at, lag)
+
+    def get_route(self, db_name):
+        # built once, with their lag functions, until the settings change
+        return bridgeql_settings.cached('read_routes', _read_routes).get(
+            db_name)
+
+    def primary(self, db_name):
+        route = self.get_route(db_name)
+        if route is None:
+            return db_name
+        return route.primary
+
+    def route(self, request, db_name):
+        route = self.get_route(db_name)
+        if route is None:
+            return db_name
+        if self.is_sticky(request, route):
+            return route.primary
+        replicas = [alias for alias in route.replicas
+                    if self._is_healthy(alias, route)]
+        if not replicas:
+            return route.primary
+        if route.strategy == LEAST_LOADED:
+            return self._least_loaded(replicas, route)
+        return self._weighted(replicas, route)
+
+    @contextmanager
+    def using(self, alias):
+        with self._lock:
+            self._in_flight[alias] += 1
+        try:
+            yield alias
+        finally:
+            with self._lock:
+                self._in_flight[alias] -= 1
+
+    def is_sticky(self, request, route):
+        if not route.sticky_seconds:
+            return False
+        last_write = request.COOKIES.get(STICKY_COOKIE % route.db_name) or \
+            request.META.get('HTTP_X_BRIDGEQL_LAST_WRITE')
+        try:
+            return time.time() - float(last_write) < route.sticky_seconds
+        except (TypeError, ValueError):
+            return False
+
+    def stick(self, response, db_name):
+        """
+        Pin the following reads of the client to the primary so that it
+        reads its own writes.
+        """
+        route = self.get_route(db_name)
+        if route is None or not route.sticky_seconds:
+            return response
+        now = '%.3f' % time.time()
+        response.set_cookie(STICKY_COOKIE % db_name, now,
+                            max_age=route.sticky_seconds)
+        response[STICKY_HEADER] = now
+        return response
+
+    def _weighted(self, replicas, route):
+        total = sum(route.replicas[alias] for alias in replicas)
+        point = random.uniform(0, total)
+        for alias in replicas:
+            point -= route.replicas[alias]
+            if point <= 0:
+                return alias
+        return replicas[-1]
+
+    def _least_loaded(self, replicas, route):
+        with self._lock:
+            loads = [(self._in_flight[alias] / float(route.replicas[alias] or 1),
+                      random.random(), alias) for alias in replicas]
+        return min(loads)[2]
+
+    def _is_healthy(self, alias, route):
+        if route.max_lag is None:
+            return True
+        lag = self.replication_lag(alias, route)
+        return lag is not None and lag <= route.max_lag
+
+    def replication_lag(self, alias, route):
+        now = time.time()
+        checked_at, lag = self._lag.get(alias, (None, None))
+        if checked_at is not None and now - checked_at < route.lag_check_interval:
+            return lag
+        lag_function = route.lag_function or REPLICATION_LAG_FUNCTIONS.get(
+            connections[alias].vendor, lambda alias: 0)
+        try:
+            lag = lag_function(alias)
+        except DatabaseError as e:
+            logger.error('Unable to check replication lag of %s: %s', alias, e)
+            lag = None
+        self._lag[alias] = (now, lag)
+        return lag
+
+
+read_router = ReadRouter()
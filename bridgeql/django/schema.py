@@ -2,12 +2,29 @@
 # Copyright © 2023 VMware, Inc.  All rights reserved.
 # SPDX-License-Identifier: BSD-2-Clause
 
+import hashlib
+import json
 from collections import defaultdict
 
 from django.apps import apps
 
+from bridgeql.django.fields import FieldAttributes
 from bridgeql.django.helpers import get_allowed_apps
-from bridgeql.django.exceptions import InvalidBridgeQLSettings
+from bridgeql.django.settings import bridgeql_settings
+
+try:
+    from types import MappingProxyType as frozendict
+except ImportError:
+    frozendict = dict
+
+
+def _freeze(value):
+    if isinstance(value, dict):
+        return frozendict(dict((key, _freeze(item))
+                               for key, item in value.items()))
+    if isinstance(value, list):
+        return tuple(_freeze(item) for item in value)
+    return value
 
 
 class BridgeqlModelFields(object):
@@ -19,16 +36,105 @@ class BridgeqlModelFields(object):
                      for _app in _apps]
         return _all_apps
 
+    @classmethod
+    def get_local_apps_configs(cls):
+        """
+        Return the configs of the allowed apps, given by name or label.
+        """
+        configs = {}
+        for config in apps.get_app_configs():
+            configs[config.name] = config
+            configs.setdefault(config.label, config)
+        return [configs[app] for app in get_allowed_apps() if app in configs]
+
     @classmethod
     def get_local_apps_models(cls):
-        try:
-            _local_apps = get_allowed_apps()
-        except InvalidBridgeQLSettings:
-            raise
-        _all_apps = cls.get_all_app_models()
         _local_apps_models = defaultdict(list)
-        for _app in _local_apps:
-            for each in _all_apps:
-                if each.get(_app):
-                    _local_apps_models[_app] = each.get(_app)
+        for config in cls.get_local_apps_configs():
+            _local_apps_models[config.name] = [
+                model.__name__ for model in config.get_models()]
         return _local_apps_models
+
+
+def model_schema(model):
+    """
+    Describe the fields and the properties of a model, the restricted ones
+    are only flagged.
+    """
+    full_model_name = '%s.%s' % (model._meta.app_label,
+                                 model._meta.object_name)
+    restricted = bridgeql_settings.restricted_fields(full_model_name)
+    if restricted is True:
+        return {'restricted': True}
+    fields = {}
+    for field in model._meta.local_fields:
+        if field.name in restricted:
+            fields[field.name] = {'restricted': True}
+            continue
+        related_model = field.related_model
+        fields[field.name] = {
+            'type': field.get_internal_type(),
+            'null': field.null,
+            'help_text': str(field.help_text),
+            'related_model': '%s.%s' % (
+                related_model._meta.app_label,
+                related_model._meta.object_name) if related_model else None,
+            'restricted': False,
+        }
+    properties = set(model._meta._property_names) - {'pk'}
+    return {
+        'pk': model._meta.pk.name,
+        'fields': fields,
+        'properties': sorted(properties - restricted),
+        'restricted': False,
+    }
+
+
+class Schema(object):
+    """
+    Immutable schema of the models of the allowed apps, with its JSON
+    content and the hash of the content as etag.
+    """
+
+    def __init__(self, data):
+        self.content = json.dumps(data, sort_keys=True).encode('utf-8')
+        self.etag = '"%s"' % hashlib.sha256(self.content).hexdigest()
+        self.data = _freeze(data)
+        self.model_info = _freeze(self._model_info(data))
+
+    @classmethod
+    def build(cls):
+        data = {}
+        for config in BridgeqlModelFields.get_local_apps_configs():
+            data[config.label] = dict(
+                ('%s.%s' % (config.label, model._meta.object_name),
+                 model_schema(model)) for model in config.get_models())
+        return cls(data)
+
+    @staticmethod
+    def _model_info(data):
+        # fields of the html schema, the restricted ones are left out
+        model_info = {}
+        for app_label, models in data.items():
+            model_info[app_label] = {}
+            for model_name, model in models.items():
+                if model['restricted']:
+                    continue
+                fields = {}
+                for name, field in model['fields'].items():
+                    if not field['restricted']:
+                        fields[name] = FieldAttributes(
+                            name, field['null'], field['type'],
+                            field['help_text'])
+                for name in model['properties']:
+                    fields[name] = FieldAttributes(
+                        name, None, 'ReadOnly Property', None)
+                model_info[app_label][model_name] = fields
+        return model_info
+
+
+def get_schema():
+    """
+    Return the schema, built once until the settings change.
+    """
+    return bridgeql_settings.cached('schema', Schema.build)
@@ -2,8 +2,11 @@
 # Copyright © 2023 VMware, Inc.  All rights reserved.
 # SPDX-License-Identifier: BSD-2-Clause
 
+import threading
+
 from django.apps import apps
 from django.conf import settings
+from django.core.signals import setting_changed
 
 from bridgeql.django.exceptions import InvalidBridgeQLSettings, InvalidAppOrModelName, InvalidModelFieldName
 from bridgeql.utils import load_function
@@ -15,22 +18,128 @@ DEFAULTS = {
         'reader': '',
         'writer': ''
     },
-    'BRIDGEQL_ALLOWED_APPS': []
+    'BRIDGEQL_ALLOWED_APPS': [],
+    'BRIDGEQL_COUNT_ESTIMATE_THRESHOLD': 100000,
+    'BRIDGEQL_COUNT_SAMPLE_PERCENT': 1.0,
+    'BRIDGEQL_READ_ROUTING': {},
+    'BRIDGEQL_SHARD_GROUPS': {},
+    'BRIDGEQL_FANOUT_WORKERS': 8,
+    'BRIDGEQL_DEFAULT_LIMIT': None,
+    'BRIDGEQL_MAX_LIMIT': None,
+    'BRIDGEQL_STATEMENT_TIMEOUT': None,
+    'BRIDGEQL_MAX_QUERY_COST': None,
+    'BRIDGEQL_METRICS_ENABLED': True,
+    'BRIDGEQL_SLOW_QUERY_THRESHOLD': None,
+    'BRIDGEQL_SLOW_QUERY_TOP_N': 20,
+    'BRIDGEQL_SERVER_TIMING': False,
+    'BRIDGEQL_QUERY_COUNT_HEADERS': False,
+    'BRIDGEQL_AUTH_CACHE_SIZE': 1024,
+    'BRIDGEQL_AUTH_CACHE_TTL': 60,
+    'BRIDGEQL_TOKEN_SECRET': None,
+    'BRIDGEQL_RATE_LIMIT': None,
+    'BRIDGEQL_RATE_LIMIT_CACHE': None,
+    'BRIDGEQL_DB_CONCURRENCY': None,
+    'BRIDGEQL_MODEL_CONCURRENCY': None,
+    'BRIDGEQL_ADMISSION_QUEUE_SIZE': 0,
+    'BRIDGEQL_ADMISSION_TIMEOUT': 1.0,
+    'BRIDGEQL_SINGLEFLIGHT': False,
+    'BRIDGEQL_SINGLEFLIGHT_MAX_WAITERS': 100,
+    'BRIDGEQL_NAMED_QUERIES': {},
+    'BRIDGEQL_CHANGE_FEED_MODELS': [],
+    'BRIDGEQL_CHANGE_FEED_SIGNALS': False,
+    'BRIDGEQL_CHANGE_FEED_BATCH_SIZE': 1000,
+    'BRIDGEQL_CHANGE_FEED_DELAY': 5,
+    'BRIDGEQL_CHANGE_FEED_RETENTION': 7 * 24 * 3600,
+    'BRIDGEQL_MAX_SUBSCRIPTIONS': 100,
+    'BRIDGEQL_SUBSCRIPTION_QUEUE_SIZE': 1000,
+    'BRIDGEQL_SUBSCRIPTION_TIMEOUT': 30,
+    'BRIDGEQL_SUBSCRIPTION_TTL': 60,
+    'BRIDGEQL_ETAGS': True,
+    'BRIDGEQL_EXPORT_MAX_PARTITIONS': 64,
+    'BRIDGEQL_EXPORT_BATCH_SIZE': 1000,
 }
 
 
+# settings the values derived from the bridgeql settings depend on
+DERIVED_FROM = ('INSTALLED_APPS', 'BASE_DIR', 'SITE_ROOT')
+
+
 class BridgeQLSettings:
     """
-    Used to access bridgeql settings
+    Used to access bridgeql settings, copied once as attributes of the
+    instance along with the values derived from them, and copied again
+    when the settings change.
     """
 
     def __init__(self):
         self.defaults = DEFAULTS
+        self.valid = False
+        self._changed = False
+        self._derived = {}
+        self._lock = threading.Lock()
 
     def __getattr__(self, attr):
         if attr not in self.defaults:
             raise AttributeError("Invalid bridgeql setting '%s'" % attr)
-        return getattr(settings, attr, self.defaults[attr])
+        with self._lock:
+            for name, default in self.defaults.items():
+                self.__dict__.setdefault(name,
+                                         getattr(settings, name, default))
+            value = self.__dict__[attr]
+            changed, self._changed = self._changed, False
+        if changed:
+            # the changed settings are validated when they are first read,
+            # not by whoever changed them
+            self.ensure_valid()
+        return value
+
+    def reload(self):
+        """
+        Drop the copied settings and the derived values, they are read
+        and validated again on their next access.
+        """
+        with self._lock:
+            for name in self.defaults:
+                self.__dict__.pop(name, None)
+            self._derived = {}
+            self.valid = False
+            self._changed = True
+
+    def cached(self, key, build):
+        """
+        Return the value derived from the settings by build, built once
+        until the settings change.
+        """
+        derived = self._derived
+        try:
+            return derived[key]
+        except KeyError:
+            value = derived[key] = build()
+            return value
+
+    def _restricted_models(self):
+        restricted_models = {}
+        if not isinstance(self.BRIDGEQL_RESTRICTED_MODELS, dict):
+            raise InvalidBridgeQLSettings(
+                'BRIDGEQL_RESTRICTED_MODELS requires dict value')
+        for model, fields in self.BRIDGEQL_RESTRICTED_MODELS.items():
+            if fields is True:
+                restricted_models[model] = True
+            elif isinstance(fields, (list, tuple, set, frozenset)):
+                restricted_models[model] = frozenset(fields)
+            elif fields is not False:
+                raise InvalidBridgeQLSettings(
+                    'Invalid one or more fields %s in '
+                    'settings.BRIDGEQL_RESTRICTED_MODELS.' % fields)
+        return restricted_models
+
+    def restricted_fields(self, full_model_name):
+        """
+        Return the frozenset of the restricted fields of a model, True
+        when the whole model is restricted.
+        """
+        return self.cached('restricted_models', self._restricted_models).get(
+            full_model_name, frozenset())
 
     def _validate_restricted_models(self):
         """
@@ -66,18 +175,29 @@ class BridgeQLSettings:
                     % restricted_models[model])
         return True
 
+    @property
+    def auth_decorators(self):
+        """
+        Return the paths of the reader and writer decorators, a single
+        path applies to both.
+        """
+        decorators = self.BRIDGEQL_AUTHENTICATION_DECORATOR
+        if isinstance(decorators, str):
+            return {'reader': decorators, 'writer': decorators}
+        return decorators
+
     def _validate_auth_decorator(self):
         # check for the valid auth decorator
-        if not isinstance(self.BRIDGEQL_AUTHENTICATION_DECORATOR, dict):
+        if not isinstance(self.auth_decorators, dict):
             raise InvalidBridgeQLSettings(
                 'Wrong type for settings.BRIDGEQL_AUTHENTICATION_DECORATOR, '
                 'expected dict, got %s'
                 % type(self.BRIDGEQL_AUTHENTICATION_DECORATOR)
             )
-        read_auth = self.BRIDGEQL_AUTHENTICATION_DECORATOR.get(
+        read_auth = self.auth_decorators.get(
             'reader', None
         )
-        write_auth = self.BRIDGEQL_AUTHENTICATION_DECORATOR.get(
+        write_auth = self.auth_decorators.get(
             'writer', None
         )
         try:
@@ -92,11 +212,125 @@ class BridgeQLSettings:
             )
         return True
 
+    def _validate_read_routing(self):
+        read_routing = self.BRIDGEQL_READ_ROUTING
+        if not isinstance(read_routing, dict):
+            raise InvalidBridgeQLSettings(
+                'BRIDGEQL_READ_ROUTING requires dict value')
+        for db_name, config in read_routing.items():
+            if not isinstance(config, dict):
+                raise InvalidBridgeQLSettings(
+                    'Wrong type for settings.BRIDGEQL_READ_ROUTING[%s], '
+                    'expected dict, got %s' % (db_name, type(config)))
+            aliases = [config.get('primary', db_name)]
+            aliases.extend(config.get('replicas', []))
+            for alias in aliases:
+                if alias not in settings.DATABASES:
+                    raise InvalidBridgeQLSettings(
+                        'Unknown database %s in settings.BRIDGEQL_READ_ROUTING'
+                        % alias)
+            try:
+                if config.get('lag_function'):
+                    load_function(config['lag_function'])
+            except (AttributeError, ImportError):
+                raise InvalidBridgeQLSettings(
+                    'Wrong lag_function %s in settings.BRIDGEQL_READ_ROUTING'
+                    % config['lag_function'])
+        return True
+
+    def _validate_token_secret(self):
+        secret = self.BRIDGEQL_TOKEN_SECRET
+        secrets = secret if isinstance(secret, (list, tuple)) else [secret]
+        if secret is not None and (not secrets or not all(secrets)):
+            raise InvalidBridgeQLSettings(
+                'BRIDGEQL_TOKEN_SECRET requires a non empty secret '
+                'or list of secrets')
+        return True
+
+    def _validate_admission(self):
+        rate_limit = self.BRIDGEQL_RATE_LIMIT
+        if rate_limit is not None:
+            if not isinstance(rate_limit, dict) or \
+                    not isinstance(rate_limit.get('rate'), (int, float)) or \
+                    rate_limit['rate'] <= 0 or \
+                    rate_limit.get('burst', rate_limit['rate']) < 1:
+                raise InvalidBridgeQLSettings(
+                    'BRIDGEQL_RATE_LIMIT requires a dict with a positive rate '
+                    'and a burst of at least 1, got %s' % rate_limit)
+        cache_alias = self.BRIDGEQL_RATE_LIMIT_CACHE
+        if cache_alias and cache_alias not in settings.CACHES:
+            raise InvalidBridgeQLSettings(
+                'Unknown cache %s in settings.BRIDGEQL_RATE_LIMIT_CACHE'
+                % cache_alias)
+        for name in ('BRIDGEQL_DB_CONCURRENCY', 'BRIDGEQL_MODEL_CONCURRENCY'):
+            limits = getattr(self, name)
+            values = limits.values() if isinstance(limits, dict) else [limits]
+            if not all(value is None or isinstance(value, int)
+                       for value in values):
+                raise InvalidBridgeQLSettings(
+                    '%s requires an int or a dict of int, got %s'
+                    % (name, limits))
+        return True
+
+    def _validate_change_feed(self):
+        feed_models = self.BRIDGEQL_CHANGE_FEED_MODELS
+        if not isinstance(feed_models, (list, tuple)):
+            raise InvalidBridgeQLSettings(
+                'BRIDGEQL_CHANGE_FEED_MODELS requires list value')
+        for model in feed_models:
+            try:
+                apps.get_model(*str(model).split('.', 1))
+            except (TypeError, ValueError, LookupError):
+                raise InvalidAppOrModelName(
+                    'Invalid model %s in settings.BRIDGEQL_CHANGE_FEED_MODELS'
+                    % model)
+        if not isinstance(self.BRIDGEQL_CHANGE_FEED_BATCH_SIZE, int) or \
+                self.BRIDGEQL_CHANGE_FEED_BATCH_SIZE < 1:
+            raise InvalidBridgeQLSettings(
+                'BRIDGEQL_CHANGE_FEED_BATCH_SIZE requires a positive int')
+        retention = self.BRIDGEQL_CHANGE_FEED_RETENTION
+        if retention is not None and (
+                not isinstance(retention, (int, float)) or retention <= 0):
+            raise InvalidBridgeQLSettings(
+                'BRIDGEQL_CHANGE_FEED_RETENTION requires a positive number '
+                'of seconds or None')
+        return True
+
+    def _validate_named_queries(self):
+        if not self.BRIDGEQL_NAMED_QUERIES:
+            return True
+        # named queries are validated against the models
+        from bridgeql.django.named import named_queries
+        return named_queries.validate()
+
     def validate(self):
         return (
             self._validate_restricted_models() and
-            self._validate_auth_decorator()
+            self._validate_auth_decorator() and
+            self._validate_read_routing() and
+            self._validate_token_secret() and
+            self._validate_admission() and
+            self._validate_change_feed() and
+            self._validate_named_queries()
         )
 
+    def ensure_valid(self):
+        """
+        Validate the settings once, when the bridgeql app is ready and
+        after they change.
+        """
+        if not self.valid:
+            self._changed = False
+            self.valid = self.validate()
+        return self.valid
+
 
 bridgeql_settings = BridgeQLSettings()
+
+
+def _reload_settings(setting, **kwargs):
+    if setting in DEFAULTS or setting in DERIVED_FROM:
+        bridgeql_settings.reload()
+
+
+setting_changed.connect(_reload_settings, dispatch_uid='bridgeql_settings')
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+# Copyright © 2023 VMware, Inc.  All rights reserved.
+# SPDX-License-Identifier: BSD-2-Clause
+
+import json
+import sys
+import threading
+
+from bridgeql.django.settings import bridgeql_settings
+
+
+def flight_key(db_alias, app_label, model_name, params):
+    """
+    Canonical key of a read, payloads differing only by the order of
+    their keys share the same key.
+    """
+    return json.dumps([db_alias, app_label, model_name.lower(), params],
+                      sort_keys=True, default=str)
+
+
+class Flight(object):
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.waiters = 0
+        self.result = None
+        self.exc_info = None
+
+
+class SingleFlight(object):
+    """
+    Run a function once for concurrent calls with the same key, the
+    callers arriving while it runs wait for it and share its result
+    or its exception.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights = {}
+
+    def do(self, key, func):
+        """
+        Return (result, shared), shared is True when the result was
+        computed for another caller.
+        """
+        max_waiters = bridgeql_settings.BRIDGEQL_SINGLEFLIGHT_MAX_WAITERS
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is None:
+                flight = self._flights[key] = Flight()
+                leader = True
+            elif flight.waiters < max_waiters:
+                flight.waiters += 1
+                leader = False
+            else:
+                # too many callers waiting already, run on our own
+                flight, leader = None, False
+        if flight is None:
+            return func(), False
+        if not leader:
+            flight.done.wait()
+            if flight.exc_info is not None:
+                raise flight.exc_info[1]
+            return flight.result, True
+        try:
+            flight.result = func()
+            return flight.result, False
+        except BaseException:
+            flight.exc_info = sys.exc_info()
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+
+    def in_flight(self):
+        return len(self._flights)
+
+
+single_flight = SingleFlight()
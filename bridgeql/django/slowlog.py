@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+# Copyright © 2023 VMware, Inc.  All rights reserved.
+# SPDX-License-Identifier: BSD-2-Clause
+
+import hashlib
+import json
+import threading
+import time
+
+from bridgeql.django import logger
+from bridgeql.django.settings import bridgeql_settings
+from bridgeql.utils import get_client_ip
+
+# bridgeql.django.slowquery, routable apart from the other bridgeql logs
+slow_query_logger = logger.getChild('slowquery')
+
+# number of fingerprints kept per fingerprint reported
+TOP_N_HEADROOM = 4
+
+
+def _normalize_lookups(lookups):
+    if not isinstance(lookups, dict):
+        return '?'
+    shape = {}
+    for key, value in lookups.items():
+        if key == '__or' and isinstance(value, list):
+            shape[key] = [_normalize_lookups(lookup) for lookup in value]
+        else:
+            shape[key] = '?'
+    return shape
+
+
+def normalize(params):
+    """
+    Return the shape of a read payload, literal values are replaced by ?
+    """
+    if not isinstance(params, dict):
+        return '?'
+    shape = {}
+    for key, value in params.items():
+        if key in ('filter', 'exclude'):
+            shape[key] = _normalize_lookups(value)
+        elif key in ('limit', 'offset'):
+            shape[key] = '?'
+        else:
+            shape[key] = value
+    return shape
+
+
+def fingerprint(model_label, params):
+    shape = json.dumps([model_label, normalize(params)], sort_keys=True)
+    return hashlib.sha1(shape.encode('utf-8')).hexdigest()[:16]
+
+
+class SlowQueryLog(object):
+    """
+    Keep the statistics of the slowest payload fingerprints.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}
+
+    def record(self, request, timer):
+        duration = timer.elapsed * 1000
+        threshold = bridgeql_settings.BRIDGEQL_SLOW_QUERY_THRESHOLD
+        if threshold is None or duration < threshold or \
+                timer.query is None:
+            return None
+        model_label = timer.model_label
+        entry = {
+            'fingerprint': fingerprint(model_label, timer.params),
+            'model': model_label,
+            'shape': normalize(timer.params),
+            'sql': str(timer.query.query),
+            'db': timer.query.db,
+            'rows': timer.rows,
+            'client_ip': get_client_ip(request),
+            'duration': round(duration, 3),
+            'timings': dict((phase, round(elapsed * 1000, 3))
+                            for phase, elapsed in timer.phases.items()),
+        }
+        slow_query_logger.warning('Slow query %s', json.dumps(entry, sort_keys=True))
+        self._add(entry)
+        return entry
+
+    def _add(self, entry):
+        top_n = bridgeql_settings.BRIDGEQL_SLOW_QUERY_TOP_N
+        with self._lock:
+            stats = self._entries.get(entry['fingerprint'])
+            if stats is None:
+                stats = self._entries[entry['fingerprint']] = {
+                    'fingerprint': entry['fingerprint'],
+                    'model': entry['model'],
+                    'shape': entry['shape'],
+                    'count': 0,
+                    'total_duration': 0,
+                    'max_duration': 0,
+                }
+            stats['count'] += 1
+            stats['total_duration'] += entry['duration']
+            stats['max_duration'] = max(stats['max_duration'],
+                                        entry['duration'])
+            stats['last'] = entry
+            stats['last_seen'] = time.time()
+            if len(self._entries) > top_n * TOP_N_HEADROOM:
+                fastest = min(self._entries.values(),
+                              key=lambda stats: stats['max_duration'])
+                del self._entries[fastest['fingerprint']]
+
+    def top(self, n=None):
+        n = n or bridgeql_settings.BRIDGEQL_SLOW_QUERY_TOP_N
+        with self._lock:
+            entries = sorted(self._entries.values(),
+                             key=lambda stats: stats['max_duration'],
+                             reverse=True)[:n]
+            return [dict(stats) for stats in entries]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+slow_query_log = SlowQueryLog()
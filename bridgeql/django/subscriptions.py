@@ -0,0 +1,242 @@
+# -*- coding: utf-8 -*-
+# Copyright © 2023 VMware, Inc.  All rights reserved.
+# SPDX-License-Identifier: BSD-2-Clause
+
+import copy
+import json
+import threading
+import time
+import uuid
+from collections import deque
+
+from django.core.exceptions import FieldError
+from django.db.models import Case, IntegerField, Max, Q, Value, When
+from django.http import StreamingHttpResponse
+
+from bridgeql.django.changelog import is_tracked
+from bridgeql.django.events import event_bus
+from bridgeql.django.exceptions import InvalidRequest, ObjectNotFound
+from bridgeql.django.guards import get_statement_timeout, statement_timeout
+from bridgeql.django.helpers import JSONEncoder
+from bridgeql.django.models import ModelBuilder
+from bridgeql.django.query import Query
+from bridgeql.django.settings import bridgeql_settings
+from bridgeql.django.singleflight import flight_key
+
+EVENT_STREAM = 'text/event-stream'
+# event queued in place of the events dropped from a full queue
+OVERFLOW = 'overflow'
+
+
+def wait_timeout(timeout=None):
+    """
+    Return the seconds a long-poll waits for events.
+    """
+    max_timeout = bridgeql_settings.BRIDGEQL_SUBSCRIPTION_TIMEOUT
+    if timeout is None:
+        return max_timeout
+    try:
+        timeout = float(timeout)
+    except ValueError:
+        timeout = -1
+    if not 0 <= timeout <= max_timeout:
+        raise InvalidRequest('Invalid timeout %s, expected 0 to %s'
+                             % (timeout, max_timeout))
+    return timeout
+
+
+class Subscription(object):
+    """
+    Events of the writes to a model whose row matches a bridgeql filter,
+    queued until the subscriber reads them.
+    """
+
+    def __init__(self, db_alias, app_label, model_name, params):
+        if not isinstance(params, dict) or \
+                set(params) - set(['filter', 'fields']):
+            raise InvalidRequest('Subscriptions only take filter and fields')
+        self.filter = params.get('filter') or {}
+        self.fields = list(params.get('fields') or [])
+        if self.fields and 'pk' not in self.fields:
+            self.fields.insert(0, 'pk')
+        # validates the filter and the fields once
+        mb = ModelBuilder(db_alias, app_label, model_name, {
+            'filter': copy.deepcopy(self.filter),
+            'fields': self.fields,
+        })
+        try:
+            mb.compile()
+        except (FieldError, ValueError, TypeError) as e:
+            raise InvalidRequest(str(e))
+        self.model_config = mb.model_config
+        self.model = self.model_config.model
+        # fields of the rows of the events
+        self.row_fields = self.fields or sorted(
+            self.model_config.fields - self.model_config.restricted_fields)
+        if not is_tracked(self.model):
+            raise ObjectNotFound('No change feed for model %s'
+                                 % self.model_config.full_model_name)
+        self.db_alias = db_alias
+        self.id = uuid.uuid4().hex
+        # subscriptions with the same key match the same rows
+        self.key = flight_key(db_alias, self.model._meta.app_label,
+                              self.model._meta.model_name,
+                              [self.filter, self.fields])
+        self.last_seen = time.time()
+        self._events = deque()
+        self._overflowed = False
+        self._sequence = 0
+        self._condition = threading.Condition()
+        # callbacks waking the coroutines waiting for events
+        self._waiters = []
+
+    def read(self, pk, using):
+        """
+        Return the row of pk when it matches the filter, None otherwise.
+        """
+        mb = ModelBuilder(using, self.model_config.app_name,
+                          self.model_config.model_name, {
+                              # Query consumes the filter it is given
+                              'filter': {'pk': pk, '__or': [
+                                  copy.deepcopy(self.filter)]},
+                              'fields': self.fields,
+                              'limit': 1,
+                          }, model_config=self.model_config)
+        rows = mb.queryset()
+        return rows[0] if rows else None
+
+    def condition(self):
+        """
+        Return the Q object of the filter.
+        """
+        if not self.filter:
+            return Q(pk__isnull=False)
+        # Query consumes the filter it is given
+        return Query(copy.deepcopy(self.filter)).Q
+
+    def put(self, event):
+        with self._condition:
+            if len(self._events) >= \
+                    bridgeql_settings.BRIDGEQL_SUBSCRIPTION_QUEUE_SIZE:
+                # the subscriber can not keep up, it has to resync
+                self._events.clear()
+                self._overflowed = True
+            else:
+                self._sequence += 1
+                event['id'] = self._sequence
+                self._events.append(event)
+            self._condition.notify_all()
+            waiters = list(self._waiters)
+        for wake in waiters:
+            wake()
+
+    def add_waiter(self, wake):
+        """
+        Call wake, from the thread of the write, once an event is queued.
+        """
+        with self._condition:
+            self._waiters.append(wake)
+
+    def remove_waiter(self, wake):
+        with self._condition:
+            self._waiters.remove(wake)
+
+    def wait(self, timeout):
+        """
+        Return the queued events, waiting up to timeout for one.
+        """
+        self.last_seen = time.time()
+        deadline = self.last_seen + timeout
+        with self._condition:
+            while not self._events and not self._overflowed:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                self._condition.wait(remaining)
+            events = list(self._events)
+            self._events.clear()
+            if self._overflowed:
+                self._overflowed = False
+                self._sequence += 1
+                events = [{'id': self._sequence, 'action': OVERFLOW,
+                           'pk': None, 'row': None}]
+        self.last_seen = time.time()
+        return events
+
+
+def match_rows(subscriptions, pk, using):
+    """
+    Return the rows of pk matching the filters of subscriptions with
+    distinct keys to a model, by subscription key. A filter is read with
+    its row, several filters are matched in one query and their rows read
+    in another.
+    """
+    if len(subscriptions) == 1:
+        row = subscriptions[0].read(pk, using)
+        return {subscriptions[0].key: row} if row is not None else {}
+    model_config = subscriptions[0].model_config
+    # Max since the joins of a filter may repeat the row
+    flags = dict(('bridgeql_match_%d' % i, Max(Case(
+        When(subscription.condition(), then=Value(1)),
+        default=Value(0), output_field=IntegerField())))
+        for i, subscription in enumerate(subscriptions))
+    timeout = get_statement_timeout(model_config.full_model_name)
+    with statement_timeout(using, timeout):
+        matches = model_config.model.objects.using(using).filter(
+            pk=pk).aggregate(**flags)
+    matched = [subscription for i, subscription in enumerate(subscriptions)
+               if matches['bridgeql_match_%d' % i]]
+    if not matched:
+        return {}
+    fields = []
+    for subscription in matched:
+        fields.extend(field for field in subscription.row_fields
+                      if field not in fields)
+    mb = ModelBuilder(using, model_config.app_name, model_config.model_name,
+                      {'filter': {'pk': pk}, 'fields': fields, 'limit': 1},
+                      model_config=model_config)
+    rows = mb.queryset()
+    if not rows:
+        return {}
+    return dict((subscription.key,
+                 dict((field, rows[0][field])
+                      for field in subscription.row_fields))
+                for subscription in matched)
+
+
+def accepts_stream(request):
+    """
+    Return whether the request asks for an event stream it can be served.
+    The streams wait for their events in the event loop of the ASGI
+    handler of bridgeql, the other requests long-poll rather than hold
+    a thread as long as they are connected.
+    """
+    return EVENT_STREAM in request.META.get('HTTP_ACCEPT', '') and \
+        getattr(request, 'bridgeql_event_streams', False)
+
+
+def format_event(event):
+    return 'id: %s\nevent: %s\ndata: %s\n\n' % (
+        event['id'], event['action'], json.dumps(event, cls=JSONEncoder))
+
+
+# detects the clients gone away
+KEEPALIVE = ': keepalive\n\n'
+
+
+class EventStreamResponse(StreamingHttpResponse):
+    """
+    Server-sent events response of a subscription, its content is the
+    subscribed event, the ASGI handler of bridgeql streams the events of
+    the subscription after it until the client disconnects.
+    """
+
+    def __init__(self, subscription):
+        StreamingHttpResponse.__init__(
+            self, ['event: subscribed\ndata: %s\n\n' % json.dumps(
+                {'subscription': subscription.id})],
+            content_type=EVENT_STREAM)
+        self.subscription = subscription
+        self['Cache-Control'] = 'no-cache'
+        # disable the buffering of nginx
+        self['X-Accel-Buffering'] = 'no'
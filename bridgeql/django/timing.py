@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+# Copyright © 2023 VMware, Inc.  All rights reserved.
+# SPDX-License-Identifier: BSD-2-Clause
+
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from functools import wraps
+from timeit import default_timer as timer
+
+from django.db import connections
+
+from bridgeql.django import metrics
+from bridgeql.django.settings import bridgeql_settings
+from bridgeql.django.slowlog import slow_query_log
+
+# label of the requests to models bridgeql does not serve
+OTHER_MODELS = 'other'
+
+
+def _model_labels():
+    # imported once a request is timed, the schema imports the apps
+    from bridgeql.django.schema import BridgeqlModelFields
+
+    labels = {}
+    for config in BridgeqlModelFields.get_local_apps_configs():
+        for model in config.get_models():
+            label = '%s.%s' % (config.label, model._meta.object_name)
+            if bridgeql_settings.restricted_fields(label) is not True:
+                labels[(config.label, model._meta.model_name)] = label
+    return labels
+
+
+class RequestTimer(object):
+    """
+    Collect the duration, in seconds, of the phases of a bridgeql request.
+    """
+
+    def __init__(self, endpoint, app_label=None, model_name=None):
+        self.endpoint = endpoint
+        self.app_label = app_label
+        self.model_name = model_name
+        self.phases = OrderedDict()
+        self.rows = None
+        self.params = None
+        self.query = None  # queryset run by the request
+        self.exception = None
+        self.queries = 0
+        self.db_time = 0
+        self.track_queries = bool(
+            bridgeql_settings.BRIDGEQL_SERVER_TIMING or
+            bridgeql_settings.BRIDGEQL_QUERY_COUNT_HEADERS)
+        self._lock = threading.Lock()
+        self.start = timer()
+        self.end = None
+
+    @contextmanager
+    def phase(self, name):
+        start = timer()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0) + timer() - start
+
+    def _track_query(self, execute, sql, params, many, context):
+        start = timer()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = timer() - start
+            # fan-out reads run their queries from several threads
+            with self._lock:
+                self.queries += 1
+                self.db_time += elapsed
+
+    @contextmanager
+    def database(self, alias):
+        """
+        Count the queries run on the database alias within the context.
+        """
+        if not self.track_queries or alias not in connections.databases:
+            yield
+            return
+        # execute wrappers are added in django 2.0, the queries of older
+        # versions are not counted
+        execute_wrapper = getattr(connections[alias], 'execute_wrapper', None)
+        if execute_wrapper is None:
+            yield
+            return
+        with execute_wrapper(self._track_query):
+            yield
+
+    def stop(self):
+        self.end = timer()
+
+    @property
+    def elapsed(self):
+        return (self.end or timer()) - self.start
+
+    @property
+    def model_label(self):
+        if self.model_name is None:
+            return ''
+        # the url names any model, the label values are kept bounded
+        labels = bridgeql_settings.cached('model_labels', _model_labels)
+        return labels.get((self.app_label, str(self.model_name).lower()),
+                          OTHER_MODELS)
+
+
+def add_timing_headers(response, timer):
+    if bridgeql_settings.BRIDGEQL_SERVER_TIMING:
+        durations = list(timer.phases.items())
+        durations.append(('db', timer.db_time))
+        durations.append(('total', timer.elapsed))
+        response['Server-Timing'] = ', '.join(
+            '%s;dur=%.3f' % (name, elapsed * 1000)
+            for name, elapsed in durations)
+    if bridgeql_settings.BRIDGEQL_QUERY_COUNT_HEADERS:
+        response['X-BridgeQL-Queries'] = str(timer.queries)
+        response['X-BridgeQL-DB-Time'] = '%.3f' % (timer.db_time * 1000)
+    return response
+
+
+def timed(endpoint):
+    """
+    Decorate a bridgeql view to time its phases and record its metrics.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrap(request, *args, **kwargs):
+            request.bridgeql_timer = RequestTimer(
+                endpoint, kwargs.get('app_label'), kwargs.get('model_name'))
+            response = view(request, *args, **kwargs)
+            request.bridgeql_timer.stop()
+            if bridgeql_settings.BRIDGEQL_METRICS_ENABLED:
+                metrics.observe(request.bridgeql_timer, response)
+            slow_query_log.record(request, request.bridgeql_timer)
+            return add_timing_headers(response, request.bridgeql_timer)
+        return wrap
+    return decorator
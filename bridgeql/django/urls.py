@@ -6,23 +6,42 @@ try:
 except ImportError:
     from django.conf.urls import url
 
-from bridgeql.django import bridge
 from bridgeql.django.settings import bridgeql_settings
-from bridgeql.django.views import index, generate_bridgeql_schema
+from bridgeql.utils import LazyView
 
-bridgeql_settings.validate()
+# without the bridgeql app config, as with Django < 3.2
+bridgeql_settings.ensure_valid()
+
+# the views are imported on their first request
+BRIDGE = 'bridgeql.django.bridge.'
+VIEWS = 'bridgeql.django.views.'
 
 urlpatterns = [
     url(r'^create/(?P<db_name>\w+)/(?P<app_label>\w+)/(?P<model_name>\w+)/$',
-         bridge.create_django_model, name='bridgeql_django_create'),
+         LazyView(BRIDGE + 'create_django_model'), name='bridgeql_django_create'),
     url(r'^read/(?P<db_name>\w+)/(?P<app_label>\w+)/(?P<model_name>\w+)/(?P<pk>\w+)/$',
-         bridge.read_django_model, name='bridgeql_django_read_pk'),
-    url(r'^read/(?P<db_name>\w+)/(?P<app_label>\w+)/(?P<model_name>\w+)/$',
-         bridge.read_django_model, name='bridgeql_django_read'),
+         LazyView(BRIDGE + 'read_django_model'), name='bridgeql_django_read_pk'),
+    url(r'^read/(?P<db_name>[\w,]+)/(?P<app_label>\w+)/(?P<model_name>\w+)/$',
+         LazyView(BRIDGE + 'read_django_model'), name='bridgeql_django_read'),
     url(r'^update/(?P<db_name>\w+)/(?P<app_label>\w+)/(?P<model_name>\w+)/(?P<pk>\w+)/$',
-         bridge.update_django_model, name='bridgeql_django_update'),
+         LazyView(BRIDGE + 'update_django_model'), name='bridgeql_django_update'),
     url(r'^delete/(?P<db_name>\w+)/(?P<app_label>\w+)/(?P<model_name>\w+)/(?P<pk>\w+)/$',
-         bridge.delete_django_model, name='bridgeql_django_delete'),
-    url(r'^schema/$', generate_bridgeql_schema, name='generate_bridgeql_schema'),
-    url(r'', index, name='bridgeql_django_index'),
+         LazyView(BRIDGE + 'delete_django_model'), name='bridgeql_django_delete'),
+    url(r'^explain/(?P<db_name>\w+)/(?P<app_label>\w+)/(?P<model_name>\w+)/$',
+         LazyView(BRIDGE + 'explain_django_model'), name='bridgeql_django_explain'),
+    url(r'^changes/(?P<db_name>\w+)/(?P<app_label>\w+)/(?P<model_name>\w+)/$',
+         LazyView(BRIDGE + 'read_django_model_changes'), name='bridgeql_django_changes'),
+    url(r'^subscribe/(?P<db_name>\w+)/(?P<app_label>\w+)/(?P<model_name>\w+)/$',
+         LazyView(BRIDGE + 'subscribe_django_model'), name='bridgeql_django_subscribe'),
+    url(r'^partitions/(?P<db_name>\w+)/(?P<app_label>\w+)/(?P<model_name>\w+)/$',
+         LazyView(BRIDGE + 'partition_django_model'), name='bridgeql_django_partitions'),
+    url(r'^export/(?P<db_name>\w+)/(?P<app_label>\w+)/(?P<model_name>\w+)/$',
+         LazyView(BRIDGE + 'export_django_model'), name='bridgeql_django_export'),
+    url(r'^query/(?P<query_name>[\w-]+)/$',
+         LazyView(BRIDGE + 'run_named_query'), name='bridgeql_django_named_query'),
+    url(r'^metrics/$', LazyView(VIEWS + 'export_metrics'), name='bridgeql_metrics'),
+    url(r'^slow-queries/$', LazyView(VIEWS + 'slow_queries'), name='bridgeql_slow_queries'),
+    url(r'^schema\.json$', LazyView(VIEWS + 'export_schema'), name='bridgeql_schema_json'),
+    url(r'^schema/$', LazyView(VIEWS + 'generate_bridgeql_schema'), name='generate_bridgeql_schema'),
+    url(r'', LazyView(VIEWS + 'index'), name='bridgeql_django_index'),
 ]
@@ -2,18 +2,18 @@
 # Copyright © 2023 VMware, Inc.  All rights reserved.
 # SPDX-License-Identifier: BSD-2-Clause
 
-
-from collections import defaultdict
-
+from django.http import HttpResponse
 from django.shortcuts import render
 from django.views.decorators.http import require_GET
 from django.contrib.admin.views.decorators import staff_member_required
 
 
 from bridgeql import __copyright__, __license__, __title__, __version__
-from bridgeql.django.exceptions import InvalidBridgeQLSettings
-from bridgeql.django.schema import BridgeqlModelFields
-from bridgeql.django.models import ModelConfig
+from bridgeql.django import metrics
+from bridgeql.django.auth import read_auth_decorator
+from bridgeql.django.helpers import not_modified, render_response
+from bridgeql.django.schema import get_schema
+from bridgeql.django.slowlog import slow_query_log
 
 
 def index(request):
@@ -30,17 +30,39 @@ def index(request):
 @staff_member_required
 @require_GET
 def generate_bridgeql_schema(request):
-    model_info = defaultdict(dict)
+    model_info = get_schema().model_info
     msg = ""
-    try:
-        local_apps_models = BridgeqlModelFields.get_local_apps_models()
-    except InvalidBridgeQLSettings:
+    if not model_info:
         msg = "Could not find schema, please initialize BRIDGEQL_ALLOWED_APPS in settings.py"
-        return render(request, "bridgeql/schema.html", {"model_info": dict(model_info), 'msg': msg})
-    for app, models in local_apps_models.items():
-        model_info[app] = {}
-        for model in models:
-            _model_config = ModelConfig(app, model)
-            _model_name = _model_config.full_model_name
-            model_info[app][_model_name] = _model_config.get_fields_attrs()
-    return render(request, "bridgeql/schema.html", {"model_info": dict(model_info), 'msg': msg})
+    return render(request, "bridgeql/schema.html", {"model_info": model_info, 'msg': msg})
+
+
+@require_GET
+@read_auth_decorator
+def export_schema(request):
+    schema = get_schema()
+    response = not_modified(request, schema.etag, vary='Authorization')
+    if response is None:
+        response = HttpResponse(schema.content,
+                                content_type='application/json')
+        response['ETag'] = schema.etag
+        response['Vary'] = 'Authorization'
+    return response
+
+
+@require_GET
+@read_auth_decorator
+def export_metrics(request):
+    return HttpResponse(metrics.registry.render(),
+                        content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+@staff_member_required
+@require_GET
+def slow_queries(request):
+    try:
+        top_n = int(request.GET.get('n', 0))
+    except ValueError:
+        top_n = 0
+    res = {'data': slow_query_log.top(top_n), 'message': '', 'success': True}
+    return render_response(request, res)
@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+# Copyright © 2023 VMware, Inc.  All rights reserved.
+# SPDX-License-Identifier: BSD-2-Clause
+
+from django.core.management.base import BaseCommand, CommandError
+
+from bridgeql.django.auth import make_token
+
+
+class Command(BaseCommand):
+    help = ("Create a signed token for the read_token_auth and "
+            "write_token_auth decorators.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('subject',
+                            help='Name of the client the token is issued to.')
+        parser.add_argument('--scope', '-s', action='append', dest='scopes',
+                            required=True,
+                            help=('Access granted to the token, e.g. read:machine.* '
+                                  'or write:machine.Machine, can be repeated.'))
+        parser.add_argument('--expires', '-e', type=int, default=3600,
+                            help='Validity of the token in seconds, default : %(default)s.')
+
+    def handle(self, *args, **options):
+        for scope in options['scopes']:
+            access, _, models = scope.partition(':')
+            if access not in ('read', 'write') or not models:
+                raise CommandError('Invalid scope %s, expected read:<app>.<model> '
+                                   'or write:<app>.<model>' % scope)
+        self.stdout.write(make_token(options['subject'], options['scopes'],
+                                     options['expires']))
@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+# Copyright © 2023 VMware, Inc.  All rights reserved.
+# SPDX-License-Identifier: BSD-2-Clause
+
+from django.core.management.base import BaseCommand
+
+from bridgeql.django.changes import prune_changes
+from bridgeql.django.settings import bridgeql_settings
+
+
+class Command(BaseCommand):
+    help = ("Delete the change feed entries older than "
+            "settings.BRIDGEQL_CHANGE_FEED_RETENTION.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=None,
+                            help='Database to prune, default : the database of the change log.')
+        parser.add_argument('--batch-size', type=int, default=10000,
+                            help='Number of ids deleted per transaction, default : %(default)s.')
+
+    def handle(self, *args, **options):
+        if bridgeql_settings.BRIDGEQL_CHANGE_FEED_RETENTION is None:
+            self.stdout.write('BRIDGEQL_CHANGE_FEED_RETENTION is None, '
+                              'the change log is kept.')
+            return
+        deleted = prune_changes(options['database'],
+                                batch_size=options['batch_size'])
+        self.stdout.write('Deleted %d change log entries.' % deleted)
@@ -0,0 +1,29 @@
+# Generated by Django 3.2.24 on 2026-10-19 18:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChangeLog',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('app_label', models.CharField(max_length=100)),
+                ('model_name', models.CharField(max_length=100)),
+                ('object_pk', models.CharField(max_length=255)),
+                ('action', models.CharField(choices=[('created', 'Created'), ('updated', 'Updated'), ('deleted', 'Deleted')], max_length=7)),
+                ('changed_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='changelog',
+            index=models.Index(fields=['app_label', 'model_name', 'id'], name='bridgeql_ch_app_lab_71569f_idx'),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+# Copyright © 2023 VMware, Inc.  All rights reserved.
+# SPDX-License-Identifier: BSD-2-Clause
+
+from django.db import models
+try:
+    from django.utils.encoding import python_2_unicode_compatible
+except ImportError:
+    # removed with python 2 in django 3.0
+    def python_2_unicode_compatible(klass):
+        return klass
+
+
+@python_2_unicode_compatible
+class ChangeLog(models.Model):
+    """
+    Write to a model of settings.BRIDGEQL_CHANGE_FEED_MODELS, its id is
+    the monotonic token of the change feed.
+    """
+    CREATED = 'created'
+    UPDATED = 'updated'
+    DELETED = 'deleted'
+    ACTIONS = (
+        (CREATED, 'Created'),
+        (UPDATED, 'Updated'),
+        (DELETED, 'Deleted'),
+    )
+
+    id = models.BigAutoField(primary_key=True)
+    app_label = models.CharField(max_length=100)
+    model_name = models.CharField(max_length=100)
+    object_pk = models.CharField(max_length=255)
+    action = models.CharField(max_length=7, choices=ACTIONS)
+    changed_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['app_label', 'model_name', 'id'])]
+
+    def __str__(self):
+        return '%s %s.%s pk=%s' % (self.action, self.app_label,
+                                   self.model_name, self.object_pk)
@@ -3,8 +3,17 @@ import importlib
 import json
 import socket
 import sys
+import uuid
 
 PY_VERSION = sys.version_info.major
+# types of the decoded JSON and query string values, unicode on python 2
+if PY_VERSION >= 3:
+    string_types = (str,)
+else:
+    string_types = (basestring,)  # noqa: F821
+
+# msgpack extension type of the UUIDs, their 16 bytes
+MSGPACK_EXT_UUID = 1
 
 
 def get_client_ip(request):
@@ -54,7 +63,48 @@ def b64decode_json(data):
     return json.loads(base64.b64decode(data))
 
 
+def msgpack_ext_hook(code, data):
+    """
+    Decode the msgpack extension types of bridgeql, for msgpack.unpackb.
+    """
+    if code == MSGPACK_EXT_UUID:
+        return uuid.UUID(bytes=bytes(data))
+    # imported here, msgpack is optional
+    import msgpack
+    return msgpack.ExtType(code, data)
+
+
 def load_function(function_str):
     mod_name, func_name = function_str.rsplit('.', 1)
     mod = importlib.import_module(mod_name)
     return getattr(mod, func_name)
+
+
+class LazyView(object):
+    """
+    View imported from its dotted path on first use, attributes such as
+    csrf_exempt are read from the view once imported.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.__module__, self.__name__ = path.rsplit('.', 1)
+        self.__qualname__ = self.__name__
+        self._view = None
+
+    @property
+    def view(self):
+        if self._view is None:
+            self._view = load_function(self.path)
+        return self._view
+
+    def __call__(self, request, *args, **kwargs):
+        return self.view(request, *args, **kwargs)
+
+    def __getattr__(self, name):
+        if name.startswith('__') or name == '_view':
+            raise AttributeError(name)
+        return getattr(self.view, name)
+
+    def __repr__(self):
+        return '<LazyView %s>' % self.path
@@ -53,5 +53,12 @@ setuptools.setup(
     },
     packages=setuptools.find_packages(exclude=['tests*']),
     package_data={'': ['templates/**/*.html']},
-    python_requires=">=2.7"
+    python_requires=">=2.7",
+    install_requires=[
+        'futures; python_version<"3"',
+    ],
+    extras_require={
+        'msgpack': ['msgpack>=1.0'],
+        'cbor': ['cbor2'],
+    },
 )
@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+# Copyright © 2023 VMware, Inc.  All rights reserved.
+# SPDX-License-Identifier: BSD-2-Clause
+
+import math
+import platform
+import random
+import resource
+import sys
+from timeit import default_timer as timer
+
+import django
+from django.conf import settings
+from django.db import connection
+from django.test.client import Client
+from django.test.utils import override_settings
+
+import bridgeql
+
+
+def percentile(sorted_values, percent):
+    """
+    Nearest-rank percentile of an already sorted list.
+    """
+    if not sorted_values:
+        return None
+    rank = int(math.ceil(percent / 100.0 * len(sorted_values))) - 1
+    return sorted_values[max(rank, 0)]
+
+
+def peak_rss():
+    """
+    Peak resident set size of the process in bytes.
+    """
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # linux reports kilobytes, macOS bytes
+    return rss if sys.platform == 'darwin' else rss * 1024
+
+
+class BenchmarkRunner(object):
+
+    def __init__(self, scenarios, iterations=100, warmup=10, seed=0):
+        self.scenarios = scenarios
+        self.iterations = iterations
+        self.warmup = warmup
+        self.seed = seed
+        self.client = Client()
+
+    def run_scenario(self, scenario):
+        rnd = random.Random('%s-%s' % (self.seed, scenario.name))
+        for _ in range(self.warmup):
+            self._request(scenario, rnd)
+        latencies = []
+        rows = 0
+        for _ in range(self.iterations):
+            start = timer()
+            response = self._request(scenario, rnd)
+            latencies.append(timer() - start)
+            rows += scenario.rows(response)
+        latencies.sort()
+        total = sum(latencies)
+        return {
+            'iterations': self.iterations,
+            'rows': rows,
+            'mean': total / len(latencies),
+            'p50': percentile(latencies, 50),
+            'p95': percentile(latencies, 95),
+            'p99': percentile(latencies, 99),
+            'max': latencies[-1],
+            'requests_per_second': len(latencies) / total,
+            'rows_per_second': rows / total,
+            'peak_rss': peak_rss(),
+        }
+
+    def _request(self, scenario, rnd):
+        response = scenario.request(self.client, rnd)
+        if response.status_code >= 300:
+            raise RuntimeError('Scenario %s failed with %s: %s' % (
+                scenario.name, response.status_code, response.content))
+        return response
+
+    def run(self, scenario_names=None):
+        results = {}
+        # DEBUG keeps every query in connection.queries which skews
+        # both timings and memory, run like the test runner does
+        with override_settings(DEBUG=False,
+                               ALLOWED_HOSTS=settings.ALLOWED_HOSTS + ['testserver']):
+            for scenario in self.scenarios:
+                if scenario_names and scenario.name not in scenario_names:
+                    continue
+                results[scenario.name] = self.run_scenario(scenario)
+        return {
+            'bridgeql': bridgeql.__version__,
+            'django': django.get_version(),
+            'python': platform.python_version(),
+            'database': connection.vendor,
+            'iterations': self.iterations,
+            'warmup': self.warmup,
+            'seed': self.seed,
+            'peak_rss': peak_rss(),
+            'scenarios': results,
+        }
+
+
+def compare(results, baseline, max_regression):
+    """
+    Return the (scenario, metric, ratio) whose latency grew more than
+    max_regression times the baseline latency.
+    """
+    regressions = []
+    for name, result in results['scenarios'].items():
+        base = baseline['scenarios'].get(name)
+        if base is None:
+            continue
+        for metric in ('p50', 'p95', 'p99'):
+            if not base[metric]:
+                continue
+            ratio = result[metric] / base[metric]
+            if ratio > max_regression:
+                regressions.append((name, metric, ratio))
+    return regressions
@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+# Copyright © 2023 VMware, Inc.  All rights reserved.
+# SPDX-License-Identifier: BSD-2-Clause
+
+import json
+from datetime import datetime
+
+from django.urls import reverse
+
+
+class Scenario(object):
+    """
+    A timed request on the bridgeql API, payloads are drawn from the
+    random generator given to request() so that runs are reproducible.
+    """
+    name = None
+    url_name = 'bridgeql_django_read'
+    model_name = 'Machine'
+
+    def __init__(self, machines, operating_systems):
+        self.machines = machines
+        self.operating_systems = operating_systems
+
+    def url(self, **kwargs):
+        url_kwargs = {
+            'db_name': 'default',
+            'app_label': 'machine',
+            'model_name': self.model_name,
+        }
+        url_kwargs.update(kwargs)
+        return reverse(self.url_name, kwargs=url_kwargs)
+
+    def payload(self, rnd):
+        raise NotImplementedError
+
+    def request(self, client, rnd):
+        return client.get(self.url(),
+                          {'payload': json.dumps(self.payload(rnd))})
+
+    def rows(self, response):
+        data = response.json()['data']
+        return len(data) if isinstance(data, list) else 1
+
+
+class FilterExclude(Scenario):
+    name = 'filter_exclude'
+
+    def payload(self, rnd):
+        os_id = rnd.randint(1, self.operating_systems)
+        return {
+            'filter': {'os__name': 'os-name-%d' % os_id},
+            'exclude': {'powered_on': True},
+            'fields': ['ip', 'name', 'os__arch'],
+            'limit': 100,
+        }
+
+
+class PropertyFields(Scenario):
+    name = 'property_fields'
+
+    def payload(self, rnd):
+        return {
+            'filter': {'name__startswith': 'machine-name-%d'
+                       % rnd.randint(1, 9)},
+            'fields': ['ip', 'stats', 'os__name', 'os__full_name'],
+            'limit': 100,
+        }
+
+
+class OrderByOffset(Scenario):
+    name = 'order_by_offset'
+
+    def payload(self, rnd):
+        return {
+            'fields': ['ip', 'memory'],
+            'order_by': ['-memory', 'name'],
+            'offset': rnd.randint(0, max(self.machines - 50, 0)),
+            'limit': 50,
+        }
+
+
+class Aggregate(Scenario):
+    name = 'aggregate'
+
+    def payload(self, rnd):
+        return {
+            'filter': {'powered_on': rnd.random() < 0.5},
+            'aggregate': {'Max': 'cpu_count', 'Avg': 'memory', 'Count': 'os'},
+        }
+
+
+class Count(Scenario):
+    name = 'count'
+
+    def payload(self, rnd):
+        return {
+            'filter': {'cpu_count__gte': rnd.randint(0, 14)},
+            'count': True,
+        }
+
+
+class ReadByPk(Scenario):
+    name = 'read_pk'
+    url_name = 'bridgeql_django_read_pk'
+
+    def request(self, client, rnd):
+        return client.get(self.url(pk=rnd.randint(1, self.machines)))
+
+
+class WriteScenario(Scenario):
+
+    def rows(self, response):
+        return 1
+
+
+class Create(WriteScenario):
+    name = 'create'
+    url_name = 'bridgeql_django_create'
+
+    def __init__(self, machines, operating_systems):
+        super(Create, self).__init__(machines, operating_systems)
+        # pks of the machines created, updated and deleted later on
+        self.created = []
+
+    def request(self, client, rnd):
+        params = {
+            'ip': '10.1.%d.%d' % (rnd.randint(0, 255), rnd.randint(0, 255)),
+            'name': 'benchmark-%d' % rnd.randint(0, 1 << 30),
+            'cpu_count': rnd.randint(1, 16),
+            'memory': rnd.randint(1, 512),
+            'created_at': datetime.now().isoformat(),
+            'powered_on': False,
+            'os_id': rnd.randint(1, self.operating_systems),
+        }
+        response = client.post(self.url(), json.dumps({'payload': params}),
+                               content_type='application/json')
+        self.created.append(response.json()['data'])
+        return response
+
+
+class Update(WriteScenario):
+    name = 'update'
+    url_name = 'bridgeql_django_update'
+
+    def __init__(self, created):
+        super(Update, self).__init__(0, 0)
+        self.created = created
+
+    def request(self, client, rnd):
+        params = {'powered_on': rnd.random() < 0.5,
+                  'memory': rnd.randint(1, 512)}
+        return client.patch(self.url(pk=rnd.choice(self.created)),
+                            json.dumps({'payload': params}),
+                            content_type='application/json')
+
+
+class Delete(WriteScenario):
+    name = 'delete'
+    url_name = 'bridgeql_django_delete'
+
+    def __init__(self, created):
+        super(Delete, self).__init__(0, 0)
+        self.created = created
+
+    def request(self, client, rnd):
+        return client.delete(self.url(pk=self.created.pop()))
+
+
+def get_scenarios(machines, operating_systems):
+    create = Create(machines, operating_systems)
+    return [
+        FilterExclude(machines, operating_systems),
+        PropertyFields(machines, operating_systems),
+        OrderByOffset(machines, operating_systems),
+        Aggregate(machines, operating_systems),
+        Count(machines, operating_systems),
+        ReadByPk(machines, operating_systems),
+        # writes run last and leave the data set as they found it
+        create,
+        Update(create.created),
+        Delete(create.created),
+    ]
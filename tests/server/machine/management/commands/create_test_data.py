@@ -5,10 +5,22 @@
 from datetime import timedelta
 from django.utils import timezone
 from django.core.management.base import BaseCommand
+from django.db import transaction
 
 from machine.models import Machine, OperatingSystem
 
 
+def chunks(objects, size):
+    chunk = []
+    for obj in objects:
+        chunk.append(obj)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
 class Command(BaseCommand):
     help = "Command to populate test data locally."
 
@@ -20,25 +32,48 @@ class Command(BaseCommand):
                                   'Scale 1 means 100 machine and 10 os entries, default : %(default)s.'),
                             type=int,
                             )
+        parser.add_argument('--batch-size', '-b',
+                            dest="batch_size",
+                            default=5000,
+                            help=('Number of records inserted per query, '
+                                  'default : %(default)s.'),
+                            type=int,
+                            )
 
-    def handle(self, *args, **options):
-        scale = options['scale']
+    def operating_systems(self, scale):
         for i in range(10 * scale):
-            os = OperatingSystem.objects.create(
+            yield OperatingSystem(
                 name="os-name-%d" % (i+1),
                 arch="arch-name-%d" % (i+1)
             )
+
+    def machines(self, scale, os_offset):
+        now = timezone.now()
         for i in range(100 * scale):
-            machine = Machine.objects.create(
+            yield Machine(
                 ip="10.0.0.%d" % (i+1),
                 name="machine-name-%d" % (i+1),
                 cpu_count=((i+1) % 8)*2,
                 memory=(i+1)**2,
-                created_at=timezone.now() - timedelta(days=99-i),
+                # the dates repeat every 100 machines, whatever the scale
+                created_at=now - timedelta(days=99 - i % 100),
                 powered_on=bool(i % 2),
-                os_id=i % (10*scale) + 1
+                os_id=i % (10*scale) + 1 + os_offset
             )
-        print("Test data created successfully %d os and %d machine." % (
+
+    def handle(self, *args, **options):
+        scale = options['scale']
+        batch_size = options['batch_size']
+        # rows are generated lazily and inserted in batches
+        # so that memory stays flat whatever the scale
+        with transaction.atomic():
+            last_os = OperatingSystem.objects.order_by('-pk').first()
+            os_offset = last_os.pk if last_os else 0
+            for batch in chunks(self.operating_systems(scale), batch_size):
+                OperatingSystem.objects.bulk_create(batch)
+            for batch in chunks(self.machines(scale, os_offset), batch_size):
+                Machine.objects.bulk_create(batch)
+        self.stdout.write("Test data created successfully %d os and %d machine." % (
             OperatingSystem.objects.count(),
             Machine.objects.count()
         ))
@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+# Copyright © 2023 VMware, Inc.  All rights reserved.
+# SPDX-License-Identifier: BSD-2-Clause
+
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from machine.benchmark.runner import BenchmarkRunner, compare
+from machine.benchmark.scenarios import get_scenarios
+from machine.models import Machine, OperatingSystem
+
+
+class Command(BaseCommand):
+    help = ("Run timed bridgeql scenarios on the data created by "
+            "create_test_data and report latency percentiles as JSON.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', '-i', type=int, default=100,
+                            help='Timed requests per scenario, default : %(default)s.')
+        parser.add_argument('--warmup', '-w', type=int, default=10,
+                            help='Untimed requests per scenario, default : %(default)s.')
+        parser.add_argument('--seed', '-s', type=int, default=0,
+                            help='Seed of the payload generator, default : %(default)s.')
+        parser.add_argument('--scenario', action='append', dest='scenarios',
+                            help='Run only the given scenario, can be repeated.')
+        parser.add_argument('--output', '-o',
+                            help='Write the results to this JSON file.')
+        parser.add_argument('--baseline',
+                            help='Compare the results to a previous JSON output.')
+        parser.add_argument('--max-regression', type=float, default=1.2,
+                            help=('Fail if a latency percentile is this many times '
+                                  'the baseline one, default : %(default)s.'))
+
+    def handle(self, *args, **options):
+        machines = Machine.objects.count()
+        operating_systems = OperatingSystem.objects.count()
+        if not machines or not operating_systems:
+            raise CommandError('No test data found, run create_test_data first.')
+        runner = BenchmarkRunner(get_scenarios(machines, operating_systems),
+                                 iterations=options['iterations'],
+                                 warmup=options['warmup'],
+                                 seed=options['seed'])
+        results = runner.run(options['scenarios'])
+        results['machines'] = machines
+        results['operating_systems'] = operating_systems
+        output = json.dumps(results, indent=2, sort_keys=True)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output)
+        else:
+            self.stdout.write(output)
+
+        if options['baseline']:
+            with open(options['baseline']) as f:
+                baseline = json.load(f)
+            regressions = compare(results, baseline, options['max_regression'])
+            for name, metric, ratio in regressions:
+                self.stderr.write('%s %s is %.2f times the baseline'
+                                  % (name, metric, ratio))
+            if regressions:
+                raise CommandError('%d latency regressions' % len(regressions))
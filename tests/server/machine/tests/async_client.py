@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+# Copyright © 2023 VMware, Inc.  All rights reserved.
+# SPDX-License-Identifier: BSD-2-Clause
+
+import asyncio
+import os
+
+from django.conf import settings
+from django.test import LiveServerTestCase
+
+from bridgeql.client import AsyncClient
+
+
+class TestAsyncClient(LiveServerTestCase):
+    fixtures = [os.path.join(settings.BASE_DIR, 'machine_tests.json'), ]
+
+    def test_async(self):
+        async def read():
+            async with AsyncClient(self.live_server_url + '/bridgeql') \
+                    as client:
+                machines = client.model('default', 'machine', 'Machine')
+                count, rows = await asyncio.gather(
+                    machines.count(),
+                    machines.fields('ip').filter(pk__lte=3).all())
+                iterated = [row async for row in
+                            machines.fields('ip').iterate(page_size=30)]
+                return count, rows, iterated
+
+        count, rows, iterated = asyncio.run(read())
+        self.assertEqual(count, 100)
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(len(iterated), 100)
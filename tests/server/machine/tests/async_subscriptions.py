@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+# Copyright © 2023 VMware, Inc.  All rights reserved.
+# SPDX-License-Identifier: BSD-2-Clause
+
+import asyncio
+import json
+import os
+from urllib.parse import urlencode
+
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.core import signals
+from django.db import close_old_connections
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from bridgeql.django.events import event_bus
+from bridgeql.django.handlers import BridgeqlASGIHandler
+
+POWERED_ON = {'filter': {'powered_on': True}, 'fields': ['ip', 'powered_on']}
+
+
+@override_settings(BRIDGEQL_CHANGE_FEED_MODELS=['machine.Machine'],
+                   BRIDGEQL_SUBSCRIPTION_TIMEOUT=5)
+class TestEventStreams(TestCase):
+    fixtures = [os.path.join(settings.BASE_DIR, 'machine_tests.json'), ]
+
+    def setUp(self):
+        # the connection of the test case is kept, as the test client does
+        signals.request_started.disconnect(close_old_connections)
+        signals.request_finished.disconnect(close_old_connections)
+
+    def tearDown(self):
+        signals.request_started.connect(close_old_connections)
+        signals.request_finished.connect(close_old_connections)
+        for subscription in list(event_bus._subscriptions.values()):
+            event_bus.unsubscribe(subscription)
+
+    def stream(self, on_chunk, accept='text/event-stream'):
+        """
+        Run a subscription request through the ASGI handler of bridgeql,
+        on_chunk is given each chunk of the body and returns True to
+        disconnect the client.
+        """
+        path = reverse('bridgeql_django_subscribe', kwargs={
+            'db_name': 'default', 'app_label': 'machine',
+            'model_name': 'Machine'})
+        scope = {
+            'type': 'http', 'method': 'GET', 'path': path,
+            'query_string': urlencode(
+                {'payload': json.dumps(POWERED_ON),
+                 'timeout': 0}).encode('ascii'),
+            'headers': [(b'host', b'testserver'),
+                        (b'accept', accept.encode('ascii'))],
+        }
+        messages = []
+
+        async def run():
+            disconnected = asyncio.Event()
+            received = [{'type': 'http.request', 'body': b''}]
+
+            async def receive():
+                if received:
+                    return received.pop()
+                await disconnected.wait()
+                return {'type': 'http.disconnect'}
+
+            async def send(message):
+                messages.append(message)
+                if message.get('body') and on_chunk(message['body']):
+                    disconnected.set()
+
+            await BridgeqlASGIHandler()(scope, receive, send)
+
+        # the sync parts of the handler run in the thread of the test
+        async_to_sync(run)()
+        return messages
+
+    def test_stream(self):
+        chunks = []
+
+        def on_chunk(chunk):
+            chunks.append(chunk.decode())
+            if len(chunks) == 1:
+                # queued by a write once the stream waits for events
+                subscription, = event_bus._subscriptions.values()
+                asyncio.get_event_loop().call_later(
+                    0.05, subscription.put,
+                    {'action': 'updated', 'pk': 1, 'row': None})
+            return len(chunks) == 2
+
+        messages = self.stream(on_chunk)
+        self.assertEqual(messages[0]['status'], 200)
+        self.assertIn((b'Content-Type', b'text/event-stream'),
+                      messages[0]['headers'])
+        self.assertTrue(chunks[0].startswith('event: subscribed\n'))
+        self.assertTrue(chunks[1].startswith('id: 1\nevent: updated\ndata: '))
+        self.assertEqual(json.loads(chunks[1].split('data: ', 1)[1])['pk'], 1)
+        self.assertEqual(messages[-1], {'type': 'http.response.body'})
+        # the subscription of a stream ends with it
+        self.assertEqual(len(event_bus), 0)
+
+    def test_long_poll(self):
+        messages = self.stream(lambda chunk: False,
+                               accept='application/json')
+        self.assertEqual(messages[0]['status'], 200)
+        res = json.loads(messages[1]['body'])
+        self.assertEqual(res['data'], [])
+        self.assertEqual(len(event_bus), 1)
@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+# Copyright © 2023 VMware, Inc.  All rights reserved.
+# SPDX-License-Identifier: BSD-2-Clause
+
+import json
+import os
+import threading
+
+from django.conf import settings
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.client import Client
+from django.urls import reverse
+
+from bridgeql.django.admission import (concurrency_limiter, rate_limiter,
+                                       take_token)
+from bridgeql.django.exceptions import ServiceUnavailable
+
+
+class TestTokenBucket(SimpleTestCase):
+
+    def test_take_token(self):
+        state, wait = take_token(None, 100, 2, 2)
+        self.assertEqual(((1, 100), 0), (state, wait))
+        state, wait = take_token(state, 100, 2, 2)
+        self.assertEqual(((0, 100), 0), (state, wait))
+        state, wait = take_token(state, 100.25, 2, 2)
+        self.assertEqual(((0.5, 100.25), 0.25), (state, wait))
+        # refilled up to the burst only
+        state, wait = take_token(state, 200, 2, 2)
+        self.assertEqual(((1, 200), 0), (state, wait))
+
+
+@override_settings(BRIDGEQL_ADMISSION_TIMEOUT=0.1)
+class TestConcurrencyLimiter(SimpleTestCase):
+
+    def acquire(self):
+        return concurrency_limiter.acquire(['default'], 'machine', 'machine')
+
+    @override_settings(BRIDGEQL_DB_CONCURRENCY={'*': 1})
+    def test_reject_without_queue(self):
+        limits = self.acquire()
+        try:
+            with self.assertRaises(ServiceUnavailable):
+                self.acquire()
+        finally:
+            concurrency_limiter.release(limits)
+        concurrency_limiter.release(self.acquire())
+        self.assertEqual(0, concurrency_limiter.in_flight('db', 'default'))
+
+    @override_settings(BRIDGEQL_MODEL_CONCURRENCY={'machine.Machine': 1},
+                       BRIDGEQL_ADMISSION_QUEUE_SIZE=1)
+    def test_queue(self):
+        limits = self.acquire()
+        self.assertEqual(1, concurrency_limiter.in_flight(
+            'model', 'machine.Machine'))
+        # times out in the queue
+        with self.assertRaises(ServiceUnavailable):
+            self.acquire()
+        # admitted once the slot is released
+        release = threading.Timer(0.02, concurrency_limiter.release, [limits])
+        release.start()
+        concurrency_limiter.release(self.acquire())
+        release.join()
+        self.assertEqual(0, concurrency_limiter.in_flight(
+            'model', 'machine.Machine'))
+
+
+class TestAdmission(TestCase):
+    fixtures = [os.path.join(settings.BASE_DIR, 'machine_tests.json'), ]
+
+    def setUp(self):
+        self.client = Client()
+        rate_limiter.clear()
+        cache.clear()
+
+    def read(self, **extra):
+        url = reverse('bridgeql_django_read', kwargs={
+            'db_name': 'default',
+            'app_label': 'machine',
+            'model_name': 'Machine'
+        })
+        return self.client.get(url, {'payload': json.dumps({
+            'fields': ['ip'], 'limit': 1})}, **extra)
+
+    def assertRateLimited(self):
+        self.assertEqual(200, self.read().status_code)
+        self.assertEqual(200, self.read().status_code)
+        resp = self.read()
+        self.assertEqual(429, resp.status_code)
+        # a token every two seconds
+        self.assertEqual('2', resp['Retry-After'])
+        self.assertFalse(resp.json()['success'])
+        # other clients have their own bucket
+        self.assertEqual(200, self.read(REMOTE_ADDR='10.1.1.1').status_code)
+
+    @override_settings(BRIDGEQL_RATE_LIMIT={'rate': 0.5, 'burst': 2})
+    def test_rate_limit(self):
+        self.assertRateLimited()
+
+    @override_settings(BRIDGEQL_RATE_LIMIT={'rate': 0.5, 'burst': 2},
+                       BRIDGEQL_RATE_LIMIT_CACHE='default')
+    def test_rate_limit_cache(self):
+        self.assertRateLimited()
+
+    @override_settings(BRIDGEQL_DB_CONCURRENCY={'default': 1})
+    def test_concurrency_limit(self):
+        limits = concurrency_limiter.acquire(['default'], 'machine', 'Machine')
+        try:
+            resp = self.read()
+            self.assertEqual(503, resp.status_code)
+            self.assertEqual('1', resp['Retry-After'])
+        finally:
+            concurrency_limiter.release(limits)
+        self.assertEqual(200, self.read().status_code)
+        self.assertEqual(0, concurrency_limiter.in_flight('db', 'default'))
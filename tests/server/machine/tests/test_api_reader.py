@@ -4,14 +4,23 @@
 
 import json
 import os
+import unittest
 
+from django.db import connection
 from django.urls import reverse as url_reverse
 from django.test import TestCase, override_settings
 from django.test.client import Client
 from django.conf import settings
 
+from bridgeql.django import helpers
+from bridgeql.django.estimate import CountEstimator
 from machine.models import OperatingSystem, Machine
 
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
 
 class TestAPIReader(TestCase):
     fixtures = [os.path.join(settings.BASE_DIR, 'machine_tests.json'), ]
@@ -160,6 +169,30 @@ class TestAPIReader(TestCase):
         res_json = resp.json()
         self.assertEqual(10, res_json['data'])
 
+    def test_count_estimate_query(self):
+        self.params = {
+            'filter': {
+                'os__name': 'os-name-5'
+            },
+            'count': 'estimate'
+        }
+        resp = self.client.get(
+            self.getURL(), {'payload': json.dumps(self.params)})
+        self.assertEqual(resp.status_code, 200)
+        res_json = resp.json()
+        # sqlite has no planner statistics, exact count is returned
+        self.assertEqual(10, res_json['data'])
+        self.assertFalse(res_json['approximate'])
+
+    def test_count_invalid_mode_query(self):
+        self.params = {
+            'count': 'approx'
+        }
+        resp = self.client.get(
+            self.getURL(), {'payload': json.dumps(self.params)})
+        self.assertEqual(resp.status_code, 400)
+        self.assertFalse(resp.json()['success'])
+
     def test_count_false_query(self):
         self.params = {
             'filter': {
@@ -209,6 +242,54 @@ class TestAPIReader(TestCase):
         ]
         self.assertListEqual(result, res_json['data'])
 
+    @override_settings(BRIDGEQL_DEFAULT_LIMIT=5, BRIDGEQL_MAX_LIMIT=10)
+    def test_default_limit_query(self):
+        self.params = {
+            'fields': ['ip'],
+        }
+        resp = self.client.get(
+            self.getURL(), {'payload': json.dumps(self.params)})
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(5, len(resp.json()['data']))
+        # counts are not capped by the default limit
+        self.params['count'] = True
+        resp = self.client.get(
+            self.getURL(), {'payload': json.dumps(self.params)})
+        self.assertEqual(100, resp.json()['data'])
+
+    @override_settings(BRIDGEQL_MAX_LIMIT=10)
+    def test_max_limit_query(self):
+        self.params = {
+            'fields': ['ip'],
+            'limit': 11
+        }
+        resp = self.client.get(
+            self.getURL(), {'payload': json.dumps(self.params)})
+        self.assertEqual(resp.status_code, 400)
+        self.assertFalse(resp.json()['success'])
+        # without limit the query is capped to the maximum limit
+        del self.params['limit']
+        resp = self.client.get(
+            self.getURL(), {'payload': json.dumps(self.params)})
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(10, len(resp.json()['data']))
+
+    @override_settings(BRIDGEQL_STATEMENT_TIMEOUT={'machine.Machine': 1e-6})
+    def test_statement_timeout_query(self):
+        self.params = {
+            'filter': {
+                'os__name__icontains': 'name',
+            },
+            'fields': ['ip', 'os__name'],
+        }
+        resp = self.client.get(
+            self.getURL(), {'payload': json.dumps(self.params)})
+        self.assertEqual(resp.status_code, 504)
+        self.assertFalse(resp.json()['success'])
+        # timeout is configured per model
+        resp = self.client.get(self.getURL(pk=1, model_name='OperatingSystem'))
+        self.assertEqual(resp.status_code, 200)
+
     # add properties
     def test_get_fields(self):
         self.params = {
@@ -420,3 +501,111 @@ class TestAPIReader(TestCase):
             self.getURL(), {'payload': json.dumps(self.params)})
         self.assertEqual(resp.status_code, 200)
         self.assertEqual(4, len(resp.json()['data']))
+
+
+class TestCountEstimator(TestCase):
+    fixtures = [os.path.join(settings.BASE_DIR, 'machine_tests.json'), ]
+
+    def test_sample_sql(self):
+        qset = Machine.objects.filter(os__name='os-name-5').filter(
+            memory__in=Machine.objects.filter(pk__lte=3).values('memory'))
+        sql, params = CountEstimator(qset, True).sample_sql(1.0)
+        # only the base table is sampled, not its joins nor subqueries
+        table = connection.ops.quote_name(Machine._meta.db_table)
+        self.assertEqual(1, sql.count('TABLESAMPLE'))
+        self.assertIn('%s TABLESAMPLE SYSTEM (%%s)' % table, sql)
+        self.assertEqual([1.0, 'os-name-5', 3], list(params))
+
+    @unittest.skipUnless(connection.vendor == 'postgresql',
+                         'planner statistics of PostgreSQL')
+    @override_settings(BRIDGEQL_COUNT_ESTIMATE_THRESHOLD=1,
+                       BRIDGEQL_COUNT_SAMPLE_PERCENT=100)
+    def test_planner_estimates(self):
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE %s' % connection.ops.quote_name(
+                Machine._meta.db_table))
+        # reltuples of the table
+        estimator = CountEstimator(Machine.objects.all(), False)
+        self.assertEqual(100, estimator.count())
+        self.assertTrue(estimator.approximate)
+        # rows of the plan, sampled from every page of the table
+        qset = Machine.objects.filter(os__name='os-name-5')
+        estimator = CountEstimator(qset, True)
+        self.assertTrue(estimator._planner_estimate())
+        self.assertEqual(10, estimator.count())
+        self.assertTrue(estimator.approximate)
+
+    @unittest.skipUnless(connection.vendor == 'postgresql',
+                         'planner statistics of PostgreSQL')
+    def test_below_threshold(self):
+        estimator = CountEstimator(Machine.objects.filter(pk__lte=5), True)
+        self.assertEqual(5, estimator.count())
+        self.assertFalse(estimator.approximate)
+
+    @override_settings(BRIDGEQL_COUNT_ESTIMATE_THRESHOLD=1000)
+    def test_empty_sample(self):
+        estimator = CountEstimator(Machine.objects.filter(pk__lte=5), True)
+        estimator.connection = mock.MagicMock(vendor='postgresql')
+        cursor = estimator.connection.cursor.return_value.__enter__()
+        cursor.fetchone.return_value = (0,)
+        # the sample read none of the pages holding the rows
+        with mock.patch.object(CountEstimator, '_planner_estimate',
+                               return_value=5000):
+            self.assertEqual(5000, estimator.count())
+        self.assertTrue(estimator.approximate)
+
+
+class TestPostReader(TestCase):
+    fixtures = [os.path.join(settings.BASE_DIR, 'machine_tests.json'), ]
+
+    def setUp(self):
+        self.client = Client()
+        self.url = url_reverse('bridgeql_django_read', kwargs={
+            'db_name': 'default',
+            'app_label': 'machine',
+            'model_name': 'Machine'
+        })
+        # too large for the query string of most proxies
+        self.params = {
+            'filter': {'pk__in': list(range(1, 5001))},
+            'fields': ['ip'],
+            'order_by': ['pk'],
+        }
+
+    def test_post_json(self):
+        resp = self.client.post(self.url, json.dumps({'payload': self.params}),
+                                content_type='application/json')
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(100, len(resp.json()['data']))
+        self.assertEqual('10.0.0.1', resp.json()['data'][0]['ip'])
+
+    @unittest.skipIf(helpers.msgpack is None, 'msgpack is not installed')
+    def test_post_msgpack(self):
+        body = helpers.msgpack.packb({'payload': self.params})
+        resp = self.client.post(self.url, body,
+                                content_type='application/msgpack')
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(100, len(resp.json()['data']))
+
+    @unittest.skipIf(helpers.cbor2 is None, 'cbor2 is not installed')
+    def test_post_cbor(self):
+        body = helpers.cbor2.dumps({'payload': self.params})
+        resp = self.client.post(self.url, body, content_type='application/cbor')
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(100, len(resp.json()['data']))
+
+    def test_post_invalid_body(self):
+        for body, content_type in (('{', 'application/json'),
+                                   ('[]', 'application/json'),
+                                   ('{"filter": {}}', 'application/json'),
+                                   ('\xc1', 'application/msgpack')):
+            resp = self.client.post(self.url, body, content_type=content_type)
+            self.assertEqual(resp.status_code, 400)
+            self.assertFalse(resp.json()['success'])
+
+    def test_post_missing_decoder(self):
+        with mock.patch.object(helpers, 'msgpack', None):
+            resp = self.client.post(self.url, b'\x80',
+                                    content_type='application/msgpack')
+        self.assertEqual(resp.status_code, 415)
+        self.assertEqual('msgpack is not installed', resp.json()['message'])
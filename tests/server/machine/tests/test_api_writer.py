@@ -4,6 +4,7 @@
 
 import json
 import os
+import unittest
 from datetime import datetime
 
 from django.urls import reverse
@@ -11,6 +12,8 @@ from django.test import TestCase
 from django.test.client import Client
 from django.conf import settings
 
+from bridgeql.django import helpers
+
 
 class TestAPIWriter(TestCase):
     fixtures = [os.path.join(settings.BASE_DIR, 'machine_tests.json'), ]
@@ -40,6 +43,28 @@ class TestAPIWriter(TestCase):
         )
         self.assertEqual(resp.status_code, 201)
 
+    @unittest.skipIf(helpers.msgpack is None, 'msgpack is not installed')
+    def test_create_machine_msgpack(self):
+        url = reverse('bridgeql_django_create', kwargs={
+            'db_name': 'default',
+            'app_label': 'machine',
+            'model_name': 'Machine',
+        })
+        params = {
+            'ip': '10.0.0.212',
+            'created_at': datetime.now().isoformat(),
+            'cpu_count': 4,
+            'memory': 4,
+            'powered_on': False,
+            'name': 'dummy_machine',
+            'os_id': 1
+        }
+        resp = self.client.post(
+            url, helpers.msgpack.packb({'payload': params}),
+            content_type='application/msgpack'
+        )
+        self.assertEqual(resp.status_code, 201)
+
     # Validation error since NOT NULL fields are not passed
     def test_create_machine_missing_fields(self):
         url = reverse('bridgeql_django_create', kwargs={
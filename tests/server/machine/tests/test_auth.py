@@ -0,0 +1,241 @@
+# -*- coding: utf-8 -*-
+# Copyright © 2023 VMware, Inc.  All rights reserved.
+# SPDX-License-Identifier: BSD-2-Clause
+
+import base64
+import hashlib
+import hmac
+import json
+import os
+import time
+
+from django.conf import settings
+from django.contrib.auth import authenticate
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.http import HttpResponse
+from django.test import (RequestFactory, SimpleTestCase, TestCase,
+                         override_settings)
+
+from bridgeql.django.auth import (InvalidToken, basic_auth, credential_cache,
+                                  make_token, read_token_auth, verify_token,
+                                  write_token_auth)
+from bridgeql.django.bridge import read_django_model
+from bridgeql.utils import b64encode
+
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+try:
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
+
+
+@basic_auth
+def view(request):
+    return HttpResponse(request.user.username)
+
+
+class TestBasicAuth(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('reader', password='secret')
+        self.factory = RequestFactory()
+        credential_cache.clear()
+        patcher = mock.patch('bridgeql.django.auth.authenticate',
+                             wraps=authenticate)
+        self.authenticate = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def request(self, credentials='reader:secret', scheme='Basic'):
+        header = '%s %s' % (scheme, b64encode(credentials).decode('utf-8'))
+        return view(self.factory.get('/', HTTP_AUTHORIZATION=header))
+
+    def test_authenticate(self):
+        resp = self.request()
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.content, b'reader')
+
+    def test_invalid_header(self):
+        self.assertEqual(view(self.factory.get('/')).status_code, 401)
+        self.assertEqual(self.request(scheme='Bearer').status_code, 401)
+        self.assertEqual(self.request('no-colon').status_code, 401)
+        resp = view(self.factory.get('/', HTTP_AUTHORIZATION='Basic %%%'))
+        self.assertEqual(resp.status_code, 401)
+        self.assertEqual(resp['WWW-Authenticate'],
+                         'Basic base64(user:password)')
+        self.assertEqual(self.authenticate.call_count, 0)
+
+    def test_cached_credentials(self):
+        for _ in range(3):
+            self.assertEqual(self.request().status_code, 200)
+        self.assertEqual(self.authenticate.call_count, 1)
+        self.assertEqual(len(credential_cache), 1)
+
+    def test_wrong_password_not_cached(self):
+        for _ in range(2):
+            self.assertEqual(self.request('reader:wrong').status_code, 401)
+        self.assertEqual(self.authenticate.call_count, 2)
+        self.assertEqual(len(credential_cache), 0)
+
+    def test_password_change(self):
+        self.assertEqual(self.request().status_code, 200)
+        self.user.set_password('changed')
+        self.user.save()
+        self.assertEqual(self.request().status_code, 401)
+        self.assertEqual(self.request('reader:changed').status_code, 200)
+        self.assertEqual(self.authenticate.call_count, 3)
+
+    def test_deactivation(self):
+        self.assertEqual(self.request().status_code, 200)
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.request().status_code, 401)
+
+    def test_deletion(self):
+        self.assertEqual(self.request().status_code, 200)
+        self.user.delete()
+        self.assertEqual(self.request().status_code, 401)
+
+    @override_settings(BRIDGEQL_AUTH_CACHE_TTL=10)
+    def test_expiry(self):
+        self.assertEqual(self.request().status_code, 200)
+        with mock.patch('bridgeql.django.auth.time.time',
+                        return_value=time.time() + 11):
+            self.assertEqual(self.request().status_code, 200)
+        self.assertEqual(self.authenticate.call_count, 2)
+
+    @override_settings(BRIDGEQL_AUTH_CACHE_SIZE=1)
+    def test_size(self):
+        User.objects.create_user('writer', password='secret')
+        self.assertEqual(self.request().status_code, 200)
+        self.assertEqual(self.request('writer:secret').status_code, 200)
+        self.assertEqual(len(credential_cache), 1)
+        self.assertEqual(self.request().status_code, 200)
+        self.assertEqual(self.authenticate.call_count, 3)
+
+    @override_settings(BRIDGEQL_AUTH_CACHE_TTL=0)
+    def test_disabled(self):
+        for _ in range(2):
+            self.assertEqual(self.request().status_code, 200)
+        self.assertEqual(self.authenticate.call_count, 2)
+
+
+@read_token_auth
+def token_reader(request, app_label=None, model_name=None):
+    return HttpResponse(request.bridgeql_token['sub'])
+
+
+@write_token_auth
+def token_writer(request, app_label=None, model_name=None):
+    return HttpResponse(request.bridgeql_token['sub'])
+
+
+class TestTokenAuth(SimpleTestCase):
+
+    def setUp(self):
+        self.factory = RequestFactory()
+
+    def request(self, view, token, **kwargs):
+        request = self.factory.get(
+            '/', HTTP_AUTHORIZATION='Bearer %s' % token)
+        return view(request, **kwargs)
+
+    def test_verify(self):
+        token = make_token('svc', ['read:machine.*'])
+        claims = verify_token(token)
+        self.assertEqual('svc', claims['sub'])
+        self.assertListEqual(['read:machine.*'], claims['scopes'])
+
+    def test_invalid_tokens(self):
+        token = make_token('svc', ['read:*'])
+        payload, signature = token.split('.')
+        for invalid in ('', 'abc', '%s.' % payload, 'a.b.c',
+                        '%s.%s' % (payload[:-2], signature),
+                        make_token('svc', ['read:*'], expires_in=-1)):
+            with self.assertRaises(InvalidToken):
+                verify_token(invalid)
+        with override_settings(BRIDGEQL_TOKEN_SECRET='other'):
+            with self.assertRaises(InvalidToken):
+                verify_token(token)
+        # the secret is salted, a plain hmac of SECRET_KEY is no signature
+        forged = hmac.new(settings.SECRET_KEY.encode('utf-8'),
+                          payload.encode('ascii'), hashlib.sha256).digest()
+        with self.assertRaises(InvalidToken):
+            verify_token('%s.%s' % (payload, base64.urlsafe_b64encode(
+                forged).rstrip(b'=').decode('ascii')))
+
+    def test_secret_rotation(self):
+        with override_settings(BRIDGEQL_TOKEN_SECRET='old'):
+            token = make_token('svc', ['read:*'])
+        with override_settings(BRIDGEQL_TOKEN_SECRET=['new', 'old']):
+            self.assertEqual('svc', verify_token(token)['sub'])
+
+    def test_scopes(self):
+        kwargs = {'app_label': 'machine', 'model_name': 'Machine'}
+        token = make_token('svc', ['read:machine.Machine'])
+        self.assertEqual(200, self.request(token_reader, token,
+                                           **kwargs).status_code)
+        self.assertEqual(200, self.request(token_reader, token,
+                                           app_label='machine',
+                                           model_name='machine').status_code)
+        resp = self.request(token_reader, token, app_label='machine',
+                            model_name='OperatingSystem')
+        self.assertEqual(403, resp.status_code)
+        self.assertEqual('Bearer error="insufficient_scope"',
+                         resp['WWW-Authenticate'])
+        self.assertEqual(403, self.request(token_writer, token,
+                                           **kwargs).status_code)
+        # endpoints without model only need the access
+        self.assertEqual(200, self.request(token_reader, token).status_code)
+
+        token = make_token('svc', ['write:machine.*'])
+        self.assertEqual(200, self.request(token_writer, token,
+                                           **kwargs).status_code)
+        self.assertEqual(403, self.request(token_reader, token,
+                                           **kwargs).status_code)
+        token = make_token('svc', ['read:*'])
+        self.assertEqual(200, self.request(token_reader, token,
+                                           app_label='auth',
+                                           model_name='Group').status_code)
+
+    def test_unauthorized(self):
+        resp = token_reader(self.factory.get('/'))
+        self.assertEqual(401, resp.status_code)
+        self.assertEqual('Bearer', resp['WWW-Authenticate'])
+        resp = self.request(token_reader, 'invalid')
+        self.assertEqual(401, resp.status_code)
+        self.assertEqual('Bearer error="invalid_token"',
+                         resp['WWW-Authenticate'])
+
+    def test_create_token_command(self):
+        out = StringIO()
+        call_command('create_bridgeql_token', 'svc', scopes=['read:machine.*'],
+                     expires=60, stdout=out)
+        claims = verify_token(out.getvalue().strip())
+        self.assertEqual('svc', claims['sub'])
+        self.assertLessEqual(claims['exp'], time.time() + 60)
+
+
+class TestTokenRestrictedModels(TestCase):
+    fixtures = [os.path.join(settings.BASE_DIR, 'machine_tests.json'), ]
+
+    def read(self, token, app_label, model_name, params):
+        request = RequestFactory().get(
+            '/', {'payload': json.dumps(params)},
+            HTTP_AUTHORIZATION='Bearer %s' % token)
+        return read_token_auth(read_django_model)(
+            request, db_name='default', app_label=app_label,
+            model_name=model_name)
+
+    def test_restricted_models(self):
+        # scopes never lift BRIDGEQL_RESTRICTED_MODELS
+        token = make_token('svc', ['read:*'])
+        resp = self.read(token, 'auth', 'User', {'fields': ['username']})
+        self.assertEqual(403, resp.status_code)
+        resp = self.read(token, 'machine', 'OperatingSystem', {'fields': ['license_key']})
+        self.assertEqual(403, resp.status_code)
+        resp = self.read(token, 'machine', 'OperatingSystem', {'fields': ['name']})
+        self.assertEqual(200, resp.status_code)
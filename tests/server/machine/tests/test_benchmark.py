@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+# Copyright © 2023 VMware, Inc.  All rights reserved.
+# SPDX-License-Identifier: BSD-2-Clause
+
+import json
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase
+
+from machine.benchmark.runner import compare, percentile
+from machine.models import Machine, OperatingSystem
+
+
+class TestBenchmarkRunner(SimpleTestCase):
+
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(50, percentile(values, 50))
+        self.assertEqual(95, percentile(values, 95))
+        self.assertEqual(100, percentile(values, 100))
+        self.assertIsNone(percentile([], 50))
+
+    def test_compare(self):
+        baseline = {'scenarios': {'count': {'p50': 1.0, 'p95': 2.0, 'p99': 3.0}}}
+        results = {'scenarios': {'count': {'p50': 1.1, 'p95': 3.0, 'p99': 3.0}}}
+        self.assertListEqual([('count', 'p95', 1.5)],
+                             compare(results, baseline, 1.2))
+
+
+class TestBenchmarkCommand(TestCase):
+
+    def test_run_benchmark(self):
+        call_command('create_test_data', scale=1, stdout=StringIO())
+        self.assertEqual(100, Machine.objects.count())
+        self.assertEqual(10, OperatingSystem.objects.count())
+        out = StringIO()
+        call_command('run_benchmark', iterations=2, warmup=1, stdout=out)
+        results = json.loads(out.getvalue())
+        self.assertEqual(100, results['machines'])
+        self.assertEqual(2, results['scenarios']['filter_exclude']['iterations'])
+        # writes leave the data set as they found it
+        self.assertEqual(100, Machine.objects.count())
@@ -0,0 +1,240 @@
+# -*- coding: utf-8 -*-
+# Copyright © 2023 VMware, Inc.  All rights reserved.
+# SPDX-License-Identifier: BSD-2-Clause
+
+import json
+import os
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.test.client import Client
+from django.urls import reverse
+from django.utils import timezone
+
+from bridgeql.django.changelog import is_tracked
+from bridgeql.django.exceptions import (
+    InvalidAppOrModelName,
+    InvalidBridgeQLSettings
+)
+from bridgeql.django.settings import bridgeql_settings
+from bridgeql.models import ChangeLog
+from machine.models import Machine, OperatingSystem
+
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+try:
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
+
+MACHINE_KWARGS = {
+    'db_name': 'default',
+    'app_label': 'machine',
+    'model_name': 'Machine',
+}
+
+
+# the tests read their own writes right away
+@override_settings(BRIDGEQL_CHANGE_FEED_MODELS=['machine.Machine'],
+                   BRIDGEQL_CHANGE_FEED_DELAY=0)
+class TestChangeFeed(TestCase):
+    fixtures = [os.path.join(settings.BASE_DIR, 'machine_tests.json'), ]
+
+    def setUp(self):
+        self.client = Client()
+
+    def create(self, ip):
+        params = {
+            'ip': ip,
+            'created_at': datetime.now().isoformat(),
+            'cpu_count': 4,
+            'memory': 4,
+            'powered_on': False,
+            'name': 'feed_machine',
+            'os_id': 1
+        }
+        resp = self.client.post(
+            reverse('bridgeql_django_create', kwargs=MACHINE_KWARGS),
+            json.dumps({'payload': params}), content_type='application/json')
+        self.assertEqual(resp.status_code, 201)
+        return resp.json()['data']
+
+    def update(self, pk, params):
+        kwargs = dict(MACHINE_KWARGS, pk=pk)
+        resp = self.client.patch(
+            reverse('bridgeql_django_update', kwargs=kwargs),
+            json.dumps({'payload': params}), content_type='application/json')
+        self.assertEqual(resp.status_code, 200)
+
+    def delete(self, pk):
+        kwargs = dict(MACHINE_KWARGS, pk=pk)
+        resp = self.client.delete(
+            reverse('bridgeql_django_delete', kwargs=kwargs))
+        self.assertEqual(resp.status_code, 200)
+
+    def changes(self, status=200, **params):
+        resp = self.client.get(
+            reverse('bridgeql_django_changes', kwargs=MACHINE_KWARGS), params)
+        self.assertEqual(resp.status_code, status)
+        return resp.json()['data'] if status == 200 else resp.json()
+
+    def test_changes_since_token(self):
+        token = self.changes(since='latest')['next']
+        created = self.create('10.0.1.1')
+        self.update(2, {'memory': 16})
+        self.delete(3)
+        data = self.changes(since=token)
+        self.assertEqual(data['created'], [created])
+        self.assertEqual(data['updated'], [2])
+        self.assertEqual(data['deleted'], [3])
+        self.assertFalse(data['more'])
+        self.assertEqual(data['since'], token)
+        # nothing changed since the new token
+        data = self.changes(since=data['next'])
+        self.assertEqual(
+            (data['created'], data['updated'], data['deleted']),
+            ([], [], []))
+
+    def test_changes_delay(self):
+        token = self.changes(since='latest')['next']
+        self.update(2, {'memory': 16})
+        with override_settings(BRIDGEQL_CHANGE_FEED_DELAY=5):
+            # the write could still be committing along with lower ids
+            data = self.changes(since=token)
+            self.assertEqual(data['updated'], [])
+            self.assertEqual(data['next'], token)
+            later = timezone.now() + timedelta(seconds=5)
+            with mock.patch('bridgeql.django.changes.timezone.now',
+                            return_value=later):
+                self.assertEqual(self.changes(since=token)['updated'], [2])
+
+    def test_changes_collapse_per_pk(self):
+        token = self.changes(since='latest')['next']
+        created = self.create('10.0.1.2')
+        self.update(created, {'memory': 8})
+        self.update(4, {'memory': 8})
+        self.update(4, {'memory': 16})
+        self.update(5, {'memory': 8})
+        self.delete(5)
+        data = self.changes(since=token)
+        self.assertEqual(data['created'], [created])
+        self.assertEqual(data['updated'], [4])
+        self.assertEqual(data['deleted'], [5])
+
+    def test_changes_batches(self):
+        token = self.changes(since='latest')['next']
+        for pk in range(1, 6):
+            self.update(pk, {'memory': 32})
+        updated = []
+        for expected_more in (True, True, False):
+            data = self.changes(since=token, limit=2)
+            self.assertEqual(data['more'], expected_more)
+            updated.extend(data['updated'])
+            token = data['next']
+        self.assertEqual(updated, [1, 2, 3, 4, 5])
+
+    def test_changes_rows(self):
+        token = self.changes(since='latest')['next']
+        self.update(2, {'memory': 64})
+        self.delete(3)
+        data = self.changes(since=token, fields=['ip', 'memory'])
+        self.assertEqual(data['rows'],
+                         [{'pk': 2, 'ip': '10.0.0.2', 'memory': 64}])
+
+    def test_changes_of_restricted_fields(self):
+        with override_settings(
+                BRIDGEQL_CHANGE_FEED_MODELS=['machine.OperatingSystem']):
+            resp = self.client.get(
+                reverse('bridgeql_django_changes', kwargs={
+                    'db_name': 'default',
+                    'app_label': 'machine',
+                    'model_name': 'OperatingSystem',
+                }), {'fields': ['name', 'license_key']})
+        self.assertEqual(resp.status_code, 403)
+
+    def test_changes_of_untracked_model(self):
+        resp = self.client.get(reverse('bridgeql_django_changes', kwargs={
+            'db_name': 'default',
+            'app_label': 'machine',
+            'model_name': 'OperatingSystem',
+        }))
+        self.assertEqual(resp.status_code, 404)
+
+    def test_changes_invalid_params(self):
+        self.changes(status=400, since='abc')
+        self.changes(status=400, since='-1')
+        self.changes(status=400, limit='0')
+        with override_settings(BRIDGEQL_MAX_LIMIT=10):
+            self.changes(status=400, limit='11')
+
+    def test_changes_without_signals(self):
+        # writes outside bridgeql are only logged by the signals
+        Machine.objects.filter(pk=1).update(memory=2)
+        Machine.objects.get(pk=2).save()
+        self.assertFalse(ChangeLog.objects.exists())
+
+    @override_settings(BRIDGEQL_CHANGE_FEED_SIGNALS=True)
+    def test_changes_with_signals(self):
+        token = self.changes(since='latest')['next']
+        machine = Machine.objects.get(pk=2)
+        machine.memory = 128
+        machine.save()
+        # the deletion of the os cascades to its machines
+        OperatingSystem.objects.get(pk=1).delete()
+        # bridgeql writes are logged once
+        self.update(4, {'memory': 8})
+        data = self.changes(since=token)
+        self.assertEqual(data['updated'], [2, 4])
+        self.assertEqual(sorted(data['deleted']),
+                         [1, 11, 21, 31, 41, 51, 61, 71, 81, 91])
+        self.assertEqual(ChangeLog.objects.filter(object_pk='4').count(), 1)
+
+    def test_prune(self):
+        for pk in (2, 3, 4):
+            self.update(pk, {'memory': 16})
+        first, second, third = ChangeLog.objects.order_by(
+            'id').values_list('id', flat=True)
+        later = timezone.now() + timedelta(days=8)
+        with mock.patch('bridgeql.django.changes.timezone.now',
+                        return_value=later):
+            out = StringIO()
+            call_command('prune_changelog', stdout=out)
+            self.assertEqual('Deleted 2 change log entries.\n',
+                             out.getvalue())
+            # the newest pruned entry is kept
+            self.assertListEqual(
+                [third], list(ChangeLog.objects.values_list('id', flat=True)))
+            self.changes(status=410, since=first - 1)
+            self.changes(status=410, since=0)
+            self.assertEqual(self.changes(since=second)['updated'], [4])
+            call_command('prune_changelog', stdout=out)
+            self.assertEqual(ChangeLog.objects.count(), 1)
+        # entries within the retention are kept
+        call_command('prune_changelog', stdout=StringIO())
+        self.assertEqual(ChangeLog.objects.count(), 1)
+
+    def test_settings(self):
+        with override_settings(BRIDGEQL_CHANGE_FEED_MODELS=['machine.Rack']):
+            self.assertRaises(InvalidAppOrModelName,
+                              bridgeql_settings.validate)
+        with override_settings(BRIDGEQL_CHANGE_FEED_MODELS='machine.Machine'):
+            self.assertRaises(Exception, bridgeql_settings.validate)
+        with override_settings(BRIDGEQL_CHANGE_FEED_RETENTION=0):
+            self.assertRaises(InvalidBridgeQLSettings,
+                              bridgeql_settings.validate)
+
+    def test_tracked_models(self):
+        self.assertTrue(is_tracked(Machine))
+        self.assertFalse(is_tracked(OperatingSystem))
+        self.assertIs(bridgeql_settings.cached('tracked_models', None),
+                      bridgeql_settings.cached('tracked_models', None))
+        with override_settings(
+                BRIDGEQL_CHANGE_FEED_MODELS=['machine.OperatingSystem']):
+            self.assertTrue(is_tracked(OperatingSystem))
+        self.assertEqual('updated machine.machine pk=2', str(ChangeLog(
+            app_label='machine', model_name='machine', object_pk='2',
+            action=ChangeLog.UPDATED)))
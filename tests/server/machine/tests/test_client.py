@@ -0,0 +1,283 @@
+# -*- coding: utf-8 -*-
+# Copyright © 2023 VMware, Inc.  All rights reserved.
+# SPDX-License-Identifier: BSD-2-Clause
+
+import os
+import shutil
+import socket
+import sys
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.test import LiveServerTestCase, SimpleTestCase, override_settings
+
+from bridgeql.client import (
+    Client,
+    DiskCache,
+    MemoryCache,
+    RequestFailed
+)
+from bridgeql.client.cache import CachedResponse, cache_key
+from bridgeql.client.transport import ConnectionPool
+from bridgeql.client import client as client_module
+from bridgeql.django.events import event_bus
+
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
+if sys.version_info >= (3, 7):
+    # coroutines are a syntax error on python 2
+    from machine.tests.async_client import TestAsyncClient  # noqa: F401
+
+
+class TestQuery(SimpleTestCase):
+
+    def test_payload(self):
+        query = Client('http://localhost/bridgeql').model(
+            'default', 'machine', 'Machine')
+        filtered = query.filter(os__name='os-name-1').filter(
+            {'ip': '10.0.0.1'}, {'ip': '10.0.0.2'}, cpu_count__gte=2)
+        self.assertEqual(query.payload, {})
+        self.assertEqual(
+            filtered.exclude(name='m').fields('ip', 'name').order_by('-ip')
+            .distinct().limit(5).offset(10).payload, {
+                'filter': {
+                    'os__name': 'os-name-1',
+                    'cpu_count__gte': 2,
+                    '__or': [{'ip': '10.0.0.1'}, {'ip': '10.0.0.2'}],
+                },
+                'exclude': {'name': 'm'},
+                'fields': ['ip', 'name'],
+                'order_by': ['-ip'],
+                'distinct': True,
+                'limit': 5,
+                'offset': 10,
+            })
+
+    def test_events(self):
+        lines = [b'event: subscribed', b'data: {"subscription": "x"}', b'',
+                 b': keepalive', b'', b'id: 1', b'event: updated',
+                 b'data: {"pk": 1}', b'']
+        self.assertEqual(list(client_module.parse_events(lines)),
+                         [('subscribed', {'subscription': 'x'}),
+                          ('updated', {'pk': 1})])
+
+    def test_cache_key(self):
+        self.assertEqual(
+            cache_key('/read/', {'payload': '{"a": 1, "b": 2}'}),
+            cache_key('/read/', {'payload': '{"b": 2, "a": 1}'}))
+        self.assertNotEqual(
+            cache_key('/read/', headers={'Authorization': 'Bearer a'}),
+            cache_key('/read/', headers={'Authorization': 'Bearer b'}))
+
+    def test_memory_eviction(self):
+        cache = MemoryCache(max_bytes=10)
+        cache.set('a', CachedResponse('"a"', b'aaaa', 'application/json'))
+        cache.set('b', CachedResponse('"b"', b'bbbb', 'application/json'))
+        cache.get('a')
+        cache.set('c', CachedResponse('"c"', b'cccc', 'application/json'))
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('a').content, b'aaaa')
+        self.assertEqual(cache.size, 8)
+
+    def test_disk_eviction(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        cache = DiskCache(directory, max_bytes=100)
+        cache.set('a', CachedResponse('"a"', b'a' * 40, 'application/json'))
+        os.utime(os.path.join(directory, 'a'), (0, 0))
+        cache.set('b', CachedResponse('"b"', b'b' * 40, 'application/json'))
+        self.assertEqual(len(cache), 1)
+        self.assertIsNone(cache.get('a'))
+        cached = DiskCache(directory).get('b')
+        self.assertEqual((cached.etag, cached.content), ('"b"', b'b' * 40))
+
+    def test_pool_resends_idempotent_methods(self):
+        pool = ConnectionPool('http://localhost/bridgeql')
+        for method, connects in (('GET', 1), ('HEAD', 1), ('POST', 0),
+                                 ('PATCH', 0), ('DELETE', 0)):
+            # an idle connection the server closed meanwhile
+            stale = mock.Mock()
+            stale.getresponse.side_effect = socket.error('reset')
+            pool._idle.append(stale)
+            with mock.patch.object(pool, '_connect') as connect:
+                connect.return_value.getresponse.side_effect = \
+                    socket.error('refused')
+                with self.assertRaises(client_module.ConnectionFailed):
+                    pool.request(method, '/read/')
+            self.assertEqual(connects, connect.call_count, method)
+
+
+class TestClient(LiveServerTestCase):
+    fixtures = [os.path.join(settings.BASE_DIR, 'machine_tests.json'), ]
+
+    def setUp(self):
+        self.client = Client(self.live_server_url + '/bridgeql/',
+                             backoff=0.01)
+        self.machines = self.client.model('default', 'machine', 'Machine')
+
+    def tearDown(self):
+        self.client.close()
+
+    def test_read(self):
+        rows = self.machines.filter(os__name='os-name-1').fields(
+            'ip', 'stats').order_by('ip').limit(2).all()
+        self.assertEqual(rows, [
+            {'ip': '10.0.0.1', 'stats': 'CPU: 2, Mem 1GB'},
+            {'ip': '10.0.0.11', 'stats': 'CPU: 6, Mem 121GB'},
+        ])
+        self.assertEqual(self.machines.filter(powered_on=True).count(), 50)
+        self.assertEqual(self.machines.aggregate(Max='memory'),
+                         {'memory__max': 10000})
+        self.assertEqual(self.machines.get(3)['ip'], '10.0.0.3')
+        # the connection is kept alive between the requests
+        self.assertEqual(self.client.pool.connections, 1)
+
+    def test_read_post(self):
+        self.client.max_url_length = 100
+        rows = self.machines.filter(pk__in=list(range(1, 40))).fields(
+            'ip').order_by('ip').limit(1).all()
+        self.assertEqual(rows, [{'ip': '10.0.0.1'}])
+
+    def test_iterate(self):
+        query = self.machines.filter(powered_on=True).fields('ip')
+        rows = list(query.iterate(page_size=7))
+        self.assertEqual(len(rows), 50)
+        self.assertEqual(rows[:2], [{'ip': '10.0.0.2'}, {'ip': '10.0.0.4'}])
+        self.assertEqual(len(list(query.limit(9).iterate(page_size=4))), 9)
+        # ordered by another field than pk, paginated by offset
+        rows = list(query.order_by('-pk').iterate(page_size=7))
+        self.assertEqual(rows[0], {'ip': '10.0.0.100'})
+        self.assertEqual(len(rows), 50)
+
+    def test_write(self):
+        pk = self.client.create('default', 'machine', 'Machine', {
+            'ip': '10.0.1.1',
+            'name': 'client',
+            'cpu_count': 1,
+            'memory': 1,
+            'created_at': '2023-01-01T00:00:00Z',
+            'powered_on': False,
+            'os_id': 1,
+        })
+        self.client.update('default', 'machine', 'Machine', pk,
+                           {'memory': 2})
+        self.assertEqual(self.machines.get(pk)['memory'], 2)
+        self.client.delete('default', 'machine', 'Machine', pk)
+        self.assertIsNone(self.machines.get(pk))
+
+    def test_errors(self):
+        with self.assertRaises(RequestFailed) as cm:
+            self.machines.limit('ten').all()
+        self.assertEqual(cm.exception.status_code, 400)
+        with self.assertRaises(RequestFailed) as cm:
+            self.client.named_query('unknown')
+        self.assertEqual(cm.exception.status_code, 404)
+        with self.assertRaises(RequestFailed) as cm:
+            self.client.model('default', 'auth', 'User').all()
+        self.assertEqual(cm.exception.status_code, 403)
+
+    @override_settings(BRIDGEQL_RATE_LIMIT={'rate': 20, 'burst': 1})
+    def test_retry(self):
+        with mock.patch.object(client_module.time, 'sleep',
+                               wraps=time.sleep) as sleep:
+            self.machines.count()
+            self.machines.count()
+        sleep.assert_called_once_with(1.0)
+        self.client.max_retries = 0
+        with self.assertRaises(RequestFailed) as cm:
+            self.machines.count()
+            self.machines.count()
+        self.assertEqual(cm.exception.status_code, 429)
+        self.assertEqual(cm.exception.retry_after, '1')
+
+    @override_settings(BRIDGEQL_CHANGE_FEED_MODELS=['machine.Machine'],
+                       BRIDGEQL_CHANGE_FEED_DELAY=0,
+                       BRIDGEQL_SUBSCRIPTION_TIMEOUT=2)
+    def test_subscribe(self):
+        token = self.client.changes('default', 'machine', 'Machine',
+                                    since='latest')['next']
+
+        def write():
+            while not len(event_bus):
+                time.sleep(0.01)
+            with Client(self.live_server_url + '/bridgeql') as client:
+                client.update('default', 'machine', 'Machine', 2,
+                              {'powered_on': False})
+
+        writer = threading.Thread(target=write)
+        writer.start()
+        events = self.client.subscribe('default', 'machine', 'Machine',
+                                       filter={'powered_on': True},
+                                       fields=['ip'])
+        event = next(events)
+        events.close()
+        writer.join()
+        self.assertEqual((event['action'], event['pk'], event['row']),
+                         ('updated', 2, None))
+        changes = self.client.changes('default', 'machine', 'Machine',
+                                      since=token)
+        self.assertEqual(changes['updated'], [2])
+
+    def test_cache(self):
+        self.client.cache = MemoryCache()
+        query = self.machines.filter(os__name='os-name-1').fields('ip')
+        rows = query.all()
+        self.assertEqual(query.all(), rows)
+        self.assertEqual(self.client.cache.hits, 1)
+        self.client.update('default', 'machine', 'Machine', 1,
+                           {'ip': '10.0.1.1'})
+        self.assertEqual(query.all()[0], {'ip': '10.0.1.1'})
+        self.assertEqual(self.client.cache.hits, 1)
+        self.assertEqual(len(self.client.cache), 1)
+
+    def test_export(self):
+        query = self.machines.filter(powered_on=True).fields('ip')
+        rows = list(query.export(partitions=4, workers=2))
+        self.assertEqual(sorted(row['pk'] for row in rows),
+                         list(range(2, 101, 2)))
+        self.assertIn({'pk': 2, 'ip': '10.0.0.2'}, rows)
+
+    def test_export_resume(self):
+        query = self.machines.fields('ip')
+        partition = query.partitions(2)[1]
+        failing = client_module.ConnectionFailed('reset')
+        pool_request = client_module.ConnectionPool.request
+
+        def request(pool, *args, **kwargs):
+            response = pool_request(pool, *args, **kwargs)
+            lines = response.iter_lines()
+
+            def first_line():
+                yield next(lines)
+                lines.close()
+                raise failing
+            response.iter_lines = first_line
+            return response
+
+        with mock.patch.object(client_module.ConnectionPool, 'request',
+                               request):
+            with mock.patch.object(client_module.time, 'sleep'):
+                rows = self.client.export_partition(query, partition)
+                self.assertEqual([next(rows)['pk'] for _ in range(3)],
+                                 [51, 52, 53])
+                self.client.max_retries = 1
+                with self.assertRaises(client_module.ConnectionFailed):
+                    list(rows)
+
+
+@override_settings(MIDDLEWARE=['django.middleware.gzip.GZipMiddleware'] +
+                   settings.MIDDLEWARE)
+class TestClientCompression(LiveServerTestCase):
+    fixtures = [os.path.join(settings.BASE_DIR, 'machine_tests.json'), ]
+
+    def test_gzip(self):
+        with Client(self.live_server_url + '/bridgeql') as client:
+            response = client.send('GET', '/read/default/machine/Machine/',
+                                   {'payload': '{"fields": ["ip"]}'})
+            self.assertEqual(response.headers['content-encoding'], 'gzip')
+            self.assertEqual(len(client.result(response)['data']), 100)
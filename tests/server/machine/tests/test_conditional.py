@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+# Copyright © 2023 VMware, Inc.  All rights reserved.
+# SPDX-License-Identifier: BSD-2-Clause
+
+import json
+import os
+
+from django.conf import settings
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from machine.models import Machine
+
+
+class TestConditionalReads(TestCase):
+    fixtures = [os.path.join(settings.BASE_DIR, 'machine_tests.json'), ]
+
+    def setUp(self):
+        self.url = reverse('bridgeql_django_read', kwargs={
+            'db_name': 'default', 'app_label': 'machine',
+            'model_name': 'Machine'})
+        self.params = {'payload': json.dumps({
+            'filter': {'os__name': 'os-name-1'}, 'fields': ['ip', 'memory']})}
+
+    def test_not_modified(self):
+        resp = self.client.get(self.url, self.params)
+        self.assertEqual(resp.status_code, 200)
+        etag = resp['ETag']
+        resp = self.client.get(self.url, self.params, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 304)
+        self.assertEqual(resp['ETag'], etag)
+        self.assertEqual(resp.content, b'')
+        # gzip weakens the etag it compresses
+        resp = self.client.get(self.url, self.params,
+                               HTTP_IF_NONE_MATCH='W/%s' % etag)
+        self.assertEqual(resp.status_code, 304)
+
+    def test_modified(self):
+        etag = self.client.get(self.url, self.params)['ETag']
+        Machine.objects.filter(pk=1).update(memory=12345)
+        resp = self.client.get(self.url, self.params, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 200)
+        self.assertNotEqual(resp['ETag'], etag)
+
+    def test_post_read(self):
+        payload = json.loads(self.params['payload'])
+        resp = self.client.post(self.url, json.dumps({'payload': payload}),
+                                content_type='application/json')
+        resp = self.client.post(self.url, json.dumps({'payload': payload}),
+                                content_type='application/json',
+                                HTTP_IF_NONE_MATCH=resp['ETag'])
+        self.assertEqual(resp.status_code, 304)
+
+    def test_errors_untagged(self):
+        resp = self.client.get(self.url, {'payload': '{"limit": "ten"}'})
+        self.assertEqual(resp.status_code, 400)
+        self.assertFalse(resp.has_header('ETag'))
+
+    @override_settings(BRIDGEQL_ETAGS=False)
+    def test_disabled(self):
+        resp = self.client.get(self.url, self.params,
+                               HTTP_IF_NONE_MATCH='*')
+        self.assertEqual(resp.status_code, 200)
+        self.assertFalse(resp.has_header('ETag'))
@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+# Copyright © 2023 VMware, Inc.  All rights reserved.
+# SPDX-License-Identifier: BSD-2-Clause
+
+import json
+import os
+import unittest
+import uuid
+from datetime import date, datetime
+from decimal import Decimal
+
+from django.conf import settings
+from django.test import RequestFactory, SimpleTestCase, TestCase
+from django.test.client import Client
+from django.urls import reverse
+from django.utils import timezone
+
+from bridgeql.client import msgpack_ext_hook
+from bridgeql.django import helpers
+from machine.models import Machine, OperatingSystem
+
+MSGPACK = 'application/msgpack'
+
+
+class TestNegotiation(SimpleTestCase):
+
+    def negotiate(self, accept):
+        return helpers.negotiate(RequestFactory().get('/', HTTP_ACCEPT=accept))
+
+    @unittest.skipIf(helpers.msgpack is None, 'msgpack is not installed')
+    def test_negotiate(self):
+        self.assertEqual(MSGPACK, self.negotiate('application/msgpack'))
+        self.assertEqual(MSGPACK, self.negotiate('application/x-msgpack'))
+        self.assertEqual(MSGPACK, self.negotiate('application/msgpack, */*'))
+        self.assertEqual(MSGPACK, self.negotiate(
+            'application/json;q=0.5, application/msgpack'))
+        self.assertEqual('application/json', self.negotiate(''))
+        self.assertEqual('application/json', self.negotiate('*/*'))
+        self.assertEqual('application/json', self.negotiate(
+            'application/json, application/msgpack'))
+        self.assertEqual('application/json', self.negotiate(
+            'application/json, application/msgpack;q=0.5'))
+
+    @unittest.skipIf(helpers.msgpack is None, 'msgpack is not installed')
+    def test_native_types(self):
+        aware = datetime(2023, 1, 2, 3, 4, 5, 6000, tzinfo=timezone.utc)
+        key = uuid.uuid4()
+        naive = datetime(2023, 1, 2, 8, 34, 5, 6000)
+        values = [aware, naive, date(2023, 1, 2), key, Decimal('1.50')]
+        with self.settings(TIME_ZONE='Asia/Kolkata'):
+            data = helpers.msgpack.packb(values,
+                                         default=helpers.msgpack_default)
+        # the msgpack timestamps and the uuid extension type
+        timestamp = helpers.msgpack.Timestamp.from_datetime(aware)
+        self.assertListEqual(
+            [timestamp, timestamp, '2023-01-02',
+             helpers.msgpack.ExtType(1, key.bytes), '1.50'],
+            helpers.msgpack.unpackb(data))
+        self.assertListEqual(
+            [aware, aware, '2023-01-02', key, '1.50'],
+            helpers.msgpack.unpackb(data, timestamp=3,
+                                    ext_hook=msgpack_ext_hook))
+
+
+@unittest.skipIf(helpers.msgpack is None, 'msgpack is not installed')
+class TestMsgpackAPI(TestCase):
+    fixtures = [os.path.join(settings.BASE_DIR, 'machine_tests.json'), ]
+
+    def setUp(self):
+        self.client = Client(HTTP_ACCEPT=MSGPACK)
+
+    def unpack(self, resp):
+        self.assertEqual(MSGPACK, resp['Content-Type'])
+        self.assertEqual('Accept', resp['Vary'])
+        return helpers.msgpack.unpackb(resp.content, timestamp=3,
+                                       ext_hook=msgpack_ext_hook)
+
+    def url(self, url_name, **kwargs):
+        url_kwargs = {'db_name': 'default', 'app_label': 'machine',
+                      'model_name': 'Machine'}
+        url_kwargs.update(kwargs)
+        return reverse(url_name, kwargs=url_kwargs)
+
+    def test_read(self):
+        params = {'filter': {'name': 'machine-name-1'},
+                  'fields': ['ip', 'created_at', 'stats']}
+        resp = self.client.get(self.url('bridgeql_django_read'),
+                               {'payload': json.dumps(params)})
+        self.assertEqual(resp.status_code, 200)
+        data = self.unpack(resp)['data']
+        machine = Machine.objects.get(name='machine-name-1')
+        self.assertEqual(machine.created_at, data[0]['created_at'])
+        self.assertEqual(machine.stats, data[0]['stats'])
+
+    def test_uuid(self):
+        OperatingSystem.objects.filter(pk=1).update(license_key=uuid.uuid4())
+        with self.settings(BRIDGEQL_RESTRICTED_MODELS={}):
+            resp = self.client.get(
+                self.url('bridgeql_django_read_pk', model_name='OperatingSystem',
+                         pk=1))
+        data = self.unpack(resp)['data']
+        self.assertEqual(OperatingSystem.objects.get(pk=1).license_key,
+                         data[0]['license_key'])
+
+    def test_write(self):
+        created_at = datetime(2023, 1, 2, 3, 4, 5, tzinfo=timezone.utc)
+        params = {'ip': '10.0.0.213', 'name': 'msgpack', 'cpu_count': 2,
+                  'memory': 4, 'created_at': created_at, 'powered_on': True,
+                  'os_id': 1}
+        body = helpers.msgpack.packb({'payload': params},
+                                     default=helpers.msgpack_default)
+        resp = self.client.post(self.url('bridgeql_django_create'), body,
+                                content_type=MSGPACK)
+        self.assertEqual(resp.status_code, 201)
+        pk = self.unpack(resp)['data']
+        self.assertEqual(created_at, Machine.objects.get(pk=pk).created_at)
+
+        body = helpers.msgpack.packb({'payload': {'memory': 8}})
+        resp = self.client.patch(self.url('bridgeql_django_update', pk=pk),
+                                 body, content_type=MSGPACK)
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(pk, self.unpack(resp)['data'])
+
+        resp = self.client.delete(self.url('bridgeql_django_delete', pk=pk))
+        self.assertEqual(resp.status_code, 200)
+        self.assertTrue(self.unpack(resp)['success'])
+
+    def test_error(self):
+        resp = self.client.get(self.url('bridgeql_django_read'),
+                               {'payload': json.dumps({'fields': ['invalid']})})
+        self.assertEqual(resp.status_code, 400)
+        self.assertFalse(self.unpack(resp)['success'])
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+# Copyright © 2023 VMware, Inc.  All rights reserved.
+# SPDX-License-Identifier: BSD-2-Clause
+
+import json
+import os
+
+from django.conf import settings
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+
+class TestExport(TestCase):
+    fixtures = [os.path.join(settings.BASE_DIR, 'machine_tests.json'), ]
+
+    def url(self, name, model_name='Machine'):
+        return reverse(name, kwargs={'db_name': 'default',
+                                     'app_label': 'machine',
+                                     'model_name': model_name})
+
+    def partitions(self, payload, **params):
+        params['payload'] = json.dumps(payload)
+        return self.client.get(self.url('bridgeql_django_partitions'),
+                               params)
+
+    def export(self, payload, **params):
+        params['payload'] = json.dumps(payload)
+        resp = self.client.get(self.url('bridgeql_django_export'), params)
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp['Content-Type'], 'application/x-ndjson')
+        return [json.loads(line) for line in
+                b''.join(resp.streaming_content).decode('utf-8').splitlines()]
+
+    def test_partitions(self):
+        resp = self.partitions({'filter': {'pk__gt': 10}}, partitions=4)
+        self.assertEqual(resp.status_code, 200)
+        partitions = resp.json()['data']
+        self.assertEqual([p['payload']['filter'] for p in partitions], [
+            {'pk__gte': 11, 'pk__lt': 33, '__or': [{'pk__gt': 10}]},
+            {'pk__gte': 33, 'pk__lt': 56, '__or': [{'pk__gt': 10}]},
+            {'pk__gte': 56, 'pk__lt': 78, '__or': [{'pk__gt': 10}]},
+            {'pk__gte': 78, 'pk__lte': 100, '__or': [{'pk__gt': 10}]},
+        ])
+
+    def test_sample_partitions(self):
+        # the powered on machines have even pks
+        with self.assertNumQueries(2):
+            # the bounds, then the boundaries of all the partitions
+            resp = self.partitions({'filter': {'powered_on': True}},
+                                   partitions=3, split='sample')
+        rows = []
+        for partition in resp.json()['data']:
+            rows.append(self.export(partition['payload']))
+        self.assertEqual([len(part) for part in rows], [17, 17, 16])
+        self.assertEqual([row['pk'] for part in rows for row in part],
+                         list(range(2, 101, 2)))
+
+    def test_more_partitions_than_rows(self):
+        partitions = self.partitions({'filter': {'pk__lte': 2}},
+                                     partitions=8).json()['data']
+        self.assertEqual(len(partitions), 2)
+        self.assertEqual(self.partitions({'filter': {'pk__gt': 100}},
+                                         partitions=8).json()['data'], [])
+
+    @override_settings(BRIDGEQL_EXPORT_BATCH_SIZE=7)
+    def test_export(self):
+        rows = self.export({'filter': {'os__name': 'os-name-1'},
+                            'fields': ['ip', 'stats']})
+        self.assertEqual(len(rows), 10)
+        self.assertEqual(rows[1], {'pk': 11, 'ip': '10.0.0.11',
+                                   'stats': 'CPU: 6, Mem 121GB'})
+        # resumed after the last row received
+        resumed = self.export({'filter': {'os__name': 'os-name-1'},
+                               'fields': ['ip', 'stats']}, after=11)
+        self.assertEqual(resumed, rows[2:])
+        rows = self.export({'fields': []}, after=95)
+        self.assertEqual([row['pk'] for row in rows], [96, 97, 98, 99, 100])
+        self.assertIn('ip', rows[0])
+
+    def test_invalid(self):
+        self.assertEqual(self.partitions({}, partitions=0).status_code, 400)
+        self.assertEqual(self.partitions({}, partitions=65).status_code, 400)
+        self.assertEqual(self.partitions({}, split='hash').status_code, 400)
+        resp = self.client.get(self.url('bridgeql_django_export'),
+                               {'payload': json.dumps({'limit': 10})})
+        self.assertEqual(resp.status_code, 400)
+        resp = self.client.get(self.url('bridgeql_django_export'),
+                               {'payload': '{}', 'after': 'ten'})
+        self.assertEqual(resp.status_code, 400)
+        resp = self.client.get(self.url('bridgeql_django_export'), {
+            'payload': json.dumps({'filter': {'unknown': 1}})})
+        self.assertEqual(resp.status_code, 400)
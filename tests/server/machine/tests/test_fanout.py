@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+# Copyright © 2023 VMware, Inc.  All rights reserved.
+# SPDX-License-Identifier: BSD-2-Clause
+
+import json
+import os
+
+from django.conf import settings
+from django.test import TransactionTestCase, override_settings
+from django.test.client import Client
+from django.urls import reverse
+
+from bridgeql.django.fanout import FanoutBuilder
+from machine.models import OperatingSystem
+
+
+# shards are read from worker threads, the fixtures need to be committed
+@override_settings(BRIDGEQL_SHARD_GROUPS={'shards': ['default', 'default']})
+class TestFanoutReader(TransactionTestCase):
+    fixtures = [os.path.join(settings.BASE_DIR, 'machine_tests.json'), ]
+
+    def setUp(self):
+        self.client = Client()
+
+    def read(self, params, db_name='default,default'):
+        url = reverse('bridgeql_django_read', kwargs={
+            'db_name': db_name,
+            'app_label': 'machine',
+            'model_name': 'Machine'
+        })
+        return self.client.get(url, {'payload': json.dumps(params)})
+
+    def test_fanout_count(self):
+        params = {
+            'filter': {
+                'os__name': 'os-name-5'
+            },
+            'count': True
+        }
+        resp = self.read(params)
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(20, resp.json()['data'])
+
+    def test_fanout_shard_group(self):
+        params = {
+            'filter': {
+                'name': 'machine-name-1'
+            },
+            'fields': ['ip', 'stats']
+        }
+        resp = self.read(params, db_name='shards')
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(2, len(resp.json()['data']))
+
+    def test_fanout_order_limit_offset(self):
+        params = {
+            'filter': {
+                'name__startswith': 'machine-name-5'
+            },
+            'order_by': ['-name'],
+            'fields': ['ip', 'name'],
+            'limit': 3,
+            'offset': 1
+        }
+        resp = self.read(params)
+        self.assertEqual(resp.status_code, 200)
+        ips = [row['ip'] for row in resp.json()['data']]
+        # every machine is returned once per shard
+        self.assertListEqual(['10.0.0.59', '10.0.0.58', '10.0.0.58'], ips)
+
+    @override_settings(BRIDGEQL_RESTRICTED_MODELS={})
+    def test_fanout_order_nulls(self):
+        OperatingSystem.objects.filter(pk__lte=2).update(
+            license_key='6f0a1f5e-8c1b-4a53-9d4c-3c1b2a0d9e01')
+        # every database sorts the NULLs as the merge does
+        for order, keys in (('license_key', [True] * 4 + [False] * 16),
+                            ('-license_key', [False] * 16 + [True] * 4)):
+            builder = FanoutBuilder(['default', 'default'], 'machine',
+                                    'OperatingSystem', {
+                                        'fields': ['name', 'license_key'],
+                                        'order_by': [order, 'name']})
+            self.assertListEqual(
+                keys, [row['license_key'] is not None
+                       for row in builder.queryset()])
+
+    @override_settings(BRIDGEQL_MAX_LIMIT=10)
+    def test_fanout_max_limit(self):
+        params = {
+            'order_by': ['ip'],
+            'fields': ['ip'],
+            'limit': 10,
+            'offset': 5
+        }
+        # the shards read past the maximum limit to serve the page
+        resp = self.read(params)
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(10, len(resp.json()['data']))
+        params['limit'] = 11
+        self.assertEqual(400, self.read(params).status_code)
+
+    def test_fanout_order_by_missing_field(self):
+        params = {
+            'order_by': ['name'],
+            'fields': ['ip'],
+        }
+        resp = self.read(params)
+        self.assertEqual(resp.status_code, 400)
+        self.assertFalse(resp.json()['success'])
+
+    def test_fanout_aggregate(self):
+        params = {
+            'aggregate': {
+                'Max': 'cpu_count',
+                'Count': 'os'
+            }
+        }
+        resp = self.read(params)
+        self.assertEqual(resp.status_code, 200)
+        resp_json = resp.json()
+        self.assertEqual(14, resp_json['data']['cpu_count__max'])
+        self.assertEqual(200, resp_json['data']['os__count'])
+
+    def test_fanout_uncombinable_aggregate(self):
+        params = {
+            'aggregate': {
+                'Avg': 'memory'
+            }
+        }
+        resp = self.read(params)
+        self.assertEqual(resp.status_code, 400)
+        self.assertFalse(resp.json()['success'])
+
+    def test_fanout_invalid_db(self):
+        resp = self.read({'count': True}, db_name='default,invalid')
+        self.assertEqual(resp.status_code, 400)
+        self.assertFalse(resp.json()['success'])
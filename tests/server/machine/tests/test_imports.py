@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+# Copyright © 2023 VMware, Inc.  All rights reserved.
+# SPDX-License-Identifier: BSD-2-Clause
+
+import json
+import os
+import subprocess
+import sys
+
+from django.conf import settings
+from django.test import Client, SimpleTestCase, TestCase
+from django.urls import resolve, reverse
+
+from bridgeql.django.settings import bridgeql_settings
+from bridgeql.utils import LazyView
+
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
+# seconds to import the urls once Django is set up
+IMPORT_BUDGET = 0.1
+
+# run in a new interpreter, the modules of the tests are already imported
+IMPORT_SCRIPT = '''
+import json
+import sys
+import time
+
+import django
+django.setup()
+start = time.time()
+import bridgeql.django.urls
+seconds = time.time() - start
+from django.urls import resolve
+resolve('/bridgeql/read/default/machine/Machine/')
+print(json.dumps({
+    'seconds': seconds,
+    'modules': [name for name in sys.modules if name.startswith('bridgeql')],
+}))
+'''
+
+
+class TestImports(SimpleTestCase):
+
+    def test_import_budget(self):
+        env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+        env.setdefault('DJANGO_SETTINGS_MODULE', 'server.settings')
+        output = subprocess.check_output([sys.executable, '-c', IMPORT_SCRIPT],
+                                         cwd=settings.BASE_DIR, env=env)
+        result = json.loads(output.decode('utf-8').splitlines()[-1])
+        for module in ('bridgeql.django.bridge', 'bridgeql.django.views',
+                       'bridgeql.django.schema', 'bridgeql.django.helpers',
+                       'bridgeql.django.named'):
+            self.assertNotIn(module, result['modules'])
+        self.assertLess(result['seconds'], IMPORT_BUDGET)
+
+    def test_validated_once(self):
+        # by the app config, then after the settings changed in
+        # the other tests
+        self.assertTrue(bridgeql_settings.ensure_valid())
+        with mock.patch.object(bridgeql_settings, 'validate') as validate:
+            self.assertTrue(bridgeql_settings.ensure_valid())
+        validate.assert_not_called()
+
+    def test_lazy_view(self):
+        view = resolve('/bridgeql/schema/').func
+        self.assertIsInstance(view, LazyView)
+        self.assertEqual((view.__module__, view.__name__),
+                         ('bridgeql.django.views', 'generate_bridgeql_schema'))
+
+
+class TestLazyViews(TestCase):
+    fixtures = [os.path.join(settings.BASE_DIR, 'machine_tests.json'), ]
+
+    def test_csrf_exempt(self):
+        client = Client(enforce_csrf_checks=True)
+        resp = client.post(reverse('bridgeql_django_read', kwargs={
+            'db_name': 'default', 'app_label': 'machine',
+            'model_name': 'Machine'}),
+            json.dumps({'payload': {'filter': {'pk': 1}, 'fields': ['ip']}}),
+            content_type='application/json')
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.json()['data'], [{'ip': '10.0.0.1'}])
@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+# Copyright © 2023 VMware, Inc.  All rights reserved.
+# SPDX-License-Identifier: BSD-2-Clause
+
+import json
+import os
+
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
+from django.conf import settings
+from django.db.backends.base.base import BaseDatabaseWrapper
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.client import Client
+from django.urls import reverse
+
+from bridgeql.django import metrics
+
+
+class TestMetricTypes(SimpleTestCase):
+
+    def test_counter(self):
+        counter = metrics.Counter('test_total', 'Test counter.', ('name',))
+        counter.inc(('a"b',))
+        counter.inc(('a"b',), 2)
+        self.assertEqual(3, counter.value(('a"b',)))
+        self.assertListEqual([
+            '# HELP test_total Test counter.',
+            '# TYPE test_total counter',
+            'test_total{name="a\\"b"} 3',
+        ], counter.render())
+
+    def test_histogram(self):
+        histogram = metrics.Histogram('test_seconds', 'Test histogram.',
+                                      buckets=(0.1, 1))
+        histogram.observe((), 0.1)
+        histogram.observe((), 0.5)
+        histogram.observe((), 5)
+        self.assertListEqual([
+            '# HELP test_seconds Test histogram.',
+            '# TYPE test_seconds histogram',
+            'test_seconds_bucket{le="0.1"} 1',
+            'test_seconds_bucket{le="1"} 2',
+            'test_seconds_bucket{le="+Inf"} 3',
+            'test_seconds_sum 5.6',
+            'test_seconds_count 3',
+        ], histogram.render())
+
+
+class TestMetrics(TestCase):
+    fixtures = [os.path.join(settings.BASE_DIR, 'machine_tests.json'), ]
+
+    def setUp(self):
+        self.client = Client()
+        metrics.registry.clear()
+
+    def read(self, params):
+        url = reverse('bridgeql_django_read', kwargs={
+            'db_name': 'default',
+            'app_label': 'machine',
+            'model_name': 'Machine'
+        })
+        return self.client.get(url, {'payload': json.dumps(params)})
+
+    def test_read_metrics(self):
+        resp = self.read({'filter': {'os__name': 'os-name-1'},
+                          'fields': ['ip']})
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(1, metrics.REQUESTS.value(
+            ('read', 'machine.Machine', '200')))
+        self.assertEqual(10, metrics.ROWS.value(('read', 'machine.Machine')))
+        self.assertEqual(len(resp.content),
+                         metrics.BYTES.value(('read', 'machine.Machine')))
+
+        resp = self.client.get(reverse('bridgeql_metrics'))
+        self.assertEqual(resp.status_code, 200)
+        content = resp.content.decode('utf-8')
+        for phase in ('parse', 'validate', 'compile', 'execute', 'serialize'):
+            self.assertIn('bridgeql_phase_duration_seconds_count'
+                          '{endpoint="read",phase="%s"} 1' % phase, content)
+
+    def test_exception_metrics(self):
+        resp = self.read({'fields': ['invalid']})
+        self.assertEqual(resp.status_code, 400)
+        self.assertEqual(1, metrics.EXCEPTIONS.value(
+            ('read', 'machine.Machine', 'InvalidModelFieldName')))
+
+    def test_unknown_model_metrics(self):
+        for app_label, model_name in (('machine', 'Unknown'),
+                                      ('unknown', 'Machine'),
+                                      ('auth', 'User')):
+            url = reverse('bridgeql_django_read', kwargs={
+                'db_name': 'default',
+                'app_label': app_label,
+                'model_name': model_name
+            })
+            self.client.get(url, {'payload': '{}'})
+            self.client.delete(url)
+        # the labels of the models that are not served are collapsed
+        self.assertEqual(3, metrics.REQUESTS.value(('read', 'other', '405')))
+        self.assertListEqual(
+            [('read', 'other', '400'), ('read', 'other', '403'),
+             ('read', 'other', '405')], sorted(metrics.REQUESTS._values))
+
+    def test_no_timing_headers(self):
+        resp = self.read({'fields': ['ip']})
+        self.assertNotIn('Server-Timing', resp)
+        self.assertNotIn('X-BridgeQL-Queries', resp)
+
+    @override_settings(BRIDGEQL_SERVER_TIMING=True,
+                       BRIDGEQL_QUERY_COUNT_HEADERS=True)
+    def test_timing_headers(self):
+        resp = self.read({'filter': {'os__name': 'os-name-1'},
+                          'fields': ['ip', 'stats', 'os__name']})
+        self.assertEqual(resp.status_code, 200)
+        timings = [metric.split(';')[0]
+                   for metric in resp['Server-Timing'].split(', ')]
+        self.assertListEqual(['parse', 'validate', 'compile', 'execute',
+                              'serialize', 'db', 'total'], timings)
+        self.assertEqual('1', resp['X-BridgeQL-Queries'])
+        self.assertGreater(float(resp['X-BridgeQL-DB-Time']), 0)
+
+    @override_settings(BRIDGEQL_SERVER_TIMING=True,
+                       BRIDGEQL_QUERY_COUNT_HEADERS=True)
+    def test_timing_headers_without_execute_wrapper(self):
+        # the connections of django < 2.0 have no execute wrapper
+        with mock.patch.object(BaseDatabaseWrapper, 'execute_wrapper', None,
+                               create=True):
+            resp = self.read({'fields': ['ip']})
+        self.assertEqual(resp.status_code, 200)
+        self.assertIn('db;dur=0.000', resp['Server-Timing'])
+        self.assertEqual('0', resp['X-BridgeQL-Queries'])
@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+# Copyright © 2023 VMware, Inc.  All rights reserved.
+# SPDX-License-Identifier: BSD-2-Clause
+
+import os
+
+from django.conf import settings
+from django.test import TestCase, override_settings
+from django.test.client import Client
+from django.urls import reverse
+
+from bridgeql.django.exceptions import InvalidBridgeQLSettings
+from bridgeql.django.models import ModelConfig
+from bridgeql.django.named import _field_names, _placeholders, named_queries
+from bridgeql.django.settings import bridgeql_settings
+
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
+NAMED_QUERIES = {
+    'machines-by-os': {
+        'app_label': 'machine',
+        'model_name': 'Machine',
+        'query': {
+            'filter': {'os__name': '$os', 'cpu_count__gte': '$cpus'},
+            'fields': ['ip', 'stats', 'os__name'],
+            'order_by': ['ip'],
+            'limit': '$limit',
+        },
+        'params': {
+            'os': 'str',
+            'cpus': {'type': 'int', 'default': 0},
+            'limit': {'type': 'int', 'default': 5},
+        },
+    },
+    'machines-by-name': {
+        'app_label': 'machine',
+        'model_name': 'Machine',
+        'query': {
+            'filter': {'__or': [{'name__in': '$names'}, {'ip': '$ip'}]},
+            'fields': ['name'],
+            'order_by': ['name'],
+        },
+        'params': {'names': 'list', 'ip': {'type': 'str', 'default': ''}},
+    },
+    'powered-on-count': {
+        'app_label': 'machine',
+        'model_name': 'Machine',
+        'query': {'filter': {'powered_on': '$on'}, 'count': True},
+        'params': {'on': 'bool'},
+    },
+}
+
+
+@override_settings(BRIDGEQL_NAMED_QUERIES=NAMED_QUERIES)
+class TestNamedQueries(TestCase):
+    fixtures = [os.path.join(settings.BASE_DIR, 'machine_tests.json'), ]
+
+    def setUp(self):
+        self.client = Client()
+
+    def query(self, name, **params):
+        url = reverse('bridgeql_django_named_query',
+                      kwargs={'query_name': name})
+        return self.client.get(url, params)
+
+    def test_named_query(self):
+        resp = self.query('machines-by-os', os='os-name-1', limit=3)
+        self.assertEqual(resp.status_code, 200)
+        data = resp.json()['data']
+        self.assertEqual(3, len(data))
+        self.assertListEqual(['ip', 'os__name', 'stats'], sorted(data[0]))
+        self.assertTrue(all(row['os__name'] == 'os-name-1' for row in data))
+        # defaults apply to the missing parameters
+        resp = self.query('machines-by-os', os='os-name-1')
+        self.assertEqual(5, len(resp.json()['data']))
+        resp = self.query('machines-by-os', os='os-name-1', cpus=20)
+        self.assertEqual(0, len(resp.json()['data']))
+
+    def test_typed_parameters(self):
+        resp = self.query('powered-on-count', on='true')
+        self.assertEqual(50, resp.json()['data'])
+        url = reverse('bridgeql_django_named_query',
+                      kwargs={'query_name': 'machines-by-name'})
+        # the template is bound on a copy, __or is kept between requests
+        for _ in range(2):
+            resp = self.client.get(
+                url + '?names=machine-name-1&names=machine-name-2')
+            self.assertListEqual(
+                [{'name': 'machine-name-1'}, {'name': 'machine-name-2'}],
+                resp.json()['data'])
+
+    def test_invalid_parameters(self):
+        for params in ({}, {'os': 'os-name-1', 'limit': 'ten'},
+                       {'os': 'os-name-1', 'unknown': 1}):
+            resp = self.query('machines-by-os', **params)
+            self.assertEqual(resp.status_code, 400)
+            self.assertFalse(resp.json()['success'])
+        self.assertEqual(400, self.query('powered-on-count',
+                                         on='maybe').status_code)
+        self.assertEqual(404, self.query('unknown').status_code)
+
+    def test_validated_once(self):
+        self.query('machines-by-os', os='os-name-1')
+        with mock.patch.object(ModelConfig, 'validate_fields') as validate, \
+                self.assertNumQueries(1):
+            resp = self.query('machines-by-os', os='os-name-2')
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(0, validate.call_count)
+
+    def test_bound_restricted_fields(self):
+        named_queries.register(
+            'os-fields', 'machine', 'OperatingSystem',
+            {'fields': '$fields', 'order_by': '$order'},
+            {'fields': {'type': 'list', 'default': ['name']},
+             'order': {'type': 'list', 'default': ['name']}})
+        self.addCleanup(named_queries.unregister, 'os-fields')
+        url = reverse('bridgeql_django_named_query',
+                      kwargs={'query_name': 'os-fields'})
+        resp = self.client.get(url + '?fields=name&fields=arch')
+        self.assertEqual(resp.status_code, 200)
+        # restricted fields cannot be named through the parameters
+        for query in ('?fields=name&fields=license_key',
+                      '?order=-license_key'):
+            resp = self.client.get(url + query)
+            self.assertEqual(resp.status_code, 403)
+            self.assertFalse(resp.json()['success'])
+        # the values decoded on python 2 are unicode
+        self.assertEqual(set(['name', 'license_key']), _field_names(
+            {'fields': [u'name'], 'order_by': [u'-license_key']}))
+        self.assertEqual(set(['arch']), _placeholders([u'$arch', u'name']))
+
+    def test_register(self):
+        named_queries.register(
+            'machine-by-ip', 'machine', 'Machine',
+            {'filter': {'ip': '$ip'}, 'fields': ['name']}, {'ip': 'str'})
+        self.addCleanup(named_queries.unregister, 'machine-by-ip')
+        resp = self.query('machine-by-ip', ip='10.0.0.2')
+        self.assertListEqual([{'name': 'machine-name-2'}], resp.json()['data'])
+        with self.assertRaises(InvalidBridgeQLSettings):
+            named_queries.register('machine-by-ip', 'machine', 'Machine',
+                                   {'fields': ['name']})
+
+    def test_invalid_definitions(self):
+        invalid = [
+            # restricted field
+            ('machine', 'OperatingSystem', {'fields': ['license_key']}, None),
+            ('auth', 'User', {'fields': ['username']}, None),
+            ('machine', 'Machine', {'fields': ['invalid']}, None),
+            ('machine', 'Machine', {'filter': {'ip__invalid': 'x'}}, None),
+            # undeclared and badly typed parameters
+            ('machine', 'Machine', {'filter': {'ip': '$ip'}}, None),
+            ('machine', 'Machine', {'filter': {'ip': '$ip'}}, {'ip': 'uuid'}),
+            ('machine', 'Machine', {'filter': {'cpu_count': '$c'}}, {'c': 'str'}),
+        ]
+        for app_label, model_name, query, params in invalid:
+            with self.assertRaises(InvalidBridgeQLSettings):
+                named_queries.register('invalid', app_label, model_name,
+                                       query, params)
+        config = {'invalid': {'app_label': 'machine', 'model_name': 'Machine',
+                              'query': {'fields': ['invalid']}}}
+        with self.settings(BRIDGEQL_NAMED_QUERIES=config):
+            self.assertRaises(InvalidBridgeQLSettings,
+                              bridgeql_settings.validate)
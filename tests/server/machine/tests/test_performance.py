@@ -0,0 +1,216 @@
+# -*- coding: utf-8 -*-
+# Copyright © 2023 VMware, Inc.  All rights reserved.
+# SPDX-License-Identifier: BSD-2-Clause
+
+import json
+import os
+import unittest
+from timeit import default_timer as timer
+try:
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
+try:
+    import tracemalloc
+except ImportError:
+    # added in python 3.4
+    tracemalloc = None
+
+from django.conf import settings
+from django.core.management import call_command
+from django.test import TestCase
+from django.test.client import Client
+from django.urls import reverse
+
+from bridgeql.django.helpers import JSONEncoder
+from machine.models import Machine
+
+
+def read_url(model_name='Machine', pk=None):
+    url_kwargs = {
+        'db_name': 'default',
+        'app_label': 'machine',
+        'model_name': model_name
+    }
+    if pk:
+        url_kwargs['pk'] = pk
+        return reverse('bridgeql_django_read_pk', kwargs=url_kwargs)
+    return reverse('bridgeql_django_read', kwargs=url_kwargs)
+
+
+def peak_memory(func):
+    """
+    Peak of the memory allocated while running func, in bytes.
+    """
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def best_time(func, repeat=20):
+    """
+    Fastest of repeat runs of func, in seconds.
+    """
+    timings = []
+    for _ in range(repeat):
+        start = timer()
+        func()
+        timings.append(timer() - start)
+    return min(timings)
+
+
+class TestQueryBudgets(TestCase):
+    fixtures = [os.path.join(settings.BASE_DIR, 'machine_tests.json'), ]
+
+    # (model name, payload, number of queries allowed)
+    SCENARIOS = {
+        'fk_fields': ('Machine', {
+            'filter': {'os__arch__startswith': 'arch-name'},
+            'fields': ['ip', 'os__name', 'os__arch'],
+        }, 1),
+        'property_fields': ('Machine', {
+            'fields': ['ip', 'stats'],
+        }, 1),
+        'fk_property_fields': ('Machine', {
+            'fields': ['ip', 'stats', 'os__name', 'os__full_name'],
+        }, 1),
+        'reverse_fk_fields': ('OperatingSystem', {
+            'filter': {'machine__powered_on': True},
+            'fields': ['name', 'machine__ip', 'machine__name'],
+        }, 1),
+        'order_by_offset': ('Machine', {
+            'fields': ['ip', 'os__name'],
+            'order_by': ['-os__name', 'name'],
+            'offset': 10,
+            'limit': 20,
+        }, 1),
+        'distinct': ('Machine', {
+            'fields': ['os__name'],
+            'distinct': True,
+        }, 1),
+        'count': ('Machine', {
+            'filter': {'os__name': 'os-name-1'},
+            'count': True,
+        }, 1),
+        'aggregate': ('Machine', {
+            'aggregate': {'Max': 'cpu_count', 'Avg': 'memory', 'Count': 'os'},
+        }, 1),
+    }
+
+    def setUp(self):
+        self.client = Client()
+
+    def test_query_budgets(self):
+        for name, (model_name, params, budget) in self.SCENARIOS.items():
+            with self.subTest(scenario=name):
+                with self.assertNumQueries(budget):
+                    resp = self.client.get(read_url(model_name),
+                                           {'payload': json.dumps(params)})
+                self.assertEqual(resp.status_code, 200)
+                self.assertTrue(resp.json()['data'])
+
+    def test_read_pk_budget(self):
+        with self.assertNumQueries(1):
+            resp = self.client.get(read_url(pk=1))
+        self.assertEqual(resp.status_code, 200)
+
+    def test_budget_does_not_grow_with_rows(self):
+        # a query per row on the property path would be an N+1
+        params = {'fields': ['stats', 'os__full_name']}
+        for limit in (1, 10, 100):
+            params['limit'] = limit
+            with self.assertNumQueries(1):
+                resp = self.client.get(read_url(),
+                                       {'payload': json.dumps(params)})
+            self.assertEqual(len(resp.json()['data']), limit)
+
+
+@unittest.skipIf(tracemalloc is None, 'tracemalloc requires python 3.4')
+class TestLargeReadBudgets(TestCase):
+    """
+    Memory and time of large reads compared to the same read written
+    with the ORM directly, measured in the same run so that the budgets
+    do not depend on the machine running the tests. The wall clock of
+    shared machines varies too much for the time budgets, they only run
+    with BRIDGEQL_TIME_BUDGETS set in the environment.
+    """
+    SCALE = 20
+    # bridgeql may use this many times the memory and time of the ORM,
+    # a doubling of the allocations on either path fails the suite
+    MEMORY_RATIO = 1.5
+    TIME_RATIO = 2
+    PROPERTY_FIELDS = ['ip', 'name', 'stats', 'os__name', 'os__full_name']
+    FIELDS = ['ip', 'name', 'memory', 'os__name', 'os__arch']
+
+    @classmethod
+    def setUpTestData(cls):
+        call_command('create_test_data', scale=cls.SCALE, stdout=StringIO())
+        cls.rows = Machine.objects.count()
+
+    def setUp(self):
+        self.client = Client()
+
+    def bridgeql_read(self, fields):
+        def read():
+            resp = self.client.get(read_url(), {'payload': json.dumps({
+                'fields': fields,
+                'limit': self.rows,
+            })})
+            self.assertEqual(len(resp.json()['data']), self.rows)
+        return read
+
+    def orm_read(self, fields, properties=False):
+        def read():
+            if properties:
+                qset = Machine.objects.select_related('os')
+                rows = []
+                for machine in qset:
+                    row = {}
+                    for field in fields:
+                        attr = machine
+                        for ref in field.split('__'):
+                            attr = getattr(attr, ref)
+                        row[field] = attr
+                    rows.append(row)
+            else:
+                rows = list(Machine.objects.values(*fields))
+            # same encoding as JSONResponse, so that only the overhead
+            # of bridgeql over the ORM is measured
+            json.dumps({'data': rows, 'message': '', 'success': True},
+                       indent=3, cls=JSONEncoder)
+        return read
+
+    def assertWithinRatio(self, measure, fields, properties, ratio):
+        # run both once beforehand so that caches are warm for either
+        self.bridgeql_read(fields)()
+        self.orm_read(fields, properties)()
+        bridgeql_value = measure(self.bridgeql_read(fields))
+        orm_value = measure(self.orm_read(fields, properties))
+        self.assertLessEqual(
+            bridgeql_value, orm_value * ratio,
+            '%s of %d rows is %.2f times the ORM one' % (
+                measure.__name__, self.rows,
+                bridgeql_value / float(orm_value)))
+
+    def test_memory_budget(self):
+        self.assertWithinRatio(peak_memory, self.FIELDS, False,
+                               self.MEMORY_RATIO)
+
+    def test_property_memory_budget(self):
+        self.assertWithinRatio(peak_memory, self.PROPERTY_FIELDS, True,
+                               self.MEMORY_RATIO)
+
+    @unittest.skipUnless(os.environ.get('BRIDGEQL_TIME_BUDGETS'),
+                         'time budgets run with BRIDGEQL_TIME_BUDGETS set')
+    def test_time_budget(self):
+        self.assertWithinRatio(best_time, self.FIELDS, False,
+                               self.TIME_RATIO)
+
+    @unittest.skipUnless(os.environ.get('BRIDGEQL_TIME_BUDGETS'),
+                         'time budgets run with BRIDGEQL_TIME_BUDGETS set')
+    def test_property_time_budget(self):
+        self.assertWithinRatio(best_time, self.PROPERTY_FIELDS, True,
+                               self.TIME_RATIO)
@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+# Copyright © 2023 VMware, Inc.  All rights reserved.
+# SPDX-License-Identifier: BSD-2-Clause
+
+import json
+import os
+import time
+from datetime import datetime
+
+from django.conf import settings
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.client import Client
+from django.urls import reverse
+
+from bridgeql.django.exceptions import InvalidBridgeQLSettings
+from bridgeql.django.routing import ReadRouter, STICKY_COOKIE
+from bridgeql.django.settings import bridgeql_settings
+
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
+
+def lagging_replica(alias):
+    return 60
+
+
+# the routes of the router tests name databases not configured here, which
+# the validation on the first access to the changed settings rejects
+unknown_databases = mock.patch.object(
+    bridgeql_settings, '_validate_read_routing', new=lambda: True)
+
+
+READ_ROUTING = {
+    'machines': {
+        'primary': 'default',
+        'replicas': {'default': 1},
+        'sticky_seconds': 10,
+    }
+}
+
+
+@override_settings(BRIDGEQL_READ_ROUTING=READ_ROUTING)
+class TestReadRouting(TestCase):
+    fixtures = [os.path.join(settings.BASE_DIR, 'machine_tests.json'), ]
+
+    def setUp(self):
+        self.client = Client()
+        self.factory = RequestFactory()
+
+    def test_read_logical_db_name(self):
+        url = reverse('bridgeql_django_read', kwargs={
+            'db_name': 'machines',
+            'app_label': 'machine',
+            'model_name': 'Machine'
+        })
+        params = {'filter': {'name': 'machine-name-1'}, 'fields': ['ip']}
+        resp = self.client.get(url, {'payload': json.dumps(params)})
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.json()['data'][0]['ip'], '10.0.0.1')
+
+    def test_write_sets_stickiness(self):
+        url = reverse('bridgeql_django_create', kwargs={
+            'db_name': 'machines',
+            'app_label': 'machine',
+            'model_name': 'Machine',
+        })
+        params = {
+            'ip': '10.0.0.211',
+            'created_at': datetime.now().isoformat(),
+            'cpu_count': 4,
+            'memory': 4,
+            'powered_on': False,
+            'name': 'dummy_machine',
+            'os_id': 1
+        }
+        resp = self.client.post(url, json.dumps({'payload': params}),
+                                content_type='application/json')
+        self.assertEqual(resp.status_code, 201)
+        self.assertIn(STICKY_COOKIE % 'machines', resp.cookies)
+        self.assertIn('X-BridgeQL-Last-Write', resp)
+
+    @override_settings(BRIDGEQL_READ_ROUTING={
+        'machines': {
+            'primary': 'primary',
+            'replicas': {'replica1': 1, 'replica2': 3},
+            'sticky_seconds': 10,
+        }
+    })
+    @unknown_databases
+    def test_route_to_replicas(self):
+        router = ReadRouter()
+        request = self.factory.get('/')
+        routed = set(router.route(request, 'machines') for _ in range(100))
+        self.assertEqual(routed, {'replica1', 'replica2'})
+        self.assertEqual(router.primary('machines'), 'primary')
+        # unknown db names are passed through
+        self.assertEqual(router.route(request, 'default'), 'default')
+
+    @override_settings(BRIDGEQL_READ_ROUTING={
+        'machines': {
+            'primary': 'primary',
+            'replicas': ['replica1'],
+            'sticky_seconds': 10,
+        }
+    })
+    @unknown_databases
+    def test_read_your_writes(self):
+        router = ReadRouter()
+        request = self.factory.get('/')
+        request.COOKIES[STICKY_COOKIE % 'machines'] = str(time.time())
+        self.assertEqual(router.route(request, 'machines'), 'primary')
+        request = self.factory.get(
+            '/', HTTP_X_BRIDGEQL_LAST_WRITE=str(time.time() - 60))
+        self.assertEqual(router.route(request, 'machines'), 'replica1')
+
+    @override_settings(BRIDGEQL_READ_ROUTING={
+        'machines': {
+            'primary': 'primary',
+            'replicas': ['replica1', 'replica2'],
+            'strategy': 'least_loaded',
+        }
+    })
+    @unknown_databases
+    def test_least_loaded(self):
+        router = ReadRouter()
+        request = self.factory.get('/')
+        with router.using('replica1'):
+            self.assertEqual(router.route(request, 'machines'), 'replica2')
+
+    @override_settings(BRIDGEQL_READ_ROUTING={
+        'machines': {
+            'primary': 'primary',
+            'replicas': ['replica1'],
+            'max_lag': 5,
+            'lag_function': 'machine.tests.test_routing.lagging_replica',
+        }
+    })
+    @unknown_databases
+    def test_lagging_replica_falls_back_to_primary(self):
+        router = ReadRouter()
+        request = self.factory.get('/')
+        self.assertEqual(router.route(request, 'machines'), 'primary')
+        self.assertEqual(router.replication_lag(
+            'replica1', router.get_route('machines')), 60)
+
+    def test_routes_built_once(self):
+        router = ReadRouter()
+        route = router.get_route('machines')
+        self.assertIs(route, router.get_route('machines'))
+        self.assertIsNone(router.get_route('default'))
+        routing = dict(READ_ROUTING, machines=dict(
+            READ_ROUTING['machines'],
+            lag_function='machine.tests.test_routing.lagging_replica'))
+        with self.settings(BRIDGEQL_READ_ROUTING=routing):
+            changed = router.get_route('machines')
+            self.assertIsNot(route, changed)
+            self.assertIs(changed.lag_function, lagging_replica)
+
+    def test_validate_read_routing(self):
+        self.assertTrue(bridgeql_settings.validate())
+        with self.settings(BRIDGEQL_READ_ROUTING={
+                'machines': {'replicas': ['unknown']}}):
+            self.assertRaises(InvalidBridgeQLSettings,
+                              bridgeql_settings.validate)
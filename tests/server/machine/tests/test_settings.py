@@ -3,6 +3,7 @@
 # SPDX-License-Identifier: BSD-2-Clause
 
 from django.test import TestCase, override_settings
+from django.urls import reverse
 
 from bridgeql.django.exceptions import (
     InvalidAppOrModelName,
@@ -98,5 +99,82 @@ class TestSettings(TestCase):
     def test_valid_writer_auth_decorator(self):
         self.assertTrue(bridgeql_settings.validate())
 
+    def test_token_secret(self):
+        for secret in ('', [], ['secret', '']):
+            with self.settings(BRIDGEQL_TOKEN_SECRET=secret):
+                self.assertRaises(InvalidBridgeQLSettings,
+                                  bridgeql_settings.validate)
+        for secret in (None, 'secret', ['new', 'old']):
+            with self.settings(BRIDGEQL_TOKEN_SECRET=secret):
+                self.assertTrue(bridgeql_settings.validate())
+
     def test_list_local_apps(self):
         self.assertListEqual(get_allowed_apps(), ['machine'])
+
+
+class TestSettingsSnapshot(TestCase):
+
+    def test_copied_once(self):
+        bridgeql_settings.BRIDGEQL_MAX_LIMIT
+        self.assertIn('BRIDGEQL_MAX_LIMIT', vars(bridgeql_settings))
+        with override_settings(BRIDGEQL_MAX_LIMIT=10):
+            self.assertNotIn('BRIDGEQL_MAX_LIMIT', vars(bridgeql_settings))
+            self.assertEqual(bridgeql_settings.BRIDGEQL_MAX_LIMIT, 10)
+        self.assertIsNone(bridgeql_settings.BRIDGEQL_MAX_LIMIT)
+
+    def test_validated_again_once_changed(self):
+        self.assertTrue(bridgeql_settings.ensure_valid())
+        with self.settings(BRIDGEQL_RESTRICTED_MODELS={'machine.Rack': True}):
+            self.assertFalse(bridgeql_settings.valid)
+            self.assertRaises(InvalidAppOrModelName,
+                              bridgeql_settings.ensure_valid)
+        self.assertTrue(bridgeql_settings.ensure_valid())
+
+    def test_validated_on_first_access(self):
+        override = override_settings(
+            BRIDGEQL_CHANGE_FEED_MODELS=['machine.Rack'])
+        override.enable()
+        try:
+            # not when the settings change, on their next access
+            self.assertFalse(bridgeql_settings.valid)
+            self.assertRaises(InvalidAppOrModelName, getattr,
+                              bridgeql_settings, 'BRIDGEQL_MAX_LIMIT')
+        finally:
+            override.disable()
+        self.assertIsNone(bridgeql_settings.BRIDGEQL_MAX_LIMIT)
+        self.assertTrue(bridgeql_settings.valid)
+
+    def test_restricted_fields(self):
+        self.assertEqual(
+            bridgeql_settings.restricted_fields('machine.OperatingSystem'),
+            frozenset(['license_key']))
+        self.assertIs(bridgeql_settings.restricted_fields('auth.User'), True)
+        self.assertEqual(bridgeql_settings.restricted_fields('machine.Machine'),
+                         frozenset())
+        with self.settings(BRIDGEQL_RESTRICTED_MODELS={
+                'machine.Machine': ('ip',)}):
+            self.assertEqual(
+                bridgeql_settings.restricted_fields('machine.Machine'),
+                frozenset(['ip']))
+        with self.settings(BRIDGEQL_RESTRICTED_MODELS=['machine.Machine']):
+            self.assertRaises(InvalidBridgeQLSettings,
+                              bridgeql_settings.restricted_fields,
+                              'machine.Machine')
+
+    @override_settings(BRIDGEQL_AUTHENTICATION_DECORATOR='server.auth.localtest')
+    def test_single_auth_decorator(self):
+        self.assertEqual(bridgeql_settings.auth_decorators, {
+            'reader': 'server.auth.localtest',
+            'writer': 'server.auth.localtest',
+        })
+        self.assertTrue(bridgeql_settings.validate())
+
+    def test_auth_decorator_override(self):
+        url = reverse('bridgeql_django_read_pk', kwargs={
+            'db_name': 'default', 'app_label': 'machine',
+            'model_name': 'OperatingSystem', 'pk': 1})
+        self.assertEqual(self.client.get(url).status_code, 200)
+        with self.settings(BRIDGEQL_AUTHENTICATION_DECORATOR={
+                'reader': 'bridgeql.django.auth.basic_auth'}):
+            self.assertEqual(self.client.get(url).status_code, 401)
+        self.assertEqual(self.client.get(url).status_code, 200)
@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+# Copyright © 2023 VMware, Inc.  All rights reserved.
+# SPDX-License-Identifier: BSD-2-Clause
+
+import json
+import os
+import threading
+import time
+
+from django.conf import settings
+from django.db import connections
+from django.test import SimpleTestCase, TransactionTestCase, override_settings
+from django.test.client import Client
+from django.urls import reverse
+
+from bridgeql.django.models import ModelBuilder
+from bridgeql.django.singleflight import SingleFlight, flight_key, single_flight
+
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.time() + timeout
+    while not condition():
+        if time.time() > deadline:
+            raise AssertionError('Timed out waiting for the callers')
+        time.sleep(0.001)
+
+
+class TestSingleFlight(SimpleTestCase):
+
+    def setUp(self):
+        self.flights = SingleFlight()
+        self.release = threading.Event()
+        self.calls = 0
+
+    def slow(self, result):
+        def func():
+            self.calls += 1
+            self.release.wait(5)
+            if isinstance(result, Exception):
+                raise result
+            return result
+        return func
+
+    def call_many(self, func, callers):
+        results = []
+
+        def call():
+            try:
+                results.append(self.flights.do('key', func))
+            except Exception as e:
+                results.append(e)
+        threads = [threading.Thread(target=call) for _ in range(callers)]
+        threads[0].start()
+        wait_for(lambda: self.calls == 1)
+        for thread in threads[1:]:
+            thread.start()
+        # every caller but the leader waits on the flight
+        wait_for(lambda: self.flights._flights['key'].waiters == callers - 1)
+        self.release.set()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def test_shared_result(self):
+        results = self.call_many(self.slow('rows'), 5)
+        self.assertEqual(1, self.calls)
+        self.assertEqual(1, results.count(('rows', False)))
+        self.assertEqual(4, results.count(('rows', True)))
+        self.assertEqual(0, self.flights.in_flight())
+
+    def test_shared_exception(self):
+        error = ValueError('failed')
+        results = self.call_many(self.slow(error), 3)
+        self.assertEqual(1, self.calls)
+        self.assertListEqual([error] * 3, results)
+        # the next call runs again
+        self.assertEqual(('rows', False), self.flights.do('key', self.slow('rows')))
+
+    @override_settings(BRIDGEQL_SINGLEFLIGHT_MAX_WAITERS=1)
+    def test_max_waiters(self):
+        leader = threading.Thread(target=self.flights.do,
+                                  args=('key', self.slow('rows')))
+        leader.start()
+        wait_for(lambda: self.calls == 1)
+        follower = threading.Thread(target=self.flights.do,
+                                    args=('key', self.slow('rows')))
+        follower.start()
+        wait_for(lambda: self.flights._flights['key'].waiters == 1)
+        # over the bound the caller runs on its own
+        self.release.set()
+        self.assertEqual(('own', False), self.flights.do('key', lambda: 'own'))
+        leader.join()
+        follower.join()
+
+    def test_flight_key(self):
+        self.assertEqual(
+            flight_key('default', 'machine', 'Machine',
+                       {'fields': ['ip'], 'limit': 1}),
+            flight_key('default', 'machine', 'machine',
+                       {'limit': 1, 'fields': ['ip']}))
+        self.assertNotEqual(
+            flight_key('default', 'machine', 'Machine', {'limit': 1}),
+            flight_key('replica', 'machine', 'Machine', {'limit': 1}))
+
+
+# requests run from threads, the fixtures need to be committed
+@override_settings(BRIDGEQL_SINGLEFLIGHT=True)
+class TestCoalescedReads(TransactionTestCase):
+    fixtures = [os.path.join(settings.BASE_DIR, 'machine_tests.json'), ]
+
+    def read(self, params):
+        url = reverse('bridgeql_django_read', kwargs={
+            'db_name': 'default',
+            'app_label': 'machine',
+            'model_name': 'Machine'
+        })
+        try:
+            return Client().get(url, {'payload': json.dumps(params)})
+        finally:
+            connections.close_all()
+
+    def test_coalesced_reads(self):
+        release = threading.Event()
+        run = ModelBuilder.run
+        calls = []
+
+        def slow_run(mb):
+            calls.append(mb)
+            release.wait(5)
+            return run(mb)
+
+        params = {'filter': {'os__name': 'os-name-1'}, 'fields': ['ip']}
+        responses = []
+        threads = [threading.Thread(target=lambda: responses.append(
+            self.read(params))) for _ in range(4)]
+        with mock.patch.object(ModelBuilder, 'run', slow_run):
+            threads[0].start()
+            wait_for(lambda: calls)
+            for thread in threads[1:]:
+                thread.start()
+            wait_for(lambda: single_flight.in_flight() and list(
+                single_flight._flights.values())[0].waiters == 3)
+            release.set()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(1, len(calls))
+        self.assertEqual(4, len(responses))
+        for resp in responses:
+            self.assertEqual(200, resp.status_code)
+            self.assertEqual(10, len(resp.json()['data']))
+        self.assertEqual(1, len(set(resp.content for resp in responses)))
+
+    def test_error(self):
+        resp = self.read({'fields': ['invalid']})
+        self.assertEqual(400, resp.status_code)
+        self.assertFalse(resp.json()['success'])
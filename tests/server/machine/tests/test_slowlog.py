@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+# Copyright © 2023 VMware, Inc.  All rights reserved.
+# SPDX-License-Identifier: BSD-2-Clause
+
+import json
+import os
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.client import Client
+from django.urls import reverse
+
+from bridgeql.django.slowlog import fingerprint, normalize, slow_query_log
+
+
+class TestFingerprint(SimpleTestCase):
+
+    def test_normalize(self):
+        params = {
+            'filter': {
+                'os__name': 'os-name-1',
+                '__or': [{'pk': 1}, {'name__startswith': 'machine'}]
+            },
+            'fields': ['ip', 'name'],
+            'limit': 10
+        }
+        self.assertDictEqual({
+            'filter': {
+                'os__name': '?',
+                '__or': [{'pk': '?'}, {'name__startswith': '?'}]
+            },
+            'fields': ['ip', 'name'],
+            'limit': '?'
+        }, normalize(params))
+
+    def test_fingerprint(self):
+        query = {'filter': {'pk__in': [1, 2, 3]}, 'fields': ['ip']}
+        same_shape = {'fields': ['ip'], 'filter': {'pk__in': [4]}}
+        other_shape = {'filter': {'pk__in': [1, 2, 3]}, 'fields': ['name']}
+        self.assertEqual(fingerprint('machine.Machine', query),
+                         fingerprint('machine.Machine', same_shape))
+        self.assertNotEqual(fingerprint('machine.Machine', query),
+                            fingerprint('machine.Machine', other_shape))
+        self.assertNotEqual(fingerprint('machine.Machine', query),
+                            fingerprint('machine.OperatingSystem', query))
+
+
+class TestSlowQueryLog(TestCase):
+    fixtures = [os.path.join(settings.BASE_DIR, 'machine_tests.json'), ]
+
+    def setUp(self):
+        self.client = Client()
+        slow_query_log.clear()
+        self.url = reverse('bridgeql_django_read', kwargs={
+            'db_name': 'default',
+            'app_label': 'machine',
+            'model_name': 'Machine'
+        })
+
+    def read(self, name):
+        params = {'filter': {'name': name}, 'fields': ['ip']}
+        return self.client.get(self.url, {'payload': json.dumps(params)})
+
+    def test_threshold_not_reached(self):
+        with self.settings(BRIDGEQL_SLOW_QUERY_THRESHOLD=60000):
+            self.read('machine-name-1')
+        self.assertListEqual([], slow_query_log.top())
+
+    @override_settings(BRIDGEQL_SLOW_QUERY_THRESHOLD=0)
+    def test_slow_queries(self):
+        with self.assertLogs('bridgeql.django.slowquery', 'WARNING') as logs:
+            self.read('machine-name-1')
+            self.read('machine-name-2')
+        self.assertEqual(2, len(logs.records))
+        top = slow_query_log.top()
+        self.assertEqual(1, len(top))
+        self.assertEqual(2, top[0]['count'])
+        self.assertEqual('machine.Machine', top[0]['model'])
+        self.assertEqual('127.0.0.1', top[0]['last']['client_ip'])
+        self.assertIn('machine-name-2', top[0]['last']['sql'])
+        self.assertEqual(1, top[0]['last']['rows'])
+
+        staff = User.objects.create(username='staff', is_staff=True)
+        staff.set_password('password')
+        staff.save()
+        self.client.login(username='staff', password='password')
+        resp = self.client.get(reverse('bridgeql_slow_queries'))
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(top[0]['fingerprint'],
+                         resp.json()['data'][0]['fingerprint'])
+
+    @override_settings(BRIDGEQL_SLOW_QUERY_THRESHOLD=0)
+    def test_or_filter(self):
+        params = {'filter': {'__or': [{'pk': 1}, {'pk': 2}]}, 'fields': ['ip']}
+        for singleflight in (False, True):
+            slow_query_log.clear()
+            with self.settings(BRIDGEQL_SINGLEFLIGHT=singleflight):
+                resp = self.client.get(self.url,
+                                       {'payload': json.dumps(params)})
+            self.assertEqual(2, len(resp.json()['data']))
+            self.assertEqual(fingerprint('machine.Machine', params),
+                             slow_query_log.top()[0]['fingerprint'])
+
+    def test_slow_queries_requires_staff(self):
+        resp = self.client.get(reverse('bridgeql_slow_queries'))
+        self.assertEqual(resp.status_code, 302)
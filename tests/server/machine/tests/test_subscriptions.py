@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+# Copyright © 2023 VMware, Inc.  All rights reserved.
+# SPDX-License-Identifier: BSD-2-Clause
+
+import json
+import os
+import sys
+import threading
+
+import django
+from django.conf import settings
+from django.test import TestCase, override_settings
+from django.test.client import Client, RequestFactory
+from django.urls import reverse
+
+from bridgeql.django.events import event_bus
+from bridgeql.django.subscriptions import Subscription, accepts_stream
+from machine.models import Machine
+
+if sys.version_info >= (3, 7) and django.VERSION >= (3, 0):
+    # coroutines are a syntax error on python 2, ASGI needs django 3.0
+    from machine.tests.async_subscriptions import (  # noqa: F401
+        TestEventStreams
+    )
+
+MACHINE_KWARGS = {
+    'db_name': 'default',
+    'app_label': 'machine',
+    'model_name': 'Machine',
+}
+POWERED_ON = {'filter': {'powered_on': True}, 'fields': ['ip', 'powered_on']}
+
+
+@override_settings(BRIDGEQL_CHANGE_FEED_MODELS=['machine.Machine'],
+                   BRIDGEQL_SUBSCRIPTION_TIMEOUT=5)
+class TestSubscriptions(TestCase):
+    fixtures = [os.path.join(settings.BASE_DIR, 'machine_tests.json'), ]
+
+    def setUp(self):
+        self.client = Client()
+
+    def tearDown(self):
+        for subscription in list(event_bus._subscriptions.values()):
+            event_bus.unsubscribe(subscription)
+
+    def poll(self, status=200, **params):
+        params.setdefault('timeout', 0)
+        if 'payload' in params:
+            params['payload'] = json.dumps(params['payload'])
+        resp = self.client.get(
+            reverse('bridgeql_django_subscribe', kwargs=MACHINE_KWARGS),
+            params)
+        self.assertEqual(resp.status_code, status)
+        return resp.json()
+
+    def write(self, url_name, pk, method, params=None):
+        kwargs = dict(MACHINE_KWARGS, pk=pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            resp = getattr(self.client, method)(
+                reverse(url_name, kwargs=kwargs),
+                json.dumps({'payload': params}),
+                content_type='application/json')
+        self.assertEqual(resp.status_code, 200)
+
+    def test_long_poll(self):
+        res = self.poll(payload=POWERED_ON)
+        self.assertEqual(res['data'], [])
+        subscription = res['subscription']
+        # machine 1 is powered off, 2 is powered on
+        self.write('bridgeql_django_update', 1, 'patch',
+                   {'powered_on': True})
+        self.write('bridgeql_django_update', 2, 'patch',
+                   {'powered_on': False})
+        self.write('bridgeql_django_update', 3, 'patch', {'memory': 8})
+        self.write('bridgeql_django_delete', 4, 'delete')
+        res = self.poll(subscription=subscription)
+        self.assertEqual(res['subscription'], subscription)
+        self.assertEqual(res['data'], [
+            {'id': 1, 'action': 'updated', 'pk': 1,
+             'row': {'pk': 1, 'ip': '10.0.0.1', 'powered_on': True}},
+            # updated out of the filter
+            {'id': 2, 'action': 'updated', 'pk': 2, 'row': None},
+            # deleted rows are matched before their deletion
+            {'id': 3, 'action': 'deleted', 'pk': 4,
+             'row': {'pk': 4, 'ip': '10.0.0.4', 'powered_on': True}},
+        ])
+        self.assertEqual(self.poll(subscription=subscription)['data'], [])
+
+    def test_long_poll_waits(self):
+        subscription = Subscription('default', 'machine', 'Machine',
+                                    POWERED_ON)
+        event = {'action': 'created', 'pk': 1, 'row': None}
+        timer = threading.Timer(0.05, subscription.put, [event])
+        timer.start()
+        self.assertEqual(subscription.wait(2), [event])
+        timer.join()
+
+    @override_settings(BRIDGEQL_CHANGE_FEED_SIGNALS=True)
+    def test_signals(self):
+        subscription = self.poll(payload=POWERED_ON)['subscription']
+        with self.captureOnCommitCallbacks(execute=True):
+            Machine.objects.filter(pk=2).get().delete()
+            machine = Machine.objects.get(pk=5)
+            machine.powered_on = True
+            machine.save()
+        events = self.poll(subscription=subscription)['data']
+        self.assertEqual([(e['action'], e['pk']) for e in events],
+                         [('deleted', 2), ('updated', 5)])
+
+    def test_stream_over_wsgi(self):
+        # the streams would hold a thread, the request long-polls instead
+        resp = self.client.get(
+            reverse('bridgeql_django_subscribe', kwargs=MACHINE_KWARGS),
+            {'payload': json.dumps(POWERED_ON), 'timeout': 0},
+            HTTP_ACCEPT='text/event-stream')
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp['Content-Type'],
+                         'application/json; charset=utf-8')
+        res = resp.json()
+        self.assertEqual(res['data'], [])
+        self.assertEqual(len(event_bus), 1)
+        self.assertEqual(self.poll(subscription=res['subscription'])['data'],
+                         [])
+
+    def test_queue_overflow(self):
+        subscription = Subscription('default', 'machine', 'Machine',
+                                    POWERED_ON)
+        with override_settings(BRIDGEQL_SUBSCRIPTION_QUEUE_SIZE=2):
+            for pk in range(3):
+                subscription.put({'action': 'updated', 'pk': pk, 'row': None})
+        events = subscription.wait(0)
+        self.assertEqual([event['action'] for event in events], ['overflow'])
+
+    def test_shared_filters(self):
+        first = event_bus.subscribe(
+            Subscription('default', 'machine', 'Machine', POWERED_ON))
+        second = event_bus.subscribe(
+            Subscription('default', 'machine', 'Machine', POWERED_ON))
+        self.assertEqual(first.key, second.key)
+        # the filter is matched once for both subscriptions
+        with self.assertNumQueries(1):
+            rows = event_bus.match(Machine, 2, 'default')
+        self.assertEqual(list(rows.values()),
+                         [{'pk': 2, 'ip': '10.0.0.2', 'powered_on': True}])
+
+    def test_distinct_filters(self):
+        subscriptions = [
+            POWERED_ON,
+            {'filter': {'os__name': 'os-name-2'}, 'fields': ['name']},
+            {'filter': {'os__name': 'os-name-3'}},
+            {'filter': {}, 'fields': ['os__name', 'memory']},
+        ]
+        for params in subscriptions:
+            event_bus.subscribe(
+                Subscription('default', 'machine', 'Machine', params))
+        # the filters are matched in one query, the rows read in another
+        with self.assertNumQueries(2):
+            rows = event_bus.match(Machine, 2, 'default')
+        self.assertEqual(sorted(rows.values(), key=len), [
+            {'pk': 2, 'name': 'machine-name-2'},
+            {'pk': 2, 'ip': '10.0.0.2', 'powered_on': True},
+            {'pk': 2, 'os__name': 'os-name-2', 'memory': 4},
+        ])
+        with self.assertNumQueries(1):
+            self.assertEqual(event_bus.match(Machine, 1000, 'default'), {})
+
+    def test_accepts_stream(self):
+        request = RequestFactory().get('/', HTTP_ACCEPT='text/event-stream')
+        self.assertFalse(accepts_stream(request))
+        # set by the ASGI handler of bridgeql
+        request.bridgeql_event_streams = True
+        self.assertTrue(accepts_stream(request))
+        self.assertFalse(accepts_stream(RequestFactory().get('/')))
+
+    def test_invalid_subscriptions(self):
+        self.poll(status=400, payload={'filter': {'rack': 1}})
+        self.poll(status=400, payload={'order_by': ['ip']})
+        self.poll(status=400, payload=POWERED_ON, timeout=10)
+        self.poll(status=404, subscription='unknown')
+        resp = self.client.get(reverse('bridgeql_django_subscribe', kwargs={
+            'db_name': 'default',
+            'app_label': 'machine',
+            'model_name': 'OperatingSystem',
+        }))
+        self.assertEqual(resp.status_code, 404)
+
+    def test_max_subscriptions(self):
+        with override_settings(BRIDGEQL_MAX_SUBSCRIPTIONS=1):
+            self.poll(payload=POWERED_ON)
+            self.poll(status=503, payload=POWERED_ON)
@@ -2,11 +2,24 @@
 # Copyright © 2023 VMware, Inc.  All rights reserved.
 # SPDX-License-Identifier: BSD-2-Clause
 
+import json
+import os
+
+from django.conf import settings
 from django.contrib.auth.models import User
+from django.db.models import QuerySet
 from django.urls import reverse
-from django.test import TestCase
+from django.test import TestCase, override_settings
 from django.test.client import Client
 
+from bridgeql.django import schema
+from bridgeql.django.models import ModelBuilder
+
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
 
 class TestViews(TestCase):
 
@@ -39,3 +52,161 @@ class TestViews(TestCase):
         self.client.login(username="testuser_with_staff", password="password")
         resp = self.client.get(_url)
         self.assertEqual(resp.status_code, 200)
+
+
+class TestExplainView(TestCase):
+    fixtures = [os.path.join(settings.BASE_DIR, 'machine_tests.json'), ]
+
+    def setUp(self):
+        self.client = Client()
+        self.url = reverse('bridgeql_django_explain', kwargs={
+            'db_name': 'default',
+            'app_label': 'machine',
+            'model_name': 'Machine'
+        })
+        self.params = {
+            'filter': {
+                'os__name': 'os-name-1'
+            },
+            'fields': ['ip', 'name'],
+            'order_by': ['name']
+        }
+
+    def login_staff(self):
+        staff = User.objects.create(username='testuser_with_staff',
+                                    is_staff=True)
+        staff.set_password('password')
+        staff.save()
+        self.client.login(username='testuser_with_staff', password='password')
+
+    def test_explain_should_fail(self):
+        resp = self.client.get(self.url, {'payload': json.dumps(self.params)})
+        self.assertEqual(resp.status_code, 302)
+
+    def test_explain(self):
+        self.login_staff()
+        resp = self.client.get(self.url, {'payload': json.dumps(self.params)})
+        self.assertEqual(resp.status_code, 200)
+        data = resp.json()['data']
+        self.assertIn('machine_operatingsystem', data['sql'])
+        self.assertEqual(['os-name-1'], data['params'])
+        self.assertEqual(10, data['rows'])
+        self.assertTrue(data['explain'])
+        self.assertTrue(data['indexes'])
+        self.assertEqual({'validate', 'compile', 'explain', 'execute'},
+                         set(data['timings']))
+
+    def test_explain_analyze_unsupported(self):
+        self.login_staff()
+        resp = self.client.get(self.url, {'payload': json.dumps(self.params),
+                                          'analyze': 'true'})
+        self.assertEqual(resp.status_code, 400)
+        self.assertFalse(resp.json()['success'])
+
+    def test_explain_analyze(self):
+        self.login_staff()
+        plan = ('Seq Scan on machine_machine  (cost=0.00..2.25 rows=10 '
+                'width=36) (actual time=0.009..0.020 rows=10 loops=1)')
+        with mock.patch.object(QuerySet, 'explain', return_value=plan), \
+                mock.patch.object(ModelBuilder, 'execute') as execute:
+            resp = self.client.get(self.url, {
+                'payload': json.dumps(self.params), 'analyze': 'true'})
+        self.assertEqual(resp.status_code, 200)
+        data = resp.json()['data']
+        # the analyzed query is not executed again
+        self.assertEqual(0, execute.call_count)
+        self.assertEqual(10, data['rows'])
+        self.assertEqual({'validate', 'compile', 'explain'},
+                         set(data['timings']))
+
+    @override_settings(BRIDGEQL_MAX_QUERY_COST=10)
+    def test_explain_query_cost(self):
+        self.login_staff()
+        # the explain runs within the guards of the reads
+        with mock.patch('bridgeql.django.guards.query_cost',
+                        return_value=100), \
+                mock.patch.object(QuerySet, 'explain') as explain:
+            resp = self.client.get(self.url, {
+                'payload': json.dumps(self.params), 'analyze': 'true'})
+        self.assertEqual(resp.status_code, 400)
+        self.assertEqual(0, explain.call_count)
+
+    def test_explain_post(self):
+        self.login_staff()
+        resp = self.client.post(self.url + '?analyze=false',
+                                json.dumps({'payload': self.params}),
+                                content_type='application/json')
+        self.assertEqual(resp.status_code, 200)
+        data = resp.json()['data']
+        self.assertEqual(['os-name-1'], data['params'])
+        self.assertEqual(10, data['rows'])
+
+    def test_explain_unsupported(self):
+        self.login_staff()
+        # QuerySet.explain is added in django 2.1
+        with mock.patch.object(QuerySet, 'explain', None, create=True):
+            resp = self.client.get(self.url,
+                                   {'payload': json.dumps(self.params)})
+        self.assertEqual(resp.status_code, 400)
+        self.assertIn('Django 2.1', resp.json()['message'])
+
+    def test_explain_invalid_payload(self):
+        self.login_staff()
+        for params in ({}, {'payload': '{'}, {'payload': '[]'}):
+            resp = self.client.get(self.url, params)
+            self.assertEqual(resp.status_code, 400)
+            self.assertFalse(resp.json()['success'])
+
+
+class TestSchemaView(TestCase):
+
+    def setUp(self):
+        self.client = Client()
+        self.url = reverse('bridgeql_schema_json')
+
+    def test_schema(self):
+        resp = self.client.get(self.url)
+        self.assertEqual(resp.status_code, 200)
+        schema = resp.json()['machine']
+        machine = schema['machine.Machine']
+        self.assertEqual(machine['pk'], 'id')
+        self.assertEqual(machine['properties'], ['stats'])
+        self.assertEqual(machine['fields']['os'], {
+            'type': 'ForeignKey', 'null': False, 'help_text': '',
+            'related_model': 'machine.OperatingSystem', 'restricted': False})
+        self.assertEqual(machine['fields']['memory']['help_text'],
+                         'Memory in gigabytes (GB)')
+        self.assertEqual(
+            schema['machine.OperatingSystem']['fields']['license_key'],
+            {'restricted': True})
+
+    def test_etag(self):
+        resp = self.client.get(self.url)
+        etag = resp['ETag']
+        resp = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 304)
+        with override_settings(BRIDGEQL_RESTRICTED_MODELS={
+                'machine.Machine': True}):
+            resp = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(resp.status_code, 200)
+            self.assertEqual(resp.json()['machine']['machine.Machine'],
+                             {'restricted': True})
+        self.assertEqual(self.client.get(self.url)['ETag'], etag)
+
+    def test_cached(self):
+        self.client.get(self.url)
+        with mock.patch.object(schema.Schema, 'build') as build:
+            self.client.get(self.url)
+        build.assert_not_called()
+
+    def test_html(self):
+        staff = User.objects.create(username='staff', is_staff=True)
+        self.client.force_login(staff)
+        resp = self.client.get(reverse('generate_bridgeql_schema'))
+        self.assertContains(resp, 'machine.Machine')
+        self.assertContains(resp, 'Memory in gigabytes (GB)')
+        self.assertNotContains(resp, 'license_key')
+
+    def test_immutable(self):
+        with self.assertRaises(TypeError):
+            schema.get_schema().data['machine']['machine.Machine'] = {}